@@ -0,0 +1,50 @@
+"""Risk types and session state keys shared by the agents and the API.
+
+This module is kept free of agent and model construction, so the API can
+validate requests and read session state without building the agents.
+"""
+
+import typing
+
+# Maps each accepted risk type, in canonical order, to the session state key of its analyser's report.
+RISK_REPORT_KEYS_BY_TYPE = {
+    "fire": "fire_risk_report",
+    "construction": "construction_risk_report",
+}
+
+# Session state keys under which the analysers write their reports.
+RISK_REPORT_KEYS = frozenset(RISK_REPORT_KEYS_BY_TYPE.values())
+
+# Session state key listing the output keys of the reports produced for a request.
+RISK_REPORTS_STATE_KEY = "risk_reports"
+
+# Session state keys of the assembled summary and of the polish request flag.
+RISK_SUMMARY_STATE_KEY = "risk_summary"
+POLISH_SUMMARY_STATE_KEY = "polish_summary"
+
+
+def report_title(output_key: str) -> str:
+    """Returns the display title of a report, e.g. "Fire" for fire_risk_report."""
+    return output_key.removesuffix("_risk_report").replace("_", " ").title()
+
+
+def parse_risk_types(risk_type: typing.Optional[str]) -> typing.List[str]:
+    """Parses a risk_type value into the list of risk types to analyse.
+
+    Args:
+        risk_type: A single risk type, a comma separated list, or 'all'.
+
+    Returns:
+        The requested risk types in canonical order.
+
+    Raises:
+        ValueError: If an unknown risk type is requested.
+    """
+    requested = {token.strip().lower() for token in (risk_type or "all").split(",") if token.strip()}
+    if not requested or "all" in requested:
+        return list(RISK_REPORT_KEYS_BY_TYPE)
+    unknown = requested - RISK_REPORT_KEYS_BY_TYPE.keys()
+    if unknown:
+        raise ValueError(f"Unknown risk_type {sorted(unknown)}; expected a comma separated list of "
+                         f"{list(RISK_REPORT_KEYS_BY_TYPE)} or 'all'.")
+    return [name for name in RISK_REPORT_KEYS_BY_TYPE if name in requested]
@@ -1,12 +1,14 @@
 """Root agent configuration for the Video Risk Assessment application.
 
 This module defines the root agent, which is a sequential agent that orchestrates
-the execution of sub-agents: the parallel planner and the summarizer agent.
+the execution of sub-agents: the keyframe extractor, the parallel planner and the
+summarizer agent.
 It also configures callbacks for logging.
 """
 
 import dotenv
 
+import agents.sub_agents.keyframe_extractor.keyframe_agent
 import agents.sub_agents.parallel_planner.parallel_planner_agent
 import agents.sub_agents.summarizer_agent.summariser_agent
 import utils.vra_util
@@ -19,6 +21,7 @@ from google.adk.agents import SequentialAgent
 root_agent = SequentialAgent(
     name="root_agent",
     sub_agents=[
+        agents.sub_agents.keyframe_extractor.keyframe_agent.keyframe_extractor,
         agents.sub_agents.parallel_planner.parallel_planner_agent.parallel_planner,
         agents.sub_agents.summarizer_agent.summariser_agent.summary_agent
     ],
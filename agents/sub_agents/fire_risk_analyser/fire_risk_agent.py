@@ -2,25 +2,32 @@
 
 This module defines an LLM-based agent responsible for analyzing video content
 to identify fire-related risks and hazards. It focuses on the Fire Triangle
-(Fuel, Heat/Ignition, Oxygen/Oxidizer) and provides a detailed risk assessment.
+(Fuel, Heat/Ignition, Oxygen/Oxidizer) and provides a detailed risk assessment,
+stored in session state as a structured HazardReport.
 """
 
-import os
 from google.adk.agents.llm_agent import LlmAgent
-from google.adk.models.lite_llm import LiteLlm
 
+from agents.risk_types import RISK_REPORT_KEYS_BY_TYPE
+from utils.hazard_report import HazardReport, normalise_hazard_report_callback, request_hazard_report_callback
+from utils.llm_client import get_llm
+from utils.metrics import record_model_request_callback, record_model_response_callback
 from utils.vra_util import logger_before_agent_callback, logger_after_agent_callback
-from utils.prompt_service import PromptService
+from utils.prompt_service import instruction_provider
+from utils.token_budget import enforce_token_budget_callback
+from utils.video_ingest import resolve_file_data_callback
 
-ollama_llm = LiteLlm(
-    model=os.getenv("LLM_MODEL"),
-)
+ollama_llm = get_llm()
 
 fire_risk_agent = LlmAgent(
     model=ollama_llm,
     name="fire_risk_agent",
-    instruction=PromptService.get_latest_prompt("fire_risk_agent_instruction", app_name=os.getenv("APP_NAME", "Video_Risk_Assessment"), region=os.getenv("REGION", "us-central1")),
+    instruction=instruction_provider("fire_risk_agent_instruction"),
     before_agent_callback=[logger_before_agent_callback],
     after_agent_callback=[logger_after_agent_callback],
-    output_key="fire_risk_report"
+    before_model_callback=[resolve_file_data_callback, request_hazard_report_callback, enforce_token_budget_callback,
+                           record_model_request_callback],
+    after_model_callback=[record_model_response_callback, normalise_hazard_report_callback],
+    output_schema=HazardReport,
+    output_key=RISK_REPORT_KEYS_BY_TYPE["fire"]
 )
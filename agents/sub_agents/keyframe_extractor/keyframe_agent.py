@@ -0,0 +1,59 @@
+"""Keyframe extractor agent.
+
+This module defines a preprocessing agent that runs ahead of the parallel
+planner. It samples the uploaded video, drops near-duplicate frames and records
+the kept frames with their timestamps in session state, so the analysers
+receive a compact frame set instead of the full clip.
+"""
+
+import asyncio
+import logging
+import typing
+
+from google.adk.agents import BaseAgent
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+
+from utils.keyframes import KEYFRAMES_STATE_KEY, extract_keyframes, keyframes_available
+from utils.video_ingest import local_path_from_uri
+from utils.vra_util import logger_before_agent_callback, logger_after_agent_callback
+
+
+class KeyframeExtractorAgent(BaseAgent):
+    """Agent that replaces the uploaded video with deduplicated keyframes."""
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> typing.AsyncGenerator[Event, None]:
+        if not keyframes_available() or not ctx.user_content:
+            return
+        video_part = next((part for part in ctx.user_content.parts or []
+                           if part.file_data and (part.file_data.mime_type or "").startswith("video/")
+                           and local_path_from_uri(part.file_data.file_uri)), None)
+        if video_part is None:
+            return
+
+        try:
+            frames = await asyncio.to_thread(extract_keyframes, local_path_from_uri(video_part.file_data.file_uri))
+        except Exception as e:
+            logging.warning(f"Keyframe extraction failed for session {ctx.session.id}, sending full video: {e}")
+            return
+        if not frames:
+            return
+
+        logging.info(f"Extracted {len(frames)} keyframes for session {ctx.session.id}")
+        yield Event(invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=EventActions(state_delta={
+                        KEYFRAMES_STATE_KEY: {
+                            "video_uri": video_part.file_data.file_uri,
+                            "frames": [{"timestamp": frame.timestamp, "uri": frame.path.as_uri()} for frame in frames],
+                        }
+                    }))
+
+
+keyframe_extractor = KeyframeExtractorAgent(
+    name="keyframe_extractor",
+    description="Samples the uploaded video and keeps deduplicated, timestamped keyframes.",
+    before_agent_callback=[logger_before_agent_callback],
+    after_agent_callback=[logger_after_agent_callback],
+)
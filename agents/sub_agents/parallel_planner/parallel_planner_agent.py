@@ -1,24 +1,163 @@
 """Parallel planner agent configuration.
 
 This module defines the parallel planner agent, which orchestrates the execution
-of risk analysis sub-agents (fire and construction) in parallel. It handles
-the distribution of the video assessment task.
+of risk analysis sub-agents (fire and construction) in parallel. It routes the
+request by the `risk_type` in session state so that only the requested
+analysers run, and records which reports were produced for the summarizer.
+
+Videos whose keyframes span more than one segment are analysed segment by
+segment: every selected analyser runs once per segment, bounded by
+SEGMENT_CONCURRENCY concurrent segment runs, and the per-segment reports are
+merged into the analyser's usual report before the summarizer runs.
+
+Each analyser run is bounded by its stage deadline (see utils.deadlines). An
+analyser that misses it is cancelled without writing its report, and the
+summarizer proceeds with the reports that did arrive.
 """
 
 # Create a summary agent to gather and format results
+import asyncio
+import logging
+import typing
+
 import google.adk.agents
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.agents.parallel_agent import _create_branch_ctx_for_sub_agent, _merge_agent_run
+from google.adk.events import Event, EventActions
+from google.adk.sessions.state import State
+from google.adk.utils.context_utils import Aclosing
 
 import agents.sub_agents.construction_risk_analyser.construction_risk_agent
 import agents.sub_agents.fire_risk_analyser.fire_risk_agent
+from agents.risk_types import RISK_REPORTS_STATE_KEY, parse_risk_types
+from utils.deadlines import StageTimeoutError, with_deadline
+from utils.hazard_report import request_hazard_report_callback
+from utils.keyframes import KEYFRAMES_STATE_KEY, segment_windows
+from utils.metrics import record_model_request_callback
+from utils.report_merge import merge_segment_reports
 from utils.vra_util import logger_before_agent_callback, logger_after_agent_callback
-from utils.prompt_service import PromptService
+from utils.token_budget import enforce_token_budget_callback
+from utils.video_ingest import segment_file_data_callback
 import os
 
-parallel_planner = google.adk.agents.ParallelAgent(
+SEGMENT_CONCURRENCY = int(os.getenv("SEGMENT_CONCURRENCY", "4"))
+
+# Maps each accepted risk type to the analyser that handles it.
+RISK_ANALYSERS = {
+    "fire": agents.sub_agents.fire_risk_analyser.fire_risk_agent.fire_risk_agent,
+    "construction": agents.sub_agents.construction_risk_analyser.construction_risk_agent.construction_risk_agent,
+}
+
+
+def _segment_analyser(analyser: google.adk.agents.LlmAgent, start: float, end: float) -> google.adk.agents.LlmAgent:
+    """Returns a copy of an analyser that only looks at one video segment.
+
+    The copies are built for each invocation and dropped with it, so no
+    segment window outlives the run that needed it.
+
+    Args:
+        analyser: The analyser to copy.
+        start: Start of the segment in seconds.
+        end: End of the segment in seconds.
+
+    Returns:
+        The segment analyser, writing its report under a segment specific temp: output
+        key, which lives only for the invocation and is never persisted.
+    """
+    suffix = f"segment_{int(start)}"
+    return analyser.clone(update={
+        "name": f"{analyser.name}_{suffix}",
+        "output_key": f"{State.TEMP_PREFIX}{analyser.output_key}_{suffix}",
+        "before_model_callback": [segment_file_data_callback(start, end), request_hazard_report_callback,
+                                  enforce_token_budget_callback, record_model_request_callback],
+    })
+
+
+async def _bounded(agent_run: typing.AsyncGenerator[Event, None],
+                   semaphore: asyncio.Semaphore) -> typing.AsyncGenerator[Event, None]:
+    """Runs an agent while holding a slot of the semaphore."""
+    async with semaphore:
+        async with Aclosing(agent_run) as agen:
+            async for event in agen:
+                yield event
+
+
+async def _skip_on_timeout(agent_name: str, agent_run: typing.AsyncGenerator[Event, None],
+                           ctx: InvocationContext) -> typing.AsyncGenerator[Event, None]:
+    """Runs an analyser within its stage deadline, ending the run quietly if it misses it.
+
+    The cancelled analyser writes no report, which the summarizer marks as missing.
+    """
+    try:
+        async with Aclosing(with_deadline(agent_name, agent_run)) as agen:
+            async for event in agen:
+                yield event
+    except StageTimeoutError as e:
+        logging.warning(f"{e} Session {ctx.session.id} continues without its report.")
+
+
+class RiskRoutingParallelAgent(google.adk.agents.ParallelAgent):
+    """Parallel agent that only fans out to the analysers selected by risk_type."""
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> typing.AsyncGenerator[Event, None]:
+        selected_names = {RISK_ANALYSERS[name].name for name in parse_risk_types(ctx.session.state.get("risk_type"))}
+        selected = [sub_agent for sub_agent in self.sub_agents if sub_agent.name in selected_names]
+
+        yield Event(invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=EventActions(state_delta={
+                        RISK_REPORTS_STATE_KEY: [sub_agent.output_key for sub_agent in selected]
+                    }))
+
+        windows = segment_windows(ctx.session.state.get(KEYFRAMES_STATE_KEY))
+        if len(windows) > 1:
+            semaphore = asyncio.Semaphore(SEGMENT_CONCURRENCY)
+            agent_runs = [self._run_segmented(sub_agent, windows, semaphore, ctx) for sub_agent in selected]
+        else:
+            agent_runs = [sub_agent.run_async(_create_branch_ctx_for_sub_agent(self, sub_agent, ctx))
+                          for sub_agent in selected]
+        agent_runs = [_skip_on_timeout(sub_agent.name, agent_run, ctx)
+                      for sub_agent, agent_run in zip(selected, agent_runs)]
+        async with Aclosing(_merge_agent_run(agent_runs, selected_names)) as agen:
+            async for event in agen:
+                yield event
+
+    async def _run_segmented(self, analyser: google.adk.agents.LlmAgent,
+                             windows: typing.List[typing.Tuple[float, float]],
+                             semaphore: asyncio.Semaphore,
+                             ctx: InvocationContext) -> typing.AsyncGenerator[Event, None]:
+        """Runs an analyser on every segment and merges the segment reports into its report.
+
+        Args:
+            analyser: The analyser to run.
+            windows: The (start, end) windows of the segments.
+            semaphore: Bounds the segment runs executing concurrently.
+            ctx: The invocation context.
+
+        Yields:
+            The events of the segment runs, followed by the event carrying the merged report.
+        """
+        segment_analysers = [_segment_analyser(analyser, start, end) for start, end in windows]
+        agent_runs = [_bounded(segment.run_async(_create_branch_ctx_for_sub_agent(self, segment, ctx)), semaphore)
+                      for segment in segment_analysers]
+        async with Aclosing(_merge_agent_run(agent_runs)) as agen:
+            async for event in agen:
+                yield event
+
+        # The segment reports are only needed for the merge; drop them from the invocation's state.
+        reports = [(start, end, ctx.session.state.pop(segment.output_key, ""))
+                   for (start, end), segment in zip(windows, segment_analysers)]
+        yield Event(invocation_id=ctx.invocation_id,
+                    author=analyser.name,
+                    branch=_create_branch_ctx_for_sub_agent(self, analyser, ctx).branch,
+                    actions=EventActions(state_delta={analyser.output_key: merge_segment_reports(reports)}))
+
+
+parallel_planner = RiskRoutingParallelAgent(
     name="parallel_planner",
-    description=PromptService.get_latest_prompt("parallel_planner_description", app_name=os.getenv("APP_NAME", "Video_Risk_Assessment"), region=os.getenv("REGION", "us-central1")),
-    sub_agents=[agents.sub_agents.fire_risk_analyser.fire_risk_agent.fire_risk_agent,
-                agents.sub_agents.construction_risk_analyser.construction_risk_agent.construction_risk_agent],
+    description="parallel_planner who handles overall video risk assessment.",
+    sub_agents=list(RISK_ANALYSERS.values()),
     before_agent_callback=[logger_before_agent_callback],
     after_agent_callback=[logger_after_agent_callback],
 )
@@ -2,28 +2,152 @@
 
 This module defines the summarizer agent, which is responsible for aggregating
 the risk reports from the fire and construction risk agents into a single,
-cohesive, and user-friendly summary.
+cohesive, and user-friendly summary. Only the reports produced for the request's
+risk_type are summarised.
+
+The summary and the overall risk level are assembled in Python from the
+structured hazard reports. An LLM pass that rewrites the summary in a friendlier
+tone only runs when the request sets `polish_summary` in session state. The
+polish pass only receives the condensed summary, fitted to its token budget;
+the full hazard tables are appended to its answer unchanged.
+
+A requested report missing from session state, because its analyser missed its
+deadline, is marked as not assessed rather than failing the summary.
 """
 
 # Create a summary agent to gather and format results
 import dotenv
-import google.adk.models.lite_llm
-import os
-from google.adk.agents import LlmAgent
+import typing
+from google.adk.agents import BaseAgent, LlmAgent
+from google.adk.agents.callback_context import CallbackContext
+from google.adk.agents.invocation_context import InvocationContext
+from google.adk.events import Event, EventActions
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.utils.context_utils import Aclosing
+from google.genai import types
 
+import utils.llm_client
+from agents.risk_types import POLISH_SUMMARY_STATE_KEY, RISK_REPORTS_STATE_KEY, RISK_SUMMARY_STATE_KEY, report_title
+import utils.metrics
 import utils.vra_util
-from utils.prompt_service import PromptService
+from utils.hazard_report import HazardReport, build_hazard_tables, build_summary
+from utils.prompt_service import instruction_provider
+from utils.token_budget import assemble_request, enforce_token_budget_callback
 
 dotenv.load_dotenv()
 
-ollama_llm = google.adk.models.lite_llm.LiteLlm(
-    model=os.getenv("LLM_MODEL"),
-)
+ollama_llm = utils.llm_client.get_llm()
+
+def _polish_instruction(summary: str) -> str:
+    """Returns the instruction handing an assembled summary to the polish pass."""
+    return ("Rewrite the following assessment into your response. Keep every hazard, timestamp and the "
+            f"overall risk level exactly as given and do not add findings:\n\n{summary}")
+
+
+def polish_with_summary_callback(callback_context: CallbackContext,
+                                 llm_request: LlmRequest) -> typing.Optional[LlmResponse]:
+    """Callback that hands the condensed summary to the polish pass as its only content.
+
+    The summary is sent as message text rather than appended to the
+    instruction, so the token budget can shorten it.
+
+    Args:
+        callback_context: The context of the callback, containing agent and session info.
+        llm_request: The request about to be sent to the model.
+
+    Returns:
+        None, so the model call proceeds with the summary attached.
+    """
+    llm_request.contents = [types.Content(role="user", parts=[
+        types.Part(text=_polish_instruction(callback_context.state.get(RISK_SUMMARY_STATE_KEY, "")))
+    ])]
+    return None
+
+
+async def polish_summary(summary: str) -> str:
+    """Rewrites an assembled summary with a single model call, outside an agent run.
+
+    Used for summaries that have no session of their own, such as the site
+    roll-up of a batch of videos.
 
-summary_agent = LlmAgent(
+    Args:
+        summary: The assembled markdown summary.
+
+    Returns:
+        The rewritten summary, or the summary unchanged if the model returns no text.
+    """
+    instruction = await instruction_provider("risk_summary_agent_instruction")(None)
+    llm_request = LlmRequest(
+        model=ollama_llm.model,
+        contents=[types.Content(role="user", parts=[types.Part(text=_polish_instruction(summary))])],
+        config=types.GenerateContentConfig(system_instruction=instruction),
+    )
+    assemble_request(polish_agent.name, llm_request)
+    polished = ""
+    async for llm_response in ollama_llm.generate_content_async(llm_request):
+        if not llm_response.partial and llm_response.content:
+            polished = "".join(part.text for part in llm_response.content.parts or [] if part.text and not part.thought)
+    return polished or summary
+
+
+class RiskSummaryAgent(BaseAgent):
+    """Agent that assembles the final assessment from the structured hazard reports."""
+
+    @property
+    def polish_agent(self) -> BaseAgent:
+        """The LLM agent that rewrites the assembled summary when polishing is requested."""
+        return self.sub_agents[0]
+
+    async def _run_async_impl(self, ctx: InvocationContext) -> typing.AsyncGenerator[Event, None]:
+        requested = ctx.session.state.get(RISK_REPORTS_STATE_KEY, [])
+        reports = {report_title(key): HazardReport.model_validate(ctx.session.state[key] or {})
+                   for key in requested if ctx.session.state.get(key) is not None}
+        missing = [report_title(key) for key in requested if ctx.session.state.get(key) is None]
+
+        if not ctx.session.state.get(POLISH_SUMMARY_STATE_KEY):
+            summary = build_summary(reports, missing=missing)
+            yield Event(invocation_id=ctx.invocation_id,
+                        author=self.name,
+                        branch=ctx.branch,
+                        content=types.Content(role="model", parts=[types.Part(text=summary)]),
+                        actions=EventActions(state_delta={RISK_SUMMARY_STATE_KEY: summary}))
+            return
+
+        summary = build_summary(reports, missing=missing, include_tables=False)
+        yield Event(invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    actions=EventActions(state_delta={RISK_SUMMARY_STATE_KEY: summary}))
+        polished = None
+        async with Aclosing(self.polish_agent.run_async(ctx)) as agen:
+            async for event in agen:
+                if event.author == self.polish_agent.name and event.is_final_response() and event.content:
+                    polished = "".join(part.text for part in event.content.parts or [] if part.text)
+                yield event
+        tables = build_hazard_tables(reports)
+        yield Event(invocation_id=ctx.invocation_id,
+                    author=self.name,
+                    branch=ctx.branch,
+                    content=types.Content(role="model", parts=[
+                        types.Part(text="\n\n".join(text for text in (polished or summary, tables) if text))
+                    ]))
+
+
+polish_agent = LlmAgent(
     model=ollama_llm,
+    name="RiskSummaryPolishAgent",
+    instruction=instruction_provider("risk_summary_agent_instruction"),
+    include_contents="none",
+    before_model_callback=[polish_with_summary_callback, enforce_token_budget_callback,
+                           utils.metrics.record_model_request_callback],
+    after_model_callback=[utils.metrics.record_model_response_callback],
+)
+
+summary_agent = RiskSummaryAgent(
     name="RiskSummaryAgent",
-    instruction=PromptService.get_latest_prompt("risk_summary_agent_instruction", app_name=os.getenv("APP_NAME", "Video_Risk_Assessment"), region=os.getenv("REGION", "us-central1")),
+    description="Assembles the final risk assessment from the analysers' hazard reports.",
+    sub_agents=[polish_agent],
     before_agent_callback=[utils.vra_util.logger_before_agent_callback],
     after_agent_callback=[utils.vra_util.logger_after_agent_callback],
 )
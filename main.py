@@ -4,10 +4,15 @@ This module defines the main entry point for the Video Risk Assessment (VRA) ser
 It sets up the FastAPI application, initializes the ADK runner with necessary services
 (database, memory, artifacts), and defines the API endpoints.
 """
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import mimetypes
 import os
+import threading
 import fastapi
-import google.adk.artifacts
-import google.adk.memory
 import google.adk.sessions.database_session_service
 import google.adk.sessions.sqlite_session_service
 import google.genai.types
@@ -15,98 +20,728 @@ import typing
 import uuid
 from dotenv import load_dotenv
 from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
-
-from vra_app.app import app  # import code from agent.py
-from utils.prompt_service import PromptService
-from utils.models import init_db, PromptCreate, PromptUpdate, PromptResponse
+from typing import Any, Dict, Optional, List
+
+from vra_app.app import APP_NAME, get_app
+from agents.risk_types import (POLISH_SUMMARY_STATE_KEY, RISK_REPORT_KEYS, RISK_REPORTS_STATE_KEY, parse_risk_types,
+                               report_title)
+from utils.admission import AdmissionRejected, Ticket, admission_controller
+from utils.artifact_store import VIDEO_ARTIFACT_STATE_KEY, ContentAddressedArtifactService
+from utils.hazard_report import HazardReport, build_rollup
+from utils.job_service import JobService
+from utils.metrics import render_metrics
+from utils.job_worker import CallbackUrlError, JobWorkerPool, check_callback_url
+from utils.memory_service import get_memory_service
+from utils.prompt_service import AGENT_PROMPT_NAMES, AsyncPromptService
+from utils.result_cache import get_result_cache, make_cache_key
+from utils.session_retention import SessionRetention
+from utils.models import init_db, async_engine, AssessmentJob, JobResponse, Prompt, PromptCreate, PromptUpdate, PromptResponse
+from utils.video_ingest import SpooledVideo, UploadSizeLimitMiddleware, UploadTooLargeError, spool_upload
+from utils.vra_util import subscribe_progress, unsubscribe_progress
 
 load_dotenv()  # load API keys and settings
-# Set a Runner using the imported application object
 
-rest_api_app = FastAPI()
+BATCH_MAX_VIDEOS = int(os.getenv("BATCH_MAX_VIDEOS", "50"))
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+
+
+async def initialise():
+    """Prepares the process to serve assessments.
+
+    Creates the database tables first, then builds the agents in a worker
+    thread while every agent prompt is loaded into the prompt cache with one
+    batched query. Building the agents reads no prompts, so it never races the
+    table creation. Nothing here runs at import time, so a slow database or
+    model client never blocks a worker from importing the app.
+    """
+    await asyncio.to_thread(init_db)
+    await asyncio.gather(asyncio.to_thread(get_runner), warm_prompt_cache())
+
 
-# Initialize database tables
-init_db()
+async def warm_prompt_cache():
+    """Loads every agent prompt into the prompt cache, logging instead of failing if it cannot."""
+    try:
+        await AsyncPromptService.get_prompt_versions(AGENT_PROMPT_NAMES, os.getenv("APP_NAME", "Video_Risk_Assessment"),
+                                                     os.getenv("REGION", "us-central1"))
+    except Exception as e:
+        logging.warning(f"Failed to warm the prompt cache: {e}")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(_: FastAPI):
+    """Initialises the process, then runs the assessment job workers and session retention."""
+    await initialise()
+    job_workers.start()
+    session_retention.start()
+    yield
+    await session_retention.stop()
+    await job_workers.stop()
+
+
+rest_api_app = FastAPI(lifespan=lifespan)
+rest_api_app.add_middleware(UploadSizeLimitMiddleware,
+                            files_per_request={"/video_risk_assessment/batch": BATCH_MAX_VIDEOS})
 
 session_service = google.adk.sessions.database_session_service.DatabaseSessionService(
-    db_url=os.getenv("DATABASE_URL"))
-memory_service = google.adk.memory.InMemoryMemoryService()
-runner = google.adk.Runner(
-    app=app,
-    session_service=session_service,
-    memory_service=memory_service,
-    artifact_service=google.adk.artifacts.FileArtifactService(root_dir="artifacts"),
-)
+    db_engine=async_engine)
+memory_service = get_memory_service()
+artifact_service = ContentAddressedArtifactService()
+session_retention = SessionRetention(artifact_service)
+result_cache = get_result_cache()
+
+_runner: Optional[google.adk.Runner] = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> google.adk.Runner:
+    """Returns the ADK runner, building the app and its agents on the first call."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            _runner = google.adk.Runner(
+                app=get_app(),
+                session_service=session_service,
+                memory_service=memory_service,
+                artifact_service=artifact_service,
+            )
+    return _runner
+
+
+async def store_video(user_id: str, session_id: str, video: SpooledVideo) -> Dict[str, Any]:
+    """Stores the uploaded video in the content-addressed artifact store for a session.
+
+    A clip that is already stored is only referenced again, so re-submitted
+    uploads are kept on disk once.
+
+    Args:
+        user_id: The user requesting the assessment.
+        session_id: The session the video is stored for.
+        video: The spooled video.
+
+    Returns:
+        The artifact reference recorded in session state.
+    """
+    filename = f"video{mimetypes.guess_extension(video.mime_type) or ''}"
+    version = await artifact_service.save_file(app_name=APP_NAME, user_id=user_id, filename=filename,
+                                               path=video.path, mime_type=video.mime_type,
+                                               session_id=session_id, sha256=video.sha256)
+    return {"filename": filename, "version": version, "sha256": video.sha256}
+
+
+async def store_job_video(user_id: str, video: SpooledVideo) -> str:
+    """Stores the video of a queued job in the content-addressed artifact store.
+
+    The video is kept as a user-scoped artifact of its own, so it survives a
+    restart until the job has finished.
+
+    Args:
+        user_id: The user submitting the job.
+        video: The spooled video.
+
+    Returns:
+        The filename of the stored artifact.
+    """
+    filename = f"user:job-{uuid.uuid4().hex}{mimetypes.guess_extension(video.mime_type) or ''}"
+    await artifact_service.save_file(app_name=APP_NAME, user_id=user_id, filename=filename, path=video.path,
+                                     mime_type=video.mime_type, sha256=video.sha256)
+    return filename
 
 
+async def stream_assessment(user_id: str, risk_type: str, video: SpooledVideo, polish: bool = False) -> \
+        typing.AsyncGenerator[Dict[str, Any], None]:
+    """Runs the agent pipeline on a spooled video and yields progress as it happens.
 
+    Yields agent start/finish events from the agent callbacks, each analyser's
+    report as soon as it is written to session state, and finally the summary
+    together with every report it was assembled from and the requested reports
+    that are missing because their analyser missed its deadline. A cached result
+    is yielded as the summary straight away; partial results are never cached.
+
+    Closing the generator, e.g. when the client disconnects, aborts the
+    invocation and cancels the in-flight agent run.
+
+    Args:
+        user_id: The unique identifier of the user requesting the assessment.
+        risk_type: The normalised risk type to analyze.
+        video: The spooled video to analyze.
+        polish: Whether the assembled summary is rewritten by an extra LLM pass.
+
+    Yields:
+        Progress events as dictionaries with an "event" key.
+    """
+    prompt_versions = await AsyncPromptService.get_prompt_versions(AGENT_PROMPT_NAMES,
+                                                                   os.getenv("APP_NAME", "Video_Risk_Assessment"),
+                                                                   os.getenv("REGION", "us-central1"))
+    cache_key = make_cache_key(video.sha256, risk_type, prompt_versions, polish)
+    cached = await result_cache.get(cache_key)
+    if cached is not None:
+        yield {"event": "summary", "cached": True,
+               "parts": [google.genai.types.Part.model_validate(part) for part in cached["parts"]],
+               "reports": cached["reports"], "missing": []}
+        return
+
+    session_id = str(uuid.uuid4())
+    state = {
+        "mime_type": video.mime_type,
+        "risk_type": risk_type,
+        POLISH_SUMMARY_STATE_KEY: polish,
+        VIDEO_ARTIFACT_STATE_KEY: await store_video(user_id, session_id, video)
+    }
+    session = await session_service.create_session(app_name=APP_NAME,
+                                                   user_id=user_id,
+                                                   state=state,
+                                                   session_id=session_id)
+    yield {"event": "session", "session_id": session.id}
+
+    progress = subscribe_progress(session.id)
+    abort = asyncio.Event()
+
+    async def run_pipeline():
+        try:
+            response: typing.AsyncGenerator[google.adk.events.Event] = get_runner().run_async(user_id=session.user_id,
+                                                                                        session_id=session.id,
+                                                                                        state_delta=state,
+                                                                                        new_message=google.genai.types.Content(
+                                                                                            role="user",
+                                                                                            parts=[
+                                                                                                google.genai.types.Part(
+                                                                                                    text="Analyse content for risks and hazards"
+                                                                                                ),
+                                                                                                video.as_part()
+                                                                                            ]),
+                                                                                        abort_signal=abort
+                                                                                        )
+
+            # 2. Consume the synchronous generator stream safely in a threadpool
+            # This loop ensures all sequential steps are completed and state is saved.
+            summarised = False
+            requested = []
+            reports = {}
+            remembered = []
+            async for event in response:
+                if event.content and not event.partial:
+                    remembered.append(event)
+                for key, value in (event.actions.state_delta or {}).items():
+                    if key == RISK_REPORTS_STATE_KEY:
+                        requested = value
+                    elif key in RISK_REPORT_KEYS:
+                        reports[key] = value
+                        progress.put_nowait({"event": "report", "agent": event.author, "key": key, "report": value})
+                if event.author == 'RiskSummaryAgent' and event.is_final_response() and event.content:
+                    print(f'final response {event.content.parts}')
+                    missing = [key for key in requested if key not in reports]
+                    if not missing:
+                        await result_cache.set(cache_key, {
+                            "parts": [part.model_dump(mode="json", exclude_none=True)
+                                      for part in event.content.parts],
+                            "reports": reports,
+                        })
+                    progress.put_nowait({"event": "summary", "cached": False, "parts": event.content.parts,
+                                         "reports": reports, "missing": missing})
+                    summarised = True
+            if not summarised:
+                raise RuntimeError("RiskSummaryAgent did not produce a final response.")
+            await remember_assessment(user_id, session.id, remembered)
+        finally:
+            progress.put_nowait(None)
+
+    pipeline = asyncio.create_task(run_pipeline())
+    try:
+        while (item := await progress.get()) is not None:
+            yield item
+        await pipeline
+    finally:
+        if not pipeline.done():
+            abort.set()
+            pipeline.cancel()
+        unsubscribe_progress(session.id)
+
+
+async def remember_assessment(user_id: str, session_id: str, events: List[google.adk.events.Event]):
+    """Adds the text events of a completed assessment to the user's memory, logging instead of failing.
+
+    Args:
+        user_id: The user the assessment ran for.
+        session_id: The session of the assessment.
+        events: The events of the run; only their text is stored.
+    """
+    try:
+        await memory_service.add_events_to_memory(app_name=APP_NAME, user_id=user_id, events=events,
+                                                  session_id=session_id)
+    except Exception as e:
+        logging.warning(f"Failed to add session {session_id} to memory: {e}")
+
+
+async def run_assessment(user_id: str, risk_type: str, video: SpooledVideo,
+                         polish: bool = False) -> List[google.genai.types.Part]:
+    """Runs the agent pipeline on a spooled video, answering from the result cache when possible.
+
+    Args:
+        user_id: The unique identifier of the user requesting the assessment.
+        risk_type: The normalised risk type to analyze.
+        video: The spooled video to analyze.
+        polish: Whether the assembled summary is rewritten by an extra LLM pass.
+
+    Returns:
+        The parts of the RiskSummaryAgent's final response.
+    """
+    parts = []
+    async for item in stream_assessment(user_id, risk_type, video, polish):
+        if item["event"] == "summary":
+            parts = item["parts"]
+    return parts
+
+
+async def run_job(job: AssessmentJob) -> List[Dict[str, Any]]:
+    """Runs a queued assessment job.
+
+    Args:
+        job: The claimed job.
+
+    Returns:
+        The serialised parts of the RiskSummaryAgent's final response.
+    """
+    video = await artifact_service.checkout_video(app_name=APP_NAME, user_id=job.user_id, sha256=job.video_sha256)
+    if video is None:
+        raise FileNotFoundError(f"The video of job {job.id} is no longer stored.")
+    try:
+        parts = await run_assessment(job.user_id, job.risk_type, video)
+    finally:
+        video.cleanup()
+    return [part.model_dump(mode="json", exclude_none=True) for part in parts]
+
+
+async def release_job(job: AssessmentJob):
+    """Deletes the stored video of a finished job.
+
+    Args:
+        job: The finished job.
+    """
+    await artifact_service.delete_artifact(app_name=APP_NAME, user_id=job.user_id, filename=job.video_artifact)
+
+
+job_workers = JobWorkerPool(run_job, release_job)
+
+
+class ClientDisconnected(Exception):
+    """Raised when the client goes away before its assessment finishes."""
+
+
+async def cancel_on_disconnect(request: fastapi.Request, awaitable: typing.Awaitable[Any]) -> Any:
+    """Awaits a request's work, cancelling it if the client disconnects first.
+
+    Starlette keeps running a handler whose client has gone, so without this an
+    abandoned request would keep its agent run and model calls going.
+
+    Args:
+        request: The request being handled; its body must already have been read.
+        awaitable: The work to run for the request.
+
+    Returns:
+        The result of the work.
+
+    Raises:
+        ClientDisconnected: If the client disconnected and the work was cancelled.
+    """
+    work = asyncio.ensure_future(awaitable)
+
+    async def watch():
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+        work.cancel()
+
+    watcher = asyncio.create_task(watch())
+    try:
+        return await work
+    except asyncio.CancelledError:
+        if watcher.done() and not watcher.cancelled():
+            raise ClientDisconnected()
+        raise
+    finally:
+        watcher.cancel()
+        work.cancel()
+
+
+def normalise_risk_type(risk_type: str) -> str:
+    """Validates and normalises a risk_type query parameter.
+
+    Args:
+        risk_type: The requested risk type.
+
+    Returns:
+        The canonical comma separated risk types.
+
+    Raises:
+        HTTPException: If an unknown risk type is requested.
+    """
+    try:
+        return ",".join(parse_risk_types(risk_type))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+async def admit(user_id: str, size: int) -> Ticket:
+    """Waits for the admission controller to admit an assessment run.
+
+    Args:
+        user_id: The user requesting the assessment.
+        size: The bytes of video the run holds, counted towards the in-flight bytes.
+
+    Returns:
+        The ticket to release once the run ends.
+
+    Raises:
+        HTTPException: 429 or 503 with a Retry-After header if the run is not admitted.
+    """
+    try:
+        return await admission_controller.acquire(user_id, size)
+    except AdmissionRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail,
+                            headers={"Retry-After": str(e.retry_after)})
 
 
 @rest_api_app.post("/video_risk_assessment")
-async def video_risk_assessment(user_id: str, risk_type: str, file: fastapi.UploadFile = File(...)):
+async def video_risk_assessment(request: fastapi.Request, user_id: str, risk_type: str, polish: bool = False,
+                                file: fastapi.UploadFile = File(...)):
     """Performs video risk assessment on an uploaded video file.
 
+    The upload is streamed to disk and the agents receive a file-backed
+    reference to it, so the video is never buffered whole in the handler.
+    Results are cached by video content hash, risk type and prompt versions,
+    so a re-submitted clip is answered without running the agents. If the
+    client disconnects, the in-flight agent run is cancelled.
+
     Args:
+        request: The incoming request, watched for a client disconnect.
         user_id: The unique identifier of the user requesting the assessment.
-        risk_type: The type of risk to analyze (e.g., 'fire', 'construction').
+        risk_type: The type of risk to analyze: 'fire', 'construction', a comma separated
+            list of these, or 'all'. Only the selected analysers are run.
+        polish: Whether the summary assembled from the hazard reports is rewritten by an
+            extra LLM pass. Off by default, so the analysers are the only model calls.
         file: The uploaded video file to be analyzed.
 
     Returns:
         The final response from the RiskSummaryAgent containing the assessment results.
+
+    Raises:
+        HTTPException: If risk_type is unknown, the service is saturated, the upload exceeds
+            the configured size limit, or the agent pipeline fails.
     """
+    risk_type = normalise_risk_type(risk_type)
+    ticket = await admit(user_id, file.size or 0)
+    video = None
     try:  # run_debug() requires ADK Python 1.18 or higher:
-        state = {
-            "mime_type": file.content_type,
-            "risk_type": risk_type
-        }
-        session = await session_service.create_session(app_name=app.name,
-                                                       user_id=user_id,
-                                                       state=state,
-                                                       session_id=str(uuid.uuid4()))
-        response: typing.AsyncGenerator[google.adk.events.Event] = runner.run_async(user_id=session.user_id,
-                                                                                    session_id=session.id,
-                                                                                    state_delta=state,
-                                                                                    new_message=google.genai.types.Content(
-                                                                                        role="user",
-                                                                                        parts=[
-                                                                                            google.genai.types.Part(
-                                                                                                text="Analyse content for risks and hazards",
-                                                                                                inline_data=google.genai.types.Blob(
-                                                                                                    mime_type=file.content_type,
-                                                                                                    data=await get_payload(
-                                                                                                        file)
-                                                                                                )
-                                                                                            )
-                                                                                        ])
-                                                                                    )
-
-        # 2. Consume the synchronous generator stream safely in a threadpool
-        # This loop ensures all sequential steps are completed and state is saved.
-        async for event in response:
-            if event.author == 'RiskSummaryAgent' and event.is_final_response():
-                print(f'final response {event.content.parts}')
-                return event.content.parts
+        video = await get_payload(file)
+        return await cancel_on_disconnect(request, run_assessment(user_id, risk_type, video, polish))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ClientDisconnected:
+        logging.info(f"Client of user {user_id} disconnected; assessment cancelled")
+        raise HTTPException(status_code=499, detail="Client disconnected")
+    except Exception as e:
+        print(f"An error occurred during agent execution: {e}")
+        raise HTTPException(status_code=500, detail=f"Video risk assessment failed: {str(e)}")
+    finally:
+        admission_controller.release(ticket)
+        if video:
+            video.cleanup()
+
+
+async def get_payload(file: UploadFile) -> SpooledVideo:
+    """Streams the content of an uploaded file to disk.
+
+    Args:
+        file: The uploaded file object.
+
+    Returns:
+        The spooled video, backed by a temporary file.
+
+    Raises:
+        UploadTooLargeError: If the upload exceeds the upload limit.
+    """
+    return await spool_upload(file)
+
+
+def format_progress(item: Dict[str, Any], stream_format: str) -> str:
+    """Serialises a progress event for the streaming endpoint.
 
+    Args:
+        item: The progress event.
+        stream_format: Either "sse" or "ndjson".
+
+    Returns:
+        The event encoded as a Server-Sent Event or an NDJSON line.
+    """
+    if "parts" in item:
+        item = dict(item, parts=[part.model_dump(mode="json", exclude_none=True) for part in item["parts"]])
+    data = json.dumps(item)
+    if stream_format == "ndjson":
+        return data + "\n"
+    return f"event: {item['event']}\ndata: {data}\n\n"
 
 
+@rest_api_app.post("/video_risk_assessment/stream")
+async def video_risk_assessment_stream(user_id: str, risk_type: str, polish: bool = False,
+                                       stream_format: str = Query("sse", pattern="^(sse|ndjson)$"),
+                                       file: fastapi.UploadFile = File(...)):
+    """Performs video risk assessment and streams progress while the agents run.
+
+    Emits agent_start/agent_finish events, each analyser's report as soon as it
+    is written, and the final summary, as Server-Sent Events or NDJSON. If the
+    client disconnects the in-flight run is cancelled.
+
+    Args:
+        user_id: The unique identifier of the user requesting the assessment.
+        risk_type: The type of risk to analyze: 'fire', 'construction', a comma separated
+            list of these, or 'all'.
+        polish: Whether the assembled summary is rewritten by an extra LLM pass.
+        stream_format: "sse" for Server-Sent Events or "ndjson" for newline delimited JSON.
+        file: The uploaded video file to be analyzed.
+
+    Returns:
+        A streaming response of progress events.
+
+    Raises:
+        HTTPException: If risk_type is unknown, the service is saturated or the upload exceeds
+            the configured size limit.
+    """
+    risk_type = normalise_risk_type(risk_type)
+    ticket = await admit(user_id, file.size or 0)
+    try:
+        video = await get_payload(file)
+    except UploadTooLargeError as e:
+        admission_controller.release(ticket)
+        raise HTTPException(status_code=413, detail=str(e))
+    except BaseException:
+        admission_controller.release(ticket)
+        raise
+
+    async def events():
+        try:
+            async for item in stream_assessment(user_id, risk_type, video, polish):
+                yield format_progress(item, stream_format)
+        except Exception as e:
+            print(f"An error occurred during agent execution: {e}")
+            yield format_progress({"event": "error", "detail": str(e)}, stream_format)
+        finally:
+            admission_controller.release(ticket)
+            video.cleanup()
+
+    media_type = "application/x-ndjson" if stream_format == "ndjson" else "text/event-stream"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache"})
+
+
+# ==================== Batch Assessment API ====================
+
+# Bounds the videos assessed at once across all batches, so concurrent batches share one pool of runs.
+batch_slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+
+async def assess_batch_video(user_id: str, risk_type: str, name: str, video: SpooledVideo) -> Dict[str, Any]:
+    """Assesses one video of a batch once a batch slot is free.
+
+    Args:
+        user_id: The user requesting the assessment.
+        risk_type: The normalised risk type to analyze.
+        name: The name of the video in the batch response.
+        video: The spooled video.
 
+    Returns:
+        The video's result: its summary parts and reports, or the error that stopped it.
+    """
+    result = {"name": name, "sha256": video.sha256, "status": "failed", "cached": False,
+              "parts": [], "reports": {}, "missing": [], "error": None}
+    try:
+        async with batch_slots:
+            async for item in stream_assessment(user_id, risk_type, video):
+                if item["event"] == "summary":
+                    result.update(status="completed", cached=item["cached"], reports=item["reports"],
+                                  missing=item["missing"],
+                                  parts=[part.model_dump(mode="json", exclude_none=True) for part in item["parts"]])
     except Exception as e:
-        print(f"An error occurred during agent execution: {e}")
+        print(f"An error occurred during agent execution for {name}: {e}")
+        result["error"] = str(e)
+    return result
 
 
-async def get_payload(file: UploadFile) -> bytes:
-    """Reads the content of an uploaded file.
+async def build_site_rollup(results: List[Dict[str, Any]], polish: bool) -> Dict[str, Any]:
+    """Assembles the site-level summary of a batch from the reports of its completed videos.
 
     Args:
-        file: The uploaded file object.
+        results: The per-video results of the batch.
+        polish: Whether the roll-up is rewritten by one LLM pass.
 
     Returns:
-        The content of the file as bytes.
+        The roll-up as a response part.
     """
-    video_stream = await file.read()
-    return video_stream
+    videos = {result["name"]: {report_title(key): HazardReport.model_validate(report or {})
+                               for key, report in result["reports"].items()}
+              for result in results if result["status"] == "completed"}
+    summary = build_rollup(videos)
+    if polish:
+        from agents.sub_agents.summarizer_agent.summariser_agent import polish_summary
+        summary = await polish_summary(summary)
+    return google.genai.types.Part(text=summary).model_dump(mode="json", exclude_none=True)
+
+
+@rest_api_app.post("/video_risk_assessment/batch")
+async def video_risk_assessment_batch(request: fastapi.Request, user_id: str, risk_type: str, rollup: bool = True, polish: bool = False,
+                                      artifacts: List[str] = Query([]),
+                                      files: List[fastapi.UploadFile] = File([])):
+    """Performs video risk assessment on a batch of videos, e.g. the clips of a site audit.
+
+    The videos are uploaded files and/or references to videos already in the
+    artifact store, given by their SHA-256 digest. They are assessed over a
+    pool of BATCH_CONCURRENCY runs shared by all batches, each answered from
+    the result cache when possible, and a failed video does not fail the batch.
+    The per-video summaries are assembled without model calls; the site roll-up
+    is assembled from all the reports at once, and `polish` rewrites only the
+    roll-up, in a single LLM pass for the whole batch. If the client
+    disconnects, the in-flight agent runs are cancelled.
+
+    Args:
+        request: The incoming request, watched for a client disconnect.
+        user_id: The unique identifier of the user requesting the assessment.
+        risk_type: The type of risk to analyze: 'fire', 'construction', a comma separated
+            list of these, or 'all'.
+        rollup: Whether to include a site-level summary of all the videos.
+        polish: Whether the site-level summary is rewritten by an extra LLM pass.
+        artifacts: SHA-256 digests of videos the user has stored before, e.g. by an earlier assessment.
+        files: The uploaded video files to assess.
+
+    Returns:
+        The result of every video, in request order (uploads first), and the site roll-up.
+
+    Raises:
+        HTTPException: If the batch is empty or too large, risk_type is unknown, a referenced
+            video is not stored, the service is saturated or an upload exceeds the size limit.
+    """
+    risk_type = normalise_risk_type(risk_type)
+    if not files and not artifacts:
+        raise HTTPException(status_code=400, detail="A batch needs at least one file or artifact.")
+    if len(files) + len(artifacts) > BATCH_MAX_VIDEOS:
+        raise HTTPException(status_code=400, detail=f"A batch holds at most {BATCH_MAX_VIDEOS} videos.")
+
+    # Referenced videos are hard-linked from the store, so only the uploads count as in-flight bytes.
+    ticket = await admit(user_id, sum(file.size or 0 for file in files))
+    videos: List[typing.Tuple[str, SpooledVideo]] = []
+    try:
+        for file in files:
+            videos.append((file.filename or f"video-{len(videos) + 1}", await get_payload(file)))
+        for sha256 in artifacts:
+            video = await artifact_service.checkout_video(app_name=APP_NAME, user_id=user_id, sha256=sha256)
+            if video is None:
+                raise HTTPException(status_code=404, detail=f"Artifact {sha256} not found")
+            videos.append((sha256, video))
+
+        results = await cancel_on_disconnect(request, asyncio.gather(
+            *(assess_batch_video(user_id, risk_type, name, video) for name, video in videos)))
+        return {"videos": results,
+                "rollup": await build_site_rollup(results, polish) if rollup else None}
+    except HTTPException:
+        raise
+    except ClientDisconnected:
+        logging.info(f"Client of user {user_id} disconnected; batch assessment cancelled")
+        raise HTTPException(status_code=499, detail="Client disconnected")
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        print(f"An error occurred during batch assessment: {e}")
+        raise HTTPException(status_code=500, detail=f"Batch video risk assessment failed: {str(e)}")
+    finally:
+        admission_controller.release(ticket)
+        for _, video in videos:
+            video.cleanup()
+
+
+# ==================== Assessment Job APIs ====================
+
+@rest_api_app.post("/jobs", response_model=JobResponse, status_code=202)
+async def create_job(user_id: str, risk_type: str, callback_url: Optional[str] = None,
+                     file: fastapi.UploadFile = File(...)):
+    """Queues a video risk assessment and returns immediately.
+
+    The job is stored in the database and picked up by the assessment job
+    workers. Poll GET /jobs/{job_id} for its status, or pass a callback_url to
+    be notified with the final job state.
+
+    Args:
+        user_id: The unique identifier of the user requesting the assessment.
+        risk_type: The type of risk to analyze: 'fire', 'construction', a comma separated
+            list of these, or 'all'.
+        callback_url: Optional http(s) URL that receives a POST with the job once it completes;
+            it must resolve to a public address.
+        file: The uploaded video file to be analyzed.
+
+    Returns:
+        The queued job.
+
+    Raises:
+        HTTPException: If risk_type is unknown, callback_url is not allowed, the upload exceeds
+            the configured size limit, or the job cannot be queued.
+    """
+    risk_type = normalise_risk_type(risk_type)
+    if callback_url:
+        try:
+            await asyncio.to_thread(check_callback_url, callback_url)
+        except CallbackUrlError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    video = None
+    video_artifact = None
+    try:
+        video = await get_payload(file)
+        video_artifact = await store_job_video(user_id, video)
+        job = await asyncio.to_thread(JobService.create_job, user_id, risk_type, video_artifact, video.mime_type,
+                                      video.size, video.sha256, callback_url)
+        return JobService.to_response(job)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        if video_artifact:
+            await artifact_service.delete_artifact(app_name=APP_NAME, user_id=user_id, filename=video_artifact)
+        raise HTTPException(status_code=500, detail=f"Failed to queue assessment job: {str(e)}")
+    finally:
+        if video:
+            video.cleanup()
+
+
+@rest_api_app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Get the status, and once finished the result, of an assessment job.
+
+    Args:
+        job_id: The ID of the job.
+
+    Returns:
+        The job object.
+
+    Raises:
+        HTTPException: If the job is not found.
+    """
+    try:
+        job = await asyncio.to_thread(JobService.get_job, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"Job with ID {job_id} not found")
+        return JobService.to_response(job)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to fetch job: {str(e)}")
+
+
+# ==================== Metrics ====================
+
+@rest_api_app.get("/metrics")
+async def metrics():
+    """Expose the per-agent latency, model call and token metrics in the Prometheus text format.
+
+    Returns:
+        The current metrics.
+    """
+    content, content_type = render_metrics()
+    return fastapi.Response(content=content, media_type=content_type)
 
 
 # ==================== Prompt Management APIs ====================
@@ -129,7 +764,7 @@ async def create_prompt(prompt: PromptCreate):
         region = prompt.region or os.getenv("REGION", "us-central1")
 
         # Check if prompt already exists
-        existing_prompt = PromptService.get_prompt_by_name(prompt.name, app_name, region)
+        existing_prompt = await AsyncPromptService.get_prompt_by_name(prompt.name, app_name, region)
         if existing_prompt:
             raise HTTPException(
                 status_code=400,
@@ -137,10 +772,7 @@ async def create_prompt(prompt: PromptCreate):
             )
 
         # Create new prompt
-        PromptService.add_prompt(prompt.name, prompt.content, app_name, region)
-        
-        # Fetch and return the created prompt
-        created_prompt = PromptService.get_prompt_by_name(prompt.name, app_name, region)
+        created_prompt = await AsyncPromptService.add_prompt(prompt.name, prompt.content, app_name, region)
         return PromptResponse(
             id=created_prompt.id,
             name=created_prompt.name,
@@ -156,38 +788,127 @@ async def create_prompt(prompt: PromptCreate):
         raise HTTPException(status_code=500, detail=f"Failed to create prompt: {str(e)}")
 
 
-@rest_api_app.get("/prompts", response_model=List[PromptResponse])
+@rest_api_app.get("/prompts", response_model=List[PromptResponse], response_model_exclude_none=True)
 async def get_all_prompts(
+    request: fastapi.Request,
+    response: fastapi.Response,
     app_name: Optional[str] = Query(None, description="Filter by application name"),
-    region: Optional[str] = Query(None, description="Filter by region")
+    region: Optional[str] = Query(None, description="Filter by region"),
+    after_id: Optional[int] = Query(None, description="Return prompts with an ID greater than this cursor"),
+    limit: int = Query(100, ge=1, le=1000, description="Maximum number of prompts to return"),
+    include_content: bool = Query(True, description="Whether to include the prompt content")
 ):
-    """Get all prompts, optionally filtered by app_name and/or region.
+    """Get prompts in ID order, optionally filtered by app_name and/or region.
+
+    Results are paginated by keyset on the prompt ID: when a page is full the
+    X-Next-Cursor header carries the after_id for the next page. The ETag
+    changes whenever a prompt matching the filters is created, updated or
+    deleted, and a matching If-None-Match returns 304 without loading rows.
 
     Args:
+        request: The incoming request, read for If-None-Match.
+        response: The outgoing response, used to set ETag and X-Next-Cursor.
         app_name: Optional filter for application name.
         region: Optional filter for region.
+        after_id: Optional cursor from the previous page's X-Next-Cursor header.
+        limit: Maximum number of prompts to return.
+        include_content: Whether to include the prompt content.
 
     Returns:
-        List of all prompts matching the filters.
+        The page of prompts matching the filters.
     """
     try:
-        prompts = PromptService.get_all_prompts(app_name, region)
-        return [
-            PromptResponse(
-                id=p.id,
-                name=p.name,
-                app_name=p.app_name,
-                region=p.region,
-                version=p.version,
-                content=p.content,
-                created_at=str(p.created_at)
-            )
-            for p in prompts
-        ]
+        fingerprint = await AsyncPromptService.get_prompts_fingerprint(app_name, region)
+        etag = 'W/"' + hashlib.sha1(
+            json.dumps([fingerprint, app_name, region, after_id, limit, include_content]).encode("utf-8")
+        ).hexdigest() + '"'
+        if request.headers.get("if-none-match") == etag:
+            return fastapi.Response(status_code=304, headers={"ETag": etag})
+
+        prompts = await AsyncPromptService.get_all_prompts(app_name, region, after_id, limit, include_content)
+        response.headers["ETag"] = etag
+        if len(prompts) == limit:
+            response.headers["X-Next-Cursor"] = str(prompts[-1].id)
+        return [to_prompt_response(p, include_content) for p in prompts]
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to fetch prompts: {str(e)}")
 
 
+def to_prompt_response(prompt: Prompt, include_content: bool = True) -> PromptResponse:
+    """Converts a prompt row into its API response.
+
+    Args:
+        prompt: The prompt to convert.
+        include_content: Whether to include the prompt content.
+
+    Returns:
+        The PromptResponse for the prompt.
+    """
+    return PromptResponse(
+        id=prompt.id,
+        name=prompt.name,
+        app_name=prompt.app_name,
+        region=prompt.region,
+        version=prompt.version,
+        content=prompt.content if include_content else None,
+        created_at=str(prompt.created_at)
+    )
+
+
+@rest_api_app.post("/prompts:bulk", response_model=List[PromptResponse])
+async def bulk_upsert_prompts(prompts: List[PromptCreate]):
+    """Create or update many prompts in a single transaction.
+
+    Prompts are upserted on (name, app_name, region); existing prompts whose
+    content changed get the new content and a bumped version.
+
+    Args:
+        prompts: The prompts to upsert.
+
+    Returns:
+        The prompts that were created or changed.
+    """
+    try:
+        default_app_name = os.getenv("APP_NAME", "Video_Risk_Assessment")
+        default_region = os.getenv("REGION", "us-central1")
+        upserted = await AsyncPromptService.bulk_upsert_prompts([
+            {
+                "name": prompt.name,
+                "content": prompt.content,
+                "app_name": prompt.app_name or default_app_name,
+                "region": prompt.region or default_region,
+            }
+            for prompt in prompts
+        ])
+        return [to_prompt_response(p) for p in upserted]
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to upsert prompts: {str(e)}")
+
+
+@rest_api_app.get("/prompts:export")
+async def export_prompts(
+    app_name: Optional[str] = Query(None, description="Filter by application name"),
+    region: Optional[str] = Query(None, description="Filter by region")
+):
+    """Stream all prompts as newline delimited JSON, optionally filtered.
+
+    The output can be fed back to POST /prompts:bulk to promote prompt sets
+    between regions and app names.
+
+    Args:
+        app_name: Optional filter for application name.
+        region: Optional filter for region.
+
+    Returns:
+        A streaming NDJSON response with one prompt per line.
+    """
+    async def lines():
+        async for prompt in AsyncPromptService.stream_prompts(app_name, region):
+            yield to_prompt_response(prompt).model_dump_json() + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
 @rest_api_app.get("/prompts/{prompt_id}", response_model=PromptResponse)
 async def get_prompt_by_id(prompt_id: int):
     """Get a specific prompt by its ID.
@@ -202,7 +923,7 @@ async def get_prompt_by_id(prompt_id: int):
         HTTPException: If the prompt is not found.
     """
     try:
-        prompt = PromptService.get_prompt_by_id(prompt_id)
+        prompt = await AsyncPromptService.get_prompt_by_id(prompt_id)
         if not prompt:
             raise HTTPException(status_code=404, detail=f"Prompt with ID {prompt_id} not found")
         
@@ -236,7 +957,7 @@ async def update_prompt(prompt_id: int, prompt_update: PromptUpdate):
         HTTPException: If the prompt is not found.
     """
     try:
-        updated_prompt = PromptService.update_prompt(prompt_id, prompt_update.content)
+        updated_prompt = await AsyncPromptService.update_prompt(prompt_id, prompt_update.content)
         if not updated_prompt:
             raise HTTPException(status_code=404, detail=f"Prompt with ID {prompt_id} not found")
         
@@ -266,7 +987,7 @@ async def delete_prompt(prompt_id: int):
         HTTPException: If the prompt is not found.
     """
     try:
-        deleted = PromptService.delete_prompt(prompt_id)
+        deleted = await AsyncPromptService.delete_prompt(prompt_id)
         if not deleted:
             raise HTTPException(status_code=404, detail=f"Prompt with ID {prompt_id} not found")
         return None
@@ -0,0 +1,204 @@
+"""Offline benchmark for the video risk assessment API.
+
+Drives POST /video_risk_assessment in-process with synthetic videos of several
+sizes at several concurrency levels, against the deterministic fake LLM backend
+(utils/fake_llm.py), and writes latency percentiles, throughput, peak RSS and
+the time spent in each agent as JSON so runs can be compared.
+
+By default a throwaway SQLite database is created and seeded with the agent
+prompts. Pass --database-url to benchmark against an existing, seeded database.
+
+Usage:
+    python scripts/benchmark.py --sizes-mb 1 16 --concurrency 1 4 8 --requests 16 --output benchmark.json
+"""
+
+import argparse
+import asyncio
+import collections
+import json
+import math
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+# Add the project root to the python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def parse_args():
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark the assessment API against a fake LLM backend.")
+    parser.add_argument("--sizes-mb", type=float, nargs="+", default=[1, 16], help="Synthetic video sizes in MB.")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8], help="Concurrent clients.")
+    parser.add_argument("--requests", type=int, default=16, help="Requests per size and concurrency level.")
+    parser.add_argument("--risk-type", default="all", help="risk_type sent with every request.")
+    parser.add_argument("--latency-ms", type=float, default=200, help="Median fake model latency.")
+    parser.add_argument("--latency-sigma", type=float, default=0.3, help="Log-normal sigma of the model latency.")
+    parser.add_argument("--output-tokens", type=int, default=300, help="Median fake model output tokens.")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the fake backend and the synthetic videos.")
+    parser.add_argument("--database-url", help="Existing, seeded database to use instead of a temporary one.")
+    parser.add_argument("--output", default="benchmark_results.json", help="Path of the JSON results.")
+    return parser.parse_args()
+
+
+def configure_environment(args) -> bool:
+    """Point the service at the fake backend before it is imported.
+
+    Returns:
+        Whether a temporary database was configured and needs seeding.
+    """
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ["FAKE_LLM_LATENCY_MS"] = str(args.latency_ms)
+    os.environ["FAKE_LLM_LATENCY_SIGMA"] = str(args.latency_sigma)
+    os.environ["FAKE_LLM_OUTPUT_TOKENS"] = str(args.output_tokens)
+    os.environ["FAKE_LLM_SEED"] = str(args.seed)
+    os.environ.setdefault("LLM_MODEL", "fake/benchmark")
+    os.environ.setdefault("RESULT_CACHE_BACKEND", "none")
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+        return False
+    database_path = os.path.join(tempfile.mkdtemp(prefix="vra_benchmark_"), "benchmark.sqlite")
+    os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{database_path}"
+    return True
+
+
+def current_rss_bytes() -> int:
+    """Return the resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class AgentTimer:
+    """Collects the time spent in each agent from the agent progress events."""
+
+    def __init__(self):
+        self.started = {}
+        self.durations = collections.defaultdict(list)
+
+    def __call__(self, session_id, event):
+        key = (session_id, event["agent"])
+        if event["event"] == "agent_start":
+            self.started[key] = event["time"]
+        elif event["event"] == "agent_finish" and key in self.started:
+            self.durations[event["agent"]].append(event["time"] - self.started.pop(key))
+
+    def reset(self):
+        self.started.clear()
+        self.durations.clear()
+
+    def summary(self):
+        return {agent: {"count": len(values),
+                        "total_seconds": round(sum(values), 4),
+                        "mean_seconds": round(sum(values) / len(values), 4),
+                        "p95_seconds": round(percentile(values, 0.95), 4)}
+                for agent, values in sorted(self.durations.items())}
+
+
+async def run_scenario(client, args, size_mb, concurrency, agent_timer):
+    """Run one size and concurrency combination and return its measurements."""
+    rng = random.Random(f"{args.seed}-{size_mb}-{concurrency}")
+    size = int(size_mb * 1024 * 1024)
+    pending = collections.deque(range(args.requests))
+    latencies = []
+    statuses = collections.Counter()
+    peak_rss = current_rss_bytes()
+    agent_timer.reset()
+
+    async def sample_rss():
+        nonlocal peak_rss
+        while True:
+            peak_rss = max(peak_rss, current_rss_bytes())
+            await asyncio.sleep(0.05)
+
+    async def worker(index):
+        while pending:
+            request = pending.popleft()
+            payload = rng.randbytes(size)
+            started = time.perf_counter()
+            response = await client.post("/video_risk_assessment",
+                                         params={"user_id": f"benchmark-{index}", "risk_type": args.risk_type},
+                                         files={"file": (f"synthetic-{request}.mp4", payload, "video/mp4")})
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+
+    sampler = asyncio.create_task(sample_rss())
+    started = time.perf_counter()
+    await asyncio.gather(*[worker(index) for index in range(concurrency)])
+    wall_seconds = time.perf_counter() - started
+    sampler.cancel()
+
+    return {
+        "size_mb": size_mb,
+        "concurrency": concurrency,
+        "requests": args.requests,
+        "status_counts": {str(status): count for status, count in sorted(statuses.items())},
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_rps": round(len(latencies) / wall_seconds, 4),
+        "latency_seconds": {
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "mean": sum(latencies) / len(latencies) if latencies else None,
+            "max": max(latencies, default=None),
+        },
+        "peak_rss_mb": round(peak_rss / (1024 * 1024), 2),
+        "agents": agent_timer.summary(),
+    }
+
+
+async def run_benchmark(args):
+    """Run every scenario against the in-process API and return the results."""
+    import httpx
+    import main
+    from utils.vra_util import add_progress_hook
+
+    agent_timer = AgentTimer()
+    add_progress_hook(agent_timer)
+    results = {
+        "config": {key: value for key, value in vars(args).items() if key != "database_url"},
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "scenarios": [],
+    }
+    transport = httpx.ASGITransport(app=main.rest_api_app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        # Warm up imports, the database and the prompt cache outside the measurements.
+        await client.post("/video_risk_assessment", params={"user_id": "benchmark-warmup", "risk_type": "all"},
+                          files={"file": ("warmup.mp4", b"\0" * 1024, "video/mp4")})
+        for size_mb in args.sizes_mb:
+            for concurrency in args.concurrency:
+                print(f"Running {args.requests} requests of {size_mb} MB at concurrency {concurrency}...")
+                scenario = await run_scenario(client, args, size_mb, concurrency, agent_timer)
+                results["scenarios"].append(scenario)
+                latency = scenario["latency_seconds"]
+                print(f"  p50={latency['p50']} p95={latency['p95']} p99={latency['p99']} "
+                      f"throughput={scenario['throughput_rps']} rps peak_rss={scenario['peak_rss_mb']} MB "
+                      f"statuses={scenario['status_counts']}")
+    return results
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if configure_environment(args):
+        from seed_prompts import seed_prompts
+        seed_prompts()
+    results = asyncio.run(run_benchmark(args))
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(f"Results written to {args.output}")
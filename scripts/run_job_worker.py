@@ -0,0 +1,39 @@
+"""Script to run assessment job workers without serving the HTTP API.
+
+Run the API with JOB_WORKERS=0 to only ingest uploads, and start this script
+on the agent runner nodes to drain the job queue. Both must share the
+DATABASE_URL database and the UPLOAD_SPOOL_DIR directory.
+
+Usage:
+    JOB_WORKERS=4 python scripts/run_job_worker.py
+"""
+
+import asyncio
+import sys
+import os
+
+# Add the project root to the python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import main
+
+
+async def run_workers():
+    """Run the job workers until interrupted."""
+    await main.initialise()
+    main.job_workers.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await main.job_workers.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(run_workers())
+    except KeyboardInterrupt:
+        print("Job workers stopped.")
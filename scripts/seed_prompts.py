@@ -54,9 +54,11 @@ def seed_prompts():
     app_name = os.getenv("APP_NAME", "Video_Risk_Assessment")
     region = os.getenv("REGION", "us-central1")
 
-    for name, content in prompts.items():
-        print(f"Adding/Updating prompt: {name}")
-        PromptService.add_prompt(name, content, app_name, region)
+    print(f"Adding/Updating prompts: {', '.join(prompts)}")
+    PromptService.bulk_upsert_prompts([
+        {"name": name, "content": content, "app_name": app_name, "region": region}
+        for name, content in prompts.items()
+    ])
     
     print("Prompts seeded successfully.")
 
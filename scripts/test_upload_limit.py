@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Regression checks for the upload size limit.
+
+Runs UploadSizeLimitMiddleware in process around a small upload endpoint, so
+no server needs to be running. Oversize uploads must be answered with 413,
+both when the client declares a Content-Length and when it streams the body
+chunked without one.
+
+Usage:
+    python scripts/test_upload_limit.py
+"""
+
+import os
+import sys
+
+os.environ["MAX_UPLOAD_BYTES"] = "1000"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from utils.video_ingest import UploadSizeLimitMiddleware, upload_limit
+
+BOUNDARY = "upload-limit-boundary"
+
+app = FastAPI()
+app.add_middleware(UploadSizeLimitMiddleware)
+
+
+@app.post("/upload")
+async def upload(file: UploadFile = File(...)):
+    return {"size": len(await file.read())}
+
+
+client = TestClient(app)
+
+
+def multipart_body(size: int) -> bytes:
+    """Builds a multipart body holding one file of the given size."""
+    return (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"a.mp4\"\r\n"
+            f"Content-Type: video/mp4\r\n\r\n").encode() + b"x" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def chunked(body: bytes, chunk_size: int = 16 * 1024):
+    """Yields a body in chunks, so it is sent without a Content-Length."""
+    for start in range(0, len(body), chunk_size):
+        yield body[start:start + chunk_size]
+
+
+def post(body, **headers):
+    return client.post("/upload", content=body,
+                       headers={"Content-Type": f"multipart/form-data; boundary={BOUNDARY}", **headers})
+
+
+def test_small_upload_is_accepted():
+    """Test that an upload within the limit reaches the endpoint."""
+    response = post(multipart_body(100))
+    assert response.status_code == 200, response.text
+    assert response.json() == {"size": 100}
+
+
+def test_oversize_upload_with_content_length_is_rejected():
+    """Test that an oversize upload is rejected from its Content-Length."""
+    response = post(multipart_body(upload_limit() * 200))
+    assert response.status_code == 413, response.text
+
+
+def test_oversize_chunked_upload_is_rejected():
+    """Test that an oversize upload without a Content-Length is rejected while it streams in."""
+    response = post(chunked(multipart_body(upload_limit() * 200)))
+    assert "content-length" not in response.request.headers
+    assert response.status_code == 413, response.text
+    assert "exceeds the limit" in response.json()["detail"]
+
+
+def main():
+    """Runs every check, printing the outcome of each."""
+    failed = 0
+    for check in (test_small_upload_is_accepted, test_oversize_upload_with_content_length_is_rejected,
+                  test_oversize_chunked_upload_is_rejected):
+        try:
+            check()
+            print(f"✅ {check.__doc__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"❌ {check.__doc__} {e}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
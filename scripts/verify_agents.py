@@ -1,5 +1,7 @@
 """Script to verify that agents can fetch prompts from the database."""
 
+import asyncio
+import inspect
 import sys
 import os
 
@@ -9,37 +11,55 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from dotenv import load_dotenv
 load_dotenv()
 
-try:
+
+async def resolve_instruction(instruction):
+    """Resolve an agent instruction, awaiting it if it is an instruction provider."""
+    if callable(instruction):
+        instruction = instruction(None)
+    if inspect.isawaitable(instruction):
+        instruction = await instruction
+    return instruction
+
+
+async def verify():
+    """Verify every agent prompt within one event loop, which the async database pool is bound to."""
     print("Importing agents...")
     from agents.sub_agents.construction_risk_analyser.construction_risk_agent import construction_risk_agent
     from agents.sub_agents.fire_risk_analyser.fire_risk_agent import fire_risk_agent
     from agents.sub_agents.summarizer_agent.summariser_agent import summary_agent
-    from agents.sub_agents.parallel_planner.parallel_planner_agent import parallel_planner
+    from utils.prompt_service import instruction_provider
 
     print("Verifying construction_risk_agent instruction...")
-    if not construction_risk_agent.instruction or "Construction Safety Manager" not in construction_risk_agent.instruction:
+    construction_risk_agent_instruction = await resolve_instruction(construction_risk_agent.instruction)
+    if not construction_risk_agent_instruction or "Construction Safety Manager" not in construction_risk_agent_instruction:
         print("FAILED: construction_risk_agent instruction not loaded correctly.")
     else:
         print("PASSED: construction_risk_agent instruction loaded.")
 
     print("Verifying fire_risk_agent instruction...")
-    if not fire_risk_agent.instruction or "Fire Safety Officer" not in fire_risk_agent.instruction:
+    fire_risk_agent_instruction = await resolve_instruction(fire_risk_agent.instruction)
+    if not fire_risk_agent_instruction or "Fire Safety Officer" not in fire_risk_agent_instruction:
         print("FAILED: fire_risk_agent instruction not loaded correctly.")
     else:
         print("PASSED: fire_risk_agent instruction loaded.")
 
     print("Verifying summary_agent instruction...")
-    if not summary_agent.instruction or "final report generator" not in summary_agent.instruction:
+    summary_agent_instruction = await resolve_instruction(summary_agent.polish_agent.instruction)
+    if not summary_agent_instruction or "final report generator" not in summary_agent_instruction:
         print("FAILED: summary_agent instruction not loaded correctly.")
     else:
         print("PASSED: summary_agent instruction loaded.")
 
     print("Verifying parallel_planner description...")
-    if not parallel_planner.description or "parallel_planner who handles" not in parallel_planner.description:
+    parallel_planner_description = await resolve_instruction(instruction_provider("parallel_planner_description"))
+    if not parallel_planner_description or "parallel_planner who handles" not in parallel_planner_description:
         print("FAILED: parallel_planner description not loaded correctly.")
     else:
         print("PASSED: parallel_planner description loaded.")
 
+
+try:
+    asyncio.run(verify())
 except Exception as e:
     print(f"An error occurred: {e}")
     sys.exit(1)
@@ -0,0 +1,174 @@
+"""Admission control for the assessment endpoints.
+
+Every assessment run must be admitted before it starts. The controller caps the
+number of concurrent runs and the total bytes of the payloads in flight, and
+parks further requests in a bounded wait queue. Requests that cannot be admitted
+within ADMISSION_QUEUE_TIMEOUT_SECONDS, or that find the queue full, are
+rejected with 503; a user that already holds ADMISSION_MAX_RUNS_PER_USER runs
+or queue places is rejected with 429. Freed slots go to the waiting user with
+the fewest running assessments, so one heavy tenant cannot starve the others.
+"""
+
+import asyncio
+import dataclasses
+import math
+import os
+import time
+import typing
+from collections import Counter
+
+ADMISSION_MAX_RUNS = int(os.getenv("ADMISSION_MAX_RUNS", "4"))
+ADMISSION_MAX_INFLIGHT_BYTES = int(os.getenv("ADMISSION_MAX_INFLIGHT_BYTES", str(2 * 1024 * 1024 * 1024)))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "16"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "30"))
+ADMISSION_MAX_RUNS_PER_USER = int(os.getenv("ADMISSION_MAX_RUNS_PER_USER", "2"))
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+@dataclasses.dataclass
+class Ticket:
+    """An admitted run, returned to the controller when the run ends."""
+    user_id: str
+    size: int
+    admitted_at: float = 0.0
+    released: bool = False
+
+
+@dataclasses.dataclass
+class _Waiter:
+    ticket: Ticket
+    future: asyncio.Future
+    enqueued_at: float
+
+
+class AdmissionController:
+    """Bounds concurrent assessment runs and in-flight payload bytes."""
+
+    def __init__(self, max_runs: int = ADMISSION_MAX_RUNS,
+                 max_inflight_bytes: int = ADMISSION_MAX_INFLIGHT_BYTES,
+                 max_queue: int = ADMISSION_MAX_QUEUE,
+                 queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                 max_runs_per_user: int = ADMISSION_MAX_RUNS_PER_USER):
+        """Initializes the controller.
+
+        Args:
+            max_runs: Maximum number of concurrent runs.
+            max_inflight_bytes: Maximum total payload bytes of the running assessments.
+            max_queue: Maximum number of requests waiting for admission.
+            queue_timeout: Seconds a request may wait before it is rejected.
+            max_runs_per_user: Maximum running plus waiting requests per user.
+        """
+        self.max_runs = max_runs
+        self.max_inflight_bytes = max_inflight_bytes
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.max_runs_per_user = max_runs_per_user
+        self.running = 0
+        self.inflight_bytes = 0
+        self._running_by_user: Counter = Counter()
+        self._waiters: typing.List[_Waiter] = []
+        self._average_run_seconds = 30.0
+
+    def retry_after(self) -> int:
+        """Estimates the seconds until a new request could be admitted."""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._average_run_seconds * backlog / max(1, self.max_runs)))
+
+    async def acquire(self, user_id: str, size: int) -> Ticket:
+        """Waits until a run for the user may start.
+
+        Args:
+            user_id: The user requesting the run.
+            size: The payload size of the run in bytes.
+
+        Returns:
+            The ticket to pass to release() once the run ends.
+
+        Raises:
+            AdmissionRejected: If the user is over its limit, the queue is full,
+                or the request was not admitted within the queue timeout.
+        """
+        ticket = Ticket(user_id=user_id, size=size)
+        queued_by_user = sum(1 for waiter in self._waiters if waiter.ticket.user_id == user_id)
+        if self._running_by_user[user_id] + queued_by_user >= self.max_runs_per_user:
+            raise AdmissionRejected(429, f"User {user_id} already has {self.max_runs_per_user} assessments "
+                                         f"running or queued.", self.retry_after())
+        if not self._waiters and self._fits(ticket):
+            self._admit(ticket)
+            return ticket
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected(503, "Assessment queue is full.", self.retry_after())
+
+        waiter = _Waiter(ticket=ticket, future=asyncio.get_running_loop().create_future(),
+                         enqueued_at=time.monotonic())
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected(503, f"No assessment capacity became available within "
+                                         f"{self.queue_timeout:g}s.", self.retry_after())
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                self.release(ticket)
+            raise
+        finally:
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+
+    def release(self, ticket: Ticket):
+        """Ends an admitted run and hands its capacity to the next waiter.
+
+        Releasing a ticket more than once has no effect.
+
+        Args:
+            ticket: The ticket returned by acquire().
+        """
+        if ticket.released:
+            return
+        ticket.released = True
+        self.running -= 1
+        self.inflight_bytes -= ticket.size
+        self._running_by_user[ticket.user_id] -= 1
+        if self._running_by_user[ticket.user_id] <= 0:
+            del self._running_by_user[ticket.user_id]
+        self._average_run_seconds = 0.8 * self._average_run_seconds + 0.2 * (time.monotonic() - ticket.admitted_at)
+        self._dispatch()
+
+    def _fits(self, ticket: Ticket) -> bool:
+        """Returns whether a run fits the run and byte limits.
+
+        A payload larger than the byte limit is still admitted when nothing
+        else is running, so it is never blocked forever.
+        """
+        if self.running >= self.max_runs:
+            return False
+        return self.running == 0 or self.inflight_bytes + ticket.size <= self.max_inflight_bytes
+
+    def _admit(self, ticket: Ticket):
+        self.running += 1
+        self.inflight_bytes += ticket.size
+        self._running_by_user[ticket.user_id] += 1
+        ticket.admitted_at = time.monotonic()
+
+    def _dispatch(self):
+        """Admits waiters, preferring users with the fewest running assessments."""
+        while self._waiters:
+            waiter = min((w for w in self._waiters if not w.future.done()),
+                         key=lambda w: (self._running_by_user[w.ticket.user_id], w.enqueued_at), default=None)
+            if waiter is None or not self._fits(waiter.ticket):
+                return
+            self._waiters.remove(waiter)
+            self._admit(waiter.ticket)
+            waiter.future.set_result(waiter.ticket)
+
+
+admission_controller = AdmissionController()
@@ -0,0 +1,397 @@
+"""Content-addressed artifact store.
+
+Artifact payloads are stored once per distinct content under ARTIFACT_ROOT_DIR,
+in directories sharded by their SHA-256 digest (blobs/ab/cd/abcd...). The named,
+versioned artifacts of the ADK artifact service interface are rows in the
+artifact_versions table pointing at a digest, and the artifact_blobs table
+counts the versions referencing each payload; a payload is deleted from disk
+when its last reference is deleted. Saving a clip that is already stored only
+adds a reference, and a spooled upload is hard-linked into the store rather
+than copied whenever both live on the same filesystem.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import pathlib
+import re
+import shutil
+import tempfile
+import typing
+import uuid
+from datetime import datetime, timezone
+
+from google.adk.artifacts import BaseArtifactService
+from google.adk.artifacts.base_artifact_service import ArtifactVersion, ensure_part
+from google.genai import types
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from utils.models import ArtifactBlob, ArtifactRecord, SessionLocal
+from utils.video_ingest import UPLOAD_SPOOL_DIR, SpooledVideo, local_path_from_uri
+
+ARTIFACT_ROOT_DIR = os.getenv("ARTIFACT_ROOT_DIR", "artifacts")
+
+# Session state key referencing the stored upload of an assessment.
+VIDEO_ARTIFACT_STATE_KEY = "video_artifact"
+
+# How the payload of an artifact version is stored.
+KIND_INLINE = "inline"
+KIND_TEXT = "text"
+KIND_FILE = "file"
+KIND_REFERENCE = "reference"
+
+_HASH_CHUNK_BYTES = 1024 * 1024
+_SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+
+def file_sha256(path: pathlib.Path) -> str:
+    """Returns the SHA-256 hex digest of a file, read in chunks."""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(_HASH_CHUNK_BYTES):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _reference_blob_statement(dialect_name: str, sha256: str, size: int, mime_type: typing.Optional[str]):
+    """Builds an INSERT ... ON CONFLICT statement adding one reference to a payload.
+
+    A new payload is inserted with one reference; an existing one has its
+    ref_count incremented in the same statement, so concurrent saves of the
+    same content neither collide on the primary key nor lose an increment.
+
+    Args:
+        dialect_name: The database dialect, "postgresql" or "sqlite".
+        sha256: The digest of the payload.
+        size: The size of the payload in bytes.
+        mime_type: The MIME type of the payload.
+
+    Raises:
+        ValueError: If the dialect does not support ON CONFLICT upserts.
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"Artifact references are not supported for the '{dialect_name}' dialect.")
+    return insert(ArtifactBlob).values(sha256=sha256, size=size, mime_type=mime_type, ref_count=1,
+                                       created_at=datetime.utcnow()).on_conflict_do_update(
+        index_elements=[ArtifactBlob.sha256],
+        set_={"ref_count": ArtifactBlob.ref_count + 1},
+    )
+
+
+def _scope(filename: str, session_id: typing.Optional[str]) -> str:
+    """Returns the stored session scope of an artifact; user-scoped artifacts use ""."""
+    if filename.startswith("user:") or session_id is None:
+        return ""
+    return session_id
+
+
+class ContentAddressedArtifactService(BaseArtifactService):
+    """Artifact service that deduplicates payloads by content hash and reference counts them."""
+
+    def __init__(self, root_dir: typing.Union[str, pathlib.Path] = ARTIFACT_ROOT_DIR):
+        self.root_dir = pathlib.Path(root_dir).resolve()
+
+    def blob_path(self, sha256: str) -> pathlib.Path:
+        """Returns the path of the payload with the given digest."""
+        return self.root_dir / "blobs" / sha256[:2] / sha256[2:4] / sha256
+
+    async def save_artifact(self, *, app_name: str, user_id: str, filename: str,
+                            artifact: typing.Union[types.Part, typing.Dict[str, typing.Any]],
+                            session_id: typing.Optional[str] = None,
+                            custom_metadata: typing.Optional[typing.Dict[str, typing.Any]] = None) -> int:
+        """Saves an artifact version.
+
+        Inline data and text are stored by content hash. A file_data part with
+        a local file:// URI is moved into the store by reference to its file;
+        any other URI is recorded as an external reference.
+        """
+        part = ensure_part(artifact)
+        if part.inline_data is not None:
+            data = part.inline_data.data or b""
+            return await asyncio.to_thread(self._save, app_name, user_id, _scope(filename, session_id), filename,
+                                           KIND_INLINE, part.inline_data.mime_type, custom_metadata,
+                                           sha256=hashlib.sha256(data).hexdigest(), data=data)
+        if part.text is not None:
+            data = part.text.encode("utf-8")
+            return await asyncio.to_thread(self._save, app_name, user_id, _scope(filename, session_id), filename,
+                                           KIND_TEXT, "text/plain", custom_metadata,
+                                           sha256=hashlib.sha256(data).hexdigest(), data=data)
+        if part.file_data is not None:
+            path = local_path_from_uri(part.file_data.file_uri)
+            if path is not None:
+                return await self.save_file(app_name=app_name, user_id=user_id, filename=filename, path=path,
+                                            mime_type=part.file_data.mime_type, session_id=session_id,
+                                            custom_metadata=custom_metadata)
+            return await asyncio.to_thread(self._save, app_name, user_id, _scope(filename, session_id), filename,
+                                           KIND_REFERENCE, part.file_data.mime_type, custom_metadata,
+                                           file_uri=part.file_data.file_uri)
+        raise ValueError("Artifact must have inline_data, text or file_data.")
+
+    async def save_file(self, *, app_name: str, user_id: str, filename: str, path: pathlib.Path,
+                        mime_type: typing.Optional[str], session_id: typing.Optional[str] = None,
+                        sha256: typing.Optional[str] = None,
+                        custom_metadata: typing.Optional[typing.Dict[str, typing.Any]] = None) -> int:
+        """Saves a local file as an artifact version without reading it into memory.
+
+        Args:
+            app_name: The app name.
+            user_id: The user ID.
+            filename: The filename of the artifact.
+            path: The file to store; it is hard-linked into the store when possible.
+            mime_type: The MIME type of the file.
+            session_id: The session ID. If None, the artifact is user-scoped.
+            sha256: The SHA-256 hex digest of the file, if already known.
+            custom_metadata: Custom metadata to associate with the artifact.
+
+        Returns:
+            The version of the saved artifact.
+        """
+        if sha256 is None:
+            sha256 = await asyncio.to_thread(file_sha256, path)
+        return await asyncio.to_thread(self._save, app_name, user_id, _scope(filename, session_id), filename,
+                                       KIND_FILE, mime_type, custom_metadata, sha256=sha256, source=path)
+
+    async def checkout_video(self, *, app_name: str, user_id: str, sha256: str) -> typing.Optional[SpooledVideo]:
+        """Links a video stored by a user into the upload spool directory as a private working copy.
+
+        The digest is only resolved through an artifact version saved by the
+        same app and user, so knowing a digest gives no access to another
+        user's video. The copy is a hard link when the store and the spool
+        directory share a filesystem, so no bytes are copied; cleaning up the
+        returned video only removes the link.
+
+        Args:
+            app_name: The application name.
+            user_id: The user the video must have been stored for.
+            sha256: The SHA-256 hex digest of the stored video.
+
+        Returns:
+            The spooled video, or None if the user has no stored payload with that digest.
+        """
+        if not _SHA256_PATTERN.fullmatch(sha256):
+            return None
+        return await asyncio.to_thread(self._checkout_video, app_name, user_id, sha256)
+
+    async def load_artifact(self, *, app_name: str, user_id: str, filename: str,
+                            session_id: typing.Optional[str] = None,
+                            version: typing.Optional[int] = None) -> typing.Optional[types.Part]:
+        """Loads an artifact version; stored files are returned as file_data references, not read."""
+        record = await asyncio.to_thread(self._get_record, app_name, user_id, _scope(filename, session_id),
+                                         filename, version)
+        if record is None:
+            return None
+        if record.kind == KIND_INLINE:
+            data = await asyncio.to_thread(self.blob_path(record.sha256).read_bytes)
+            return types.Part.from_bytes(data=data, mime_type=record.mime_type)
+        if record.kind == KIND_TEXT:
+            data = await asyncio.to_thread(self.blob_path(record.sha256).read_bytes)
+            return types.Part(text=data.decode("utf-8"))
+        return types.Part(file_data=types.FileData(file_uri=self._uri(record), mime_type=record.mime_type))
+
+    async def list_artifact_keys(self, *, app_name: str, user_id: str,
+                                 session_id: typing.Optional[str] = None) -> typing.List[str]:
+        scopes = ["", session_id] if session_id is not None else [""]
+        return await asyncio.to_thread(self._list_keys, app_name, user_id, scopes)
+
+    async def delete_artifact(self, *, app_name: str, user_id: str, filename: str,
+                              session_id: typing.Optional[str] = None):
+        """Deletes every version of an artifact, and the payloads no longer referenced."""
+        await asyncio.to_thread(self._delete, app_name, user_id, _scope(filename, session_id), filename)
+
+    async def list_versions(self, *, app_name: str, user_id: str, filename: str,
+                            session_id: typing.Optional[str] = None) -> typing.List[int]:
+        records = await asyncio.to_thread(self._list_records, app_name, user_id, _scope(filename, session_id),
+                                          filename)
+        return [record.version for record in records]
+
+    async def list_artifact_versions(self, *, app_name: str, user_id: str, filename: str,
+                                     session_id: typing.Optional[str] = None) -> typing.List[ArtifactVersion]:
+        records = await asyncio.to_thread(self._list_records, app_name, user_id, _scope(filename, session_id),
+                                          filename)
+        return [self._to_version(record) for record in records]
+
+    async def get_artifact_version(self, *, app_name: str, user_id: str, filename: str,
+                                   session_id: typing.Optional[str] = None,
+                                   version: typing.Optional[int] = None) -> typing.Optional[ArtifactVersion]:
+        record = await asyncio.to_thread(self._get_record, app_name, user_id, _scope(filename, session_id),
+                                         filename, version)
+        return self._to_version(record) if record is not None else None
+
+    def _uri(self, record: ArtifactRecord) -> str:
+        """Returns the canonical URI of an artifact version's payload."""
+        if record.kind == KIND_REFERENCE:
+            return record.file_uri
+        return self.blob_path(record.sha256).as_uri()
+
+    def _to_version(self, record: ArtifactRecord) -> ArtifactVersion:
+        return ArtifactVersion(version=record.version,
+                               canonical_uri=self._uri(record),
+                               custom_metadata=json.loads(record.custom_metadata or "{}"),
+                               create_time=record.created_at.replace(tzinfo=timezone.utc).timestamp(),
+                               mime_type=record.mime_type)
+
+    def _checkout_video(self, app_name: str, user_id: str, sha256: str) -> typing.Optional[SpooledVideo]:
+        session: Session = SessionLocal()
+        try:
+            owned = session.query(ArtifactRecord.id).filter(
+                ArtifactRecord.app_name == app_name,
+                ArtifactRecord.user_id == user_id,
+                ArtifactRecord.sha256 == sha256,
+            ).first()
+            blob = session.get(ArtifactBlob, sha256) if owned else None
+        finally:
+            session.close()
+        source = self.blob_path(sha256)
+        if blob is None or not source.exists():
+            return None
+        fd, name = tempfile.mkstemp(prefix="vra_upload_", dir=UPLOAD_SPOOL_DIR)
+        os.close(fd)
+        path = pathlib.Path(name)
+        path.unlink()
+        try:
+            os.link(source, path)
+        except OSError:
+            shutil.copyfile(source, path)
+        return SpooledVideo(path=path, mime_type=blob.mime_type or "application/octet-stream", size=blob.size,
+                            sha256=sha256)
+
+    def _write_blob(self, sha256: str, data: typing.Optional[bytes], source: typing.Optional[pathlib.Path]) -> bool:
+        """Writes a payload into the store unless it is already there.
+
+        Returns:
+            Whether this call wrote the payload.
+        """
+        path = self.blob_path(sha256)
+        if path.exists():
+            return False
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temp = path.with_name(f"{sha256}.{uuid.uuid4().hex}.tmp")
+        try:
+            if data is not None:
+                temp.write_bytes(data)
+            else:
+                try:
+                    os.link(source, temp)
+                except OSError:
+                    shutil.copyfile(source, temp)
+            os.replace(temp, path)
+        finally:
+            temp.unlink(missing_ok=True)
+        return True
+
+    def _save(self, app_name: str, user_id: str, scope: str, filename: str, kind: str,
+              mime_type: typing.Optional[str], custom_metadata: typing.Optional[typing.Dict[str, typing.Any]],
+              sha256: typing.Optional[str] = None, data: typing.Optional[bytes] = None,
+              source: typing.Optional[pathlib.Path] = None, file_uri: typing.Optional[str] = None) -> int:
+        # The payload is written before the transaction, so no file operation runs while it holds locks.
+        wrote_blob = sha256 is not None and self._write_blob(sha256, data, source)
+        session: Session = SessionLocal()
+        try:
+            latest = session.query(func.max(ArtifactRecord.version)).filter(
+                ArtifactRecord.app_name == app_name,
+                ArtifactRecord.user_id == user_id,
+                ArtifactRecord.session_id == scope,
+                ArtifactRecord.filename == filename,
+            ).scalar()
+            version = 0 if latest is None else latest + 1
+            if sha256 is not None:
+                size = len(data) if data is not None else source.stat().st_size
+                session.execute(_reference_blob_statement(session.get_bind().dialect.name, sha256, size, mime_type))
+            session.add(ArtifactRecord(app_name=app_name, user_id=user_id, session_id=scope, filename=filename,
+                                       version=version, kind=kind, sha256=sha256, mime_type=mime_type,
+                                       file_uri=file_uri,
+                                       custom_metadata=json.dumps(custom_metadata) if custom_metadata else None,
+                                       created_at=datetime.utcnow()))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            # Remove a payload this save wrote unless a concurrent save has referenced it meanwhile.
+            if wrote_blob and session.get(ArtifactBlob, sha256) is None:
+                self.blob_path(sha256).unlink(missing_ok=True)
+            raise e
+        finally:
+            session.close()
+        if sha256 is not None and not self.blob_path(sha256).exists():
+            # A concurrent delete removed the payload between the write and the commit.
+            self._write_blob(sha256, data, source)
+        return version
+
+    def _delete(self, app_name: str, user_id: str, scope: str, filename: str):
+        session: Session = SessionLocal()
+        try:
+            records = session.query(ArtifactRecord).filter(
+                ArtifactRecord.app_name == app_name,
+                ArtifactRecord.user_id == user_id,
+                ArtifactRecord.session_id == scope,
+                ArtifactRecord.filename == filename,
+            ).all()
+            referenced = []
+            for record in records:
+                if record.sha256 is not None:
+                    session.query(ArtifactBlob).filter(ArtifactBlob.sha256 == record.sha256).update(
+                        {ArtifactBlob.ref_count: ArtifactBlob.ref_count - 1}, synchronize_session=False)
+                    referenced.append(record.sha256)
+                session.delete(record)
+            unreferenced = [sha256 for sha256, in session.query(ArtifactBlob.sha256).filter(
+                ArtifactBlob.sha256.in_(referenced), ArtifactBlob.ref_count <= 0)]
+            if unreferenced:
+                session.query(ArtifactBlob).filter(ArtifactBlob.sha256.in_(unreferenced),
+                                                   ArtifactBlob.ref_count <= 0).delete(synchronize_session=False)
+            session.commit()
+            for sha256 in unreferenced:
+                # A concurrent save may have referenced the payload again since the commit.
+                if session.get(ArtifactBlob, sha256) is None:
+                    self.blob_path(sha256).unlink(missing_ok=True)
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def _get_record(app_name: str, user_id: str, scope: str, filename: str,
+                    version: typing.Optional[int]) -> typing.Optional[ArtifactRecord]:
+        session: Session = SessionLocal()
+        try:
+            query = session.query(ArtifactRecord).filter(
+                ArtifactRecord.app_name == app_name,
+                ArtifactRecord.user_id == user_id,
+                ArtifactRecord.session_id == scope,
+                ArtifactRecord.filename == filename,
+            )
+            if version is not None:
+                return query.filter(ArtifactRecord.version == version).first()
+            return query.order_by(ArtifactRecord.version.desc()).first()
+        finally:
+            session.close()
+
+    @staticmethod
+    def _list_records(app_name: str, user_id: str, scope: str, filename: str) -> typing.List[ArtifactRecord]:
+        session: Session = SessionLocal()
+        try:
+            return session.query(ArtifactRecord).filter(
+                ArtifactRecord.app_name == app_name,
+                ArtifactRecord.user_id == user_id,
+                ArtifactRecord.session_id == scope,
+                ArtifactRecord.filename == filename,
+            ).order_by(ArtifactRecord.version).all()
+        finally:
+            session.close()
+
+    @staticmethod
+    def _list_keys(app_name: str, user_id: str, scopes: typing.List[str]) -> typing.List[str]:
+        session: Session = SessionLocal()
+        try:
+            return sorted(filename for filename, in session.query(ArtifactRecord.filename).filter(
+                ArtifactRecord.app_name == app_name,
+                ArtifactRecord.user_id == user_id,
+                ArtifactRecord.session_id.in_(scopes),
+            ).distinct())
+        finally:
+            session.close()
@@ -0,0 +1,101 @@
+"""Per-stage deadlines for the agent pipeline.
+
+Every pipeline stage gets a deadline in seconds: the stage's own
+<AGENT_NAME>_TIMEOUT_SECONDS setting (e.g. CONSTRUCTION_RISK_AGENT_TIMEOUT_SECONDS)
+or, failing that, STAGE_TIMEOUT_SECONDS. A value of 0 disables the deadline.
+
+A stage that misses its deadline is cancelled, so a hung model backend stops
+holding the request; the caller decides how the pipeline carries on without
+the stage's output.
+"""
+
+import asyncio
+import os
+import typing
+
+from google.adk.events import Event
+from google.adk.utils.context_utils import Aclosing
+
+from utils.metrics import STAGE_TIMEOUTS, agent_label
+
+STAGE_TIMEOUT_SECONDS = float(os.getenv("STAGE_TIMEOUT_SECONDS", "300"))
+
+
+class StageTimeoutError(TimeoutError):
+    """Raised when a pipeline stage misses its deadline."""
+
+    def __init__(self, agent_name: str, timeout: float):
+        super().__init__(f"{agent_name} did not finish within {timeout:g}s.")
+        self.agent_name = agent_name
+        self.timeout = timeout
+
+
+def stage_timeout(agent_name: str) -> float:
+    """Returns the deadline of a pipeline stage in seconds; 0 means no deadline.
+
+    Args:
+        agent_name: The name of the agent running the stage.
+    """
+    return float(os.getenv(f"{agent_name.upper()}_TIMEOUT_SECONDS", str(STAGE_TIMEOUT_SECONDS)))
+
+
+async def with_deadline(agent_name: str, agent_run: typing.AsyncGenerator[Event, None],
+                        timeout: typing.Optional[float] = None) -> typing.AsyncGenerator[Event, None]:
+    """Yields the events of an agent run until its deadline passes, then cancels the run.
+
+    The run is driven by a task of its own, so the deadline also interrupts a
+    model call that never returns. The time the caller spends handling an event
+    counts towards the deadline.
+
+    Args:
+        agent_name: The name of the agent, used for the default deadline and in errors.
+        agent_run: The agent run to bound.
+        timeout: The deadline in seconds; defaults to stage_timeout(agent_name).
+
+    Yields:
+        The events of the agent run.
+
+    Raises:
+        StageTimeoutError: If the run has not finished by the deadline.
+    """
+    timeout = stage_timeout(agent_name) if timeout is None else timeout
+    if timeout <= 0:
+        async with Aclosing(agent_run) as agen:
+            async for event in agen:
+                yield event
+        return
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    queue: asyncio.Queue = asyncio.Queue()
+    finished = object()
+
+    async def produce():
+        error = None
+        try:
+            async with Aclosing(agent_run) as agen:
+                async for event in agen:
+                    resume = asyncio.Event()
+                    await queue.put((event, resume))
+                    await resume.wait()
+        except Exception as e:
+            error = e
+        await queue.put((finished, error))
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                event, payload = await asyncio.wait_for(queue.get(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                STAGE_TIMEOUTS.labels(agent_label(agent_name)).inc()
+                raise StageTimeoutError(agent_name, timeout) from None
+            if event is finished:
+                if payload is not None:
+                    raise payload
+                return
+            yield event
+            payload.set()
+    finally:
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
@@ -0,0 +1,117 @@
+"""Deterministic stand-in for the LLM backend.
+
+Selected with LLM_BACKEND=fake, FakeLlm replaces the LiteLlm client handed out
+by utils.llm_client so the service and the benchmark can run without a model
+server. Each request sleeps for a latency drawn from a log-normal distribution
+and answers with a hazard table of a drawn number of tokens. Both draws are
+seeded by FAKE_LLM_SEED and the request content, so the same request always
+gets the same latency and answer regardless of concurrency.
+
+To exercise the retry, hedging and fallback paths, FAKE_LLM_ERROR_RATE makes
+that fraction of calls fail with a 503 error and FAKE_LLM_SLOW_RATE makes that
+fraction of calls FAKE_LLM_SLOW_FACTOR times slower. These draws are made per
+call rather than per request, so a retried or hedged request can succeed where
+its first attempt failed; both rates default to 0.
+"""
+
+import asyncio
+import hashlib
+import itertools
+import os
+import random
+import typing
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from utils.llm_client import request_slots
+from utils.token_budget import estimate_tokens
+
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "200"))
+FAKE_LLM_LATENCY_SIGMA = float(os.getenv("FAKE_LLM_LATENCY_SIGMA", "0.3"))
+FAKE_LLM_OUTPUT_TOKENS = int(os.getenv("FAKE_LLM_OUTPUT_TOKENS", "300"))
+FAKE_LLM_OUTPUT_TOKENS_SIGMA = float(os.getenv("FAKE_LLM_OUTPUT_TOKENS_SIGMA", "0.2"))
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_SLOW_RATE = float(os.getenv("FAKE_LLM_SLOW_RATE", "0"))
+FAKE_LLM_SLOW_FACTOR = float(os.getenv("FAKE_LLM_SLOW_FACTOR", "10"))
+
+_HAZARDS = [
+    ("Ignition", "Exposed wiring near cardboard boxes"),
+    ("Fuel", "Unsecured propane cylinders beside the generator"),
+    ("Falls", "Worker on scaffold without guardrails"),
+    ("Struck-by", "Unsecured materials on the upper deck"),
+    ("PPE", "Worker without hard hat near the crane"),
+    ("Environment", "Blocked emergency exit behind pallets"),
+]
+
+
+# Numbers the calls of the process, seeding the per-call error and slowdown draws.
+_call_numbers = itertools.count()
+
+
+class FakeLlmError(RuntimeError):
+    """Injected failure of a fake model call, reported as a 503 like an overloaded backend."""
+    status_code = 503
+
+
+class FakeLlm(BaseLlm):
+    """Model that answers every request with a synthetic hazard table."""
+
+    latency_ms: float = FAKE_LLM_LATENCY_MS
+    latency_sigma: float = FAKE_LLM_LATENCY_SIGMA
+    output_tokens: int = FAKE_LLM_OUTPUT_TOKENS
+    output_tokens_sigma: float = FAKE_LLM_OUTPUT_TOKENS_SIGMA
+    seed: int = FAKE_LLM_SEED
+    error_rate: float = FAKE_LLM_ERROR_RATE
+    slow_rate: float = FAKE_LLM_SLOW_RATE
+    slow_factor: float = FAKE_LLM_SLOW_FACTOR
+
+    def _rng(self, llm_request: LlmRequest) -> random.Random:
+        """Returns a random generator seeded by the seed and the request content."""
+        digest = hashlib.sha256(str(self.seed).encode("utf-8"))
+        digest.update(str(llm_request.config.system_instruction if llm_request.config else "").encode("utf-8"))
+        for content in llm_request.contents:
+            for part in content.parts or []:
+                digest.update((part.text or "").encode("utf-8"))
+        return random.Random(digest.digest())
+
+    def _answer(self, rng: random.Random, tokens: int) -> str:
+        """Builds a hazard table of roughly the given number of tokens."""
+        lines = ["| ID | Time/Scene | Identified Hazard | Type | Severity | Confidence | Recommended Action |",
+                 "|---|---|---|---|---|---|---|"]
+        length = sum(len(line) for line in lines)
+        row = 1
+        while length < tokens * 4:
+            category, hazard = rng.choice(_HAZARDS)
+            line = (f"| {row} | {rng.randint(0, 59)}:{rng.randint(0, 59):02d}.0 | {hazard} | {category} | "
+                    f"{rng.choice(['Minor', 'Moderate', 'Major', 'Catastrophic'])} | "
+                    f"{rng.choice(['High', 'Medium', 'Low'])} | Remove or isolate the hazard |")
+            lines.append(line)
+            length += len(line)
+            row += 1
+        return "\n".join(lines)
+
+    async def generate_content_async(self, llm_request: LlmRequest,
+                                     stream: bool = False) -> typing.AsyncGenerator[LlmResponse, None]:
+        rng = self._rng(llm_request)
+        latency = self.latency_ms * rng.lognormvariate(0, self.latency_sigma) / 1000
+        tokens = max(1, round(self.output_tokens * rng.lognormvariate(0, self.output_tokens_sigma)))
+        call_rng = random.Random(f"{self.seed}-{self.model}-{next(_call_numbers)}")
+        if call_rng.random() < self.slow_rate:
+            latency *= self.slow_factor
+        failed = call_rng.random() < self.error_rate
+        async with request_slots():
+            await asyncio.sleep(latency)
+        if failed:
+            raise FakeLlmError(f"Fake model {self.model} is unavailable.")
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=self._answer(rng, tokens))]),
+            usage_metadata=types.GenerateContentResponseUsageMetadata(
+                prompt_token_count=estimate_tokens(llm_request),
+                candidates_token_count=tokens,
+                total_token_count=estimate_tokens(llm_request) + tokens,
+            ),
+        )
@@ -0,0 +1,322 @@
+"""Structured hazard reports.
+
+The risk analysers answer with a HazardReport JSON object instead of a free-text
+table. Model answers are normalised into the schema before they are stored, so
+a model that ignores the response schema and writes the table from its prompt
+still yields a valid report. The overall risk levels and the assessment summary
+are then derived from the typed hazards in Python.
+"""
+
+import json
+import re
+import typing
+
+import google.adk.agents.callback_context
+import google.adk.models.llm_request
+import google.adk.models.llm_response
+from google.genai import types
+from pydantic import BaseModel, Field, ValidationError, field_validator
+
+# Severity and confidence values in ascending order, with the aliases the
+# analyser prompts use for them.
+SEVERITIES = ("Minor", "Moderate", "Major", "Catastrophic")
+CONFIDENCES = ("Low", "Medium", "High")
+_SEVERITY_ALIASES = {"low": "Minor", "medium": "Moderate", "high": "Major", "critical": "Catastrophic",
+                     "immediate": "Catastrophic", "severe": "Major", "serious": "Major"}
+RISK_LEVELS = ("Low", "Moderate", "High", "Critical")
+
+_SEPARATOR_ROW = re.compile(r"^\|?[\s:\-|]+\|?$")
+
+
+def _canonical(value: typing.Any, values: typing.Tuple[str, ...], aliases: typing.Mapping[str, str],
+               default: str) -> str:
+    """Maps a free-text value onto one of the canonical values."""
+    text = str(value or "").strip().lower()
+    for canonical in values:
+        if text.startswith(canonical.lower()):
+            return canonical
+    for alias, canonical in aliases.items():
+        if text.startswith(alias):
+            return canonical
+    return default
+
+
+class Hazard(BaseModel):
+    """A single hazard identified in the video."""
+    id: int = Field(description="Sequential number of the hazard, starting at 1.")
+    timestamp: str = Field(default="", description="Time in the video (M:SS.s) or scene where the hazard is seen.")
+    category: str = Field(default="", description="Hazard category, e.g. Ignition, Fuel, Falls or PPE.")
+    description: str = Field(description="What the hazard is and where it is.")
+    severity: str = Field(default="Moderate", description="One of Minor, Moderate, Major or Catastrophic.")
+    confidence: str = Field(default="Medium", description="One of Low, Medium or High.")
+    action: str = Field(default="", description="Recommended corrective action.")
+
+    @field_validator("severity", mode="before")
+    @classmethod
+    def _normalise_severity(cls, value):
+        return _canonical(value, SEVERITIES, _SEVERITY_ALIASES, "Moderate")
+
+    @field_validator("confidence", mode="before")
+    @classmethod
+    def _normalise_confidence(cls, value):
+        return _canonical(value, CONFIDENCES, {}, "Medium")
+
+    @field_validator("timestamp", "category", "action", mode="before")
+    @classmethod
+    def _none_to_empty(cls, value):
+        return "" if value is None else str(value)
+
+
+class HazardReport(BaseModel):
+    """The hazards one analyser found in the video."""
+    hazards: typing.List[Hazard] = Field(default_factory=list, description="Every hazard found, one entry each.")
+    notes: str = Field(default="", description="Optional remarks that do not fit a hazard entry.")
+
+
+def risk_level(hazards: typing.Iterable[Hazard]) -> str:
+    """Derives an overall risk level from a set of hazards.
+
+    Each hazard scores its severity rank, lowered by one for low confidence;
+    the overall level is the highest score.
+
+    Args:
+        hazards: The hazards to rate.
+
+    Returns:
+        One of RISK_LEVELS.
+    """
+    score = 0
+    for hazard in hazards:
+        rank = SEVERITIES.index(hazard.severity)
+        if hazard.confidence == "Low":
+            rank -= 1
+        score = max(score, rank)
+    return RISK_LEVELS[score]
+
+
+def _priority(hazard: Hazard) -> typing.Tuple[int, int]:
+    return SEVERITIES.index(hazard.severity), CONFIDENCES.index(hazard.confidence)
+
+
+def parse_markdown_table(text: str) -> typing.Tuple[typing.Optional[typing.List[str]],
+                                                    typing.List[typing.List[str]], typing.List[str]]:
+    """Splits a markdown report into its table header, table rows and remaining lines.
+
+    Args:
+        text: The markdown report.
+
+    Returns:
+        The header cells (None if the text holds no table), the data rows and
+        the non-table lines.
+    """
+    header, rows, notes = None, [], []
+    in_table = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if not stripped.startswith("|"):
+            in_table = False
+            if stripped:
+                notes.append(stripped)
+            continue
+        if _SEPARATOR_ROW.match(stripped):
+            continue
+        cells = [cell.strip() for cell in stripped.strip("|").split("|")]
+        if not in_table:
+            in_table = True
+            if header is None or cells == header:
+                header = header or cells
+                continue
+        rows.append(cells)
+    return header, rows, notes
+
+
+def _from_table(text: str) -> HazardReport:
+    """Builds a report from a markdown hazard table, as written by the analyser prompts."""
+    header, rows, notes = parse_markdown_table(text)
+    if header is None:
+        return HazardReport(notes=text.strip())
+    columns = [cell.lower() for cell in header]
+
+    def column(*keywords: str) -> typing.Optional[int]:
+        return next((i for i, cell in enumerate(columns) if any(k in cell for k in keywords)), None)
+
+    fields = {"timestamp": column("time"), "description": column("hazard", "risk"),
+              "category": column("category", "type"), "severity": column("severity"),
+              "confidence": column("confidence"), "action": column("action")}
+    hazards = []
+    for row in rows:
+        values = {name: row[index] for name, index in fields.items() if index is not None and index < len(row)}
+        if values.get("description"):
+            hazards.append(Hazard(id=len(hazards) + 1, **values))
+    return HazardReport(hazards=hazards, notes="\n".join(notes))
+
+
+def parse_hazard_report(text: str) -> HazardReport:
+    """Parses a model answer into a HazardReport.
+
+    Accepts the JSON object requested by the response schema, optionally in a
+    code fence, and falls back to the markdown table of the analyser prompts.
+
+    Args:
+        text: The model answer.
+
+    Returns:
+        The parsed report; unparseable answers are kept as notes.
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        try:
+            data = json.loads(text[start:end + 1])
+            if isinstance(data, dict) and isinstance(data.get("hazards"), list):
+                for index, hazard in enumerate(data["hazards"], start=1):
+                    if isinstance(hazard, dict):
+                        hazard.setdefault("id", index)
+                return HazardReport.model_validate(data)
+        except (ValueError, ValidationError):
+            pass
+    return _from_table(text)
+
+
+def hazard_table(hazards: typing.Iterable[Hazard]) -> typing.List[str]:
+    """Returns the markdown table lines listing a set of hazards."""
+    lines = ["| ID | Time/Scene | Hazard | Category | Severity | Confidence | Recommended Action |",
+             "|---|---|---|---|---|---|---|"]
+    for hazard in hazards:
+        lines.append(f"| {hazard.id} | {hazard.timestamp} | {hazard.description} | {hazard.category} | "
+                     f"{hazard.severity} | {hazard.confidence} | {hazard.action} |")
+    return lines
+
+
+def build_hazard_tables(reports: typing.Mapping[str, HazardReport]) -> str:
+    """Returns the full hazard table of every report that found hazards, under a heading per report."""
+    sections = []
+    for title, report in reports.items():
+        if report.hazards:
+            sections.append("\n".join([f"## {title} hazards", *hazard_table(report.hazards)]))
+    return "\n\n".join(sections)
+
+
+def build_summary(reports: typing.Mapping[str, HazardReport], top_hazards: int = 3,
+                  missing: typing.Sequence[str] = (), include_tables: bool = True) -> str:
+    """Assembles the assessment summary from the analysers' reports.
+
+    Args:
+        reports: The report of every analyser that ran, keyed by a display title such as "Fire".
+        top_hazards: The number of highest priority hazards listed per report.
+        missing: The titles of the requested reports that did not arrive, e.g.
+            because their analyser missed its deadline.
+        include_tables: Whether the full hazard table of every report is included.
+            Without them the summary is a condensed form, e.g. for a model to rewrite;
+            build_hazard_tables returns the tables left out.
+
+    Returns:
+        A markdown summary with the overall risk level, and per report its
+        risk level, highest priority hazards and the full hazard table. Missing
+        reports are listed as not assessed.
+    """
+    all_hazards = [hazard for report in reports.values() for hazard in report.hazards]
+    lines = [f"**Overall risk level: {risk_level(all_hazards)}**"]
+    if reports:
+        lines.append(f"{len(all_hazards)} hazards were identified across the "
+                     f"{' and '.join(reports).lower()} assessment.")
+    if missing:
+        lines.append(f"The {' and '.join(missing).lower()} assessment did not complete, so the risk level "
+                     f"does not cover it.")
+    for title, report in reports.items():
+        lines.append("")
+        lines.append(f"## {title} risks: {risk_level(report.hazards)}")
+        if not report.hazards:
+            lines.append("No hazards were identified.")
+        else:
+            lines.append("Top priority hazards:")
+            for hazard in sorted(report.hazards, key=_priority, reverse=True)[:top_hazards]:
+                lines.append(f"- {hazard.description} ({hazard.timestamp or 'time unknown'}, {hazard.severity}, "
+                             f"{hazard.confidence} confidence): {hazard.action or 'no action given'}")
+            if include_tables:
+                lines.append("")
+                lines.extend(hazard_table(report.hazards))
+        if report.notes:
+            lines.append("")
+            lines.append(report.notes)
+    for title in missing:
+        lines.append("")
+        lines.append(f"## {title} risks: Not assessed")
+        lines.append("The analysis did not complete in time; re-submit the video to assess these risks.")
+    return "\n".join(lines)
+
+
+def build_rollup(videos: typing.Mapping[str, typing.Mapping[str, HazardReport]], top_hazards: int = 5) -> str:
+    """Assembles a site-level summary from the reports of several videos.
+
+    Args:
+        videos: The reports of every assessed video, keyed by the video's name and
+            then by report title, as passed to build_summary.
+        top_hazards: The number of highest priority hazards listed across the site.
+
+    Returns:
+        A markdown summary with the site risk level, a table of the risk level
+        and hazard count of every video, and the highest priority hazards on
+        the site with the video each was seen in.
+    """
+    site_hazards = [(name, title, hazard) for name, reports in videos.items()
+                    for title, report in reports.items() for hazard in report.hazards]
+    lines = [f"**Site risk level: {risk_level(hazard for _, _, hazard in site_hazards)}**",
+             f"{len(site_hazards)} hazards were identified across {len(videos)} videos.",
+             "",
+             "| Video | Risk level | Hazards |",
+             "|---|---|---|"]
+    for name, reports in videos.items():
+        hazards = [hazard for report in reports.values() for hazard in report.hazards]
+        lines.append(f"| {name} | {risk_level(hazards)} | {len(hazards)} |")
+    if site_hazards:
+        lines.append("")
+        lines.append("Top priority hazards on site:")
+        for name, title, hazard in sorted(site_hazards, key=lambda item: _priority(item[2]),
+                                          reverse=True)[:top_hazards]:
+            lines.append(f"- {hazard.description} ({title.lower()}, {name} at {hazard.timestamp or 'time unknown'}, "
+                         f"{hazard.severity}, {hazard.confidence} confidence): {hazard.action or 'no action given'}")
+    return "\n".join(lines)
+
+
+def request_hazard_report_callback(callback_context: google.adk.agents.callback_context.CallbackContext,
+                                   llm_request: google.adk.models.llm_request.LlmRequest) -> \
+        typing.Optional[google.adk.models.llm_response.LlmResponse]:
+    """Callback that asks the analyser for the HazardReport JSON object instead of a table.
+
+    Args:
+        callback_context: The context of the callback, containing agent and session info.
+        llm_request: The request about to be sent to the model.
+
+    Returns:
+        None, so the model call proceeds.
+    """
+    llm_request.append_instructions([
+        "Return your findings as a single JSON object matching the response schema instead of a table: "
+        "one entry in `hazards` per table row (id, timestamp, category, description, severity, confidence, "
+        "action) and any summary remarks in `notes`."
+    ])
+    return None
+
+
+def normalise_hazard_report_callback(callback_context: google.adk.agents.callback_context.CallbackContext,
+                                     llm_response: google.adk.models.llm_response.LlmResponse) -> \
+        typing.Optional[google.adk.models.llm_response.LlmResponse]:
+    """Callback that rewrites the analyser's answer into a valid HazardReport JSON object.
+
+    Args:
+        callback_context: The context of the callback, containing agent and session info.
+        llm_response: The response received from the model.
+
+    Returns:
+        The response with its text replaced by the normalised report, or None
+        for partial and empty responses.
+    """
+    if llm_response.partial or not llm_response.content or not llm_response.content.parts:
+        return None
+    text = "".join(part.text for part in llm_response.content.parts if part.text and not part.thought)
+    if not text.strip():
+        return None
+    report = parse_hazard_report(text)
+    return llm_response.model_copy(update={
+        "content": types.Content(role="model", parts=[types.Part(text=report.model_dump_json())])
+    })
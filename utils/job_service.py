@@ -0,0 +1,232 @@
+"""Service for the persistent video assessment job queue.
+
+Jobs are stored in the assessment_jobs table of the DATABASE_URL database, so
+the queue survives restarts and can be drained by worker processes running
+separately from the API that ingests the uploads.
+"""
+
+import json
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from utils.models import AssessmentJob, JobResponse, SessionLocal
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_SUCCEEDED = "succeeded"
+JOB_FAILED = "failed"
+
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Queued jobs a worker tries to claim per poll when others claim them first.
+_CLAIM_CANDIDATES = 8
+
+
+class JobService:
+    """Service class for managing assessment jobs."""
+
+    @staticmethod
+    def create_job(user_id: str, risk_type: str, video_artifact: str, mime_type: str, video_size: int,
+                   video_sha256: str, callback_url: Optional[str] = None) -> AssessmentJob:
+        """Enqueues a new assessment job.
+
+        Args:
+            user_id: The user requesting the assessment.
+            risk_type: The normalised risk type to analyse.
+            video_artifact: Filename of the user-scoped artifact holding the job's video.
+            mime_type: The MIME type of the video.
+            video_size: The size of the video in bytes.
+            video_sha256: The SHA-256 hex digest of the video.
+            callback_url: Optional URL notified when the job completes.
+
+        Returns:
+            The created job.
+        """
+        session: Session = SessionLocal()
+        try:
+            job = AssessmentJob(id=str(uuid.uuid4()), user_id=user_id, risk_type=risk_type, status=JOB_QUEUED,
+                                video_artifact=video_artifact, mime_type=mime_type, video_size=video_size,
+                                video_sha256=video_sha256, callback_url=callback_url)
+            session.add(job)
+            session.commit()
+            session.refresh(job)
+            return job
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[AssessmentJob]:
+        """Fetches a job by its ID.
+
+        Args:
+            job_id: The ID of the job.
+
+        Returns:
+            AssessmentJob object if found, None otherwise.
+        """
+        session: Session = SessionLocal()
+        try:
+            return session.get(AssessmentJob, job_id)
+        finally:
+            session.close()
+
+    @staticmethod
+    def claim_next_job() -> Optional[AssessmentJob]:
+        """Claims the oldest queued job for the calling worker.
+
+        A job is claimed with a conditional UPDATE that only succeeds while it is
+        still queued, so concurrent workers never claim the same job, whatever
+        the database. Each claim increments the job's attempts, which identifies
+        the lease in heartbeat(), complete_job() and fail_job().
+
+        Returns:
+            The claimed job, now marked running, or None if the queue is empty.
+        """
+        session: Session = SessionLocal()
+        try:
+            candidates = [job_id for job_id, in session.query(AssessmentJob.id).filter(
+                AssessmentJob.status == JOB_QUEUED
+            ).order_by(AssessmentJob.created_at).limit(_CLAIM_CANDIDATES)]
+            for job_id in candidates:
+                claimed = session.query(AssessmentJob).filter(
+                    AssessmentJob.id == job_id,
+                    AssessmentJob.status == JOB_QUEUED
+                ).update({AssessmentJob.status: JOB_RUNNING, AssessmentJob.attempts: AssessmentJob.attempts + 1,
+                          AssessmentJob.updated_at: datetime.utcnow()}, synchronize_session=False)
+                session.commit()
+                if claimed == 1:
+                    return session.get(AssessmentJob, job_id)
+            return None
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def heartbeat(job_id: str, attempt: int) -> bool:
+        """Extends the lease of a running job.
+
+        Args:
+            job_id: The ID of the job.
+            attempt: The attempt number of the caller's claim.
+
+        Returns:
+            Whether the caller still holds the lease.
+        """
+        return JobService._update(job_id, attempt)
+
+    @staticmethod
+    def complete_job(job_id: str, attempt: int, result: List[Dict[str, Any]]) -> bool:
+        """Marks a job as succeeded and stores its result, if the caller still holds its lease.
+
+        Args:
+            job_id: The ID of the job.
+            attempt: The attempt number of the caller's claim.
+            result: The serialised summary parts.
+
+        Returns:
+            Whether the result was stored; False if the lease was reclaimed by another worker.
+        """
+        return JobService._update(job_id, attempt, status=JOB_SUCCEEDED, result=json.dumps(result), error=None)
+
+    @staticmethod
+    def fail_job(job_id: str, attempt: int, error: str) -> bool:
+        """Marks a job as failed, if the caller still holds its lease.
+
+        Args:
+            job_id: The ID of the job.
+            attempt: The attempt number of the caller's claim.
+            error: Description of the failure.
+
+        Returns:
+            Whether the failure was stored; False if the lease was reclaimed by another worker.
+        """
+        return JobService._update(job_id, attempt, status=JOB_FAILED, error=error)
+
+    @staticmethod
+    def requeue_stale_jobs() -> int:
+        """Requeues running jobs whose lease expired, e.g. after a worker crash.
+
+        Jobs that already used JOB_MAX_ATTEMPTS attempts are failed instead.
+
+        Returns:
+            The number of jobs requeued or failed.
+        """
+        session: Session = SessionLocal()
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=JOB_LEASE_SECONDS)
+            stale = session.query(AssessmentJob.id, AssessmentJob.attempts).filter(
+                AssessmentJob.status == JOB_RUNNING,
+                AssessmentJob.updated_at < cutoff
+            ).all()
+            reclaimed = 0
+            for job_id, attempts in stale:
+                values = {AssessmentJob.status: JOB_QUEUED, AssessmentJob.updated_at: datetime.utcnow()}
+                if attempts >= JOB_MAX_ATTEMPTS:
+                    values.update({AssessmentJob.status: JOB_FAILED,
+                                   AssessmentJob.error: "Job lease expired too many times."})
+                # Only reclaim the lease if its worker has not renewed or finished it meanwhile.
+                reclaimed += session.query(AssessmentJob).filter(
+                    AssessmentJob.id == job_id,
+                    AssessmentJob.status == JOB_RUNNING,
+                    AssessmentJob.attempts == attempts,
+                    AssessmentJob.updated_at < cutoff
+                ).update(values, synchronize_session=False)
+            session.commit()
+            return reclaimed
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def to_response(job: AssessmentJob) -> JobResponse:
+        """Converts a job row into its API response.
+
+        Args:
+            job: The job to convert.
+
+        Returns:
+            The JobResponse for the job.
+        """
+        return JobResponse(
+            id=job.id,
+            user_id=job.user_id,
+            risk_type=job.risk_type,
+            status=job.status,
+            result=json.loads(job.result) if job.result else None,
+            error=job.error,
+            created_at=str(job.created_at),
+            updated_at=str(job.updated_at)
+        )
+
+    @staticmethod
+    def _update(job_id: str, attempt: int, **values) -> bool:
+        """Updates columns of a running job and refreshes its lease, if the lease is still the caller's.
+
+        Returns:
+            Whether the job was updated.
+        """
+        session: Session = SessionLocal()
+        try:
+            updated = session.query(AssessmentJob).filter(
+                AssessmentJob.id == job_id,
+                AssessmentJob.status == JOB_RUNNING,
+                AssessmentJob.attempts == attempt
+            ).update(dict(values, updated_at=datetime.utcnow()), synchronize_session=False)
+            session.commit()
+            return updated == 1
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
@@ -0,0 +1,173 @@
+"""Worker pool that drains the persistent assessment job queue.
+
+A bounded number of asyncio workers claim queued jobs from the database, run
+them through the agent pipeline and store the result. When a job was submitted
+with a callback URL the final job state is POSTed to it.
+
+Callback URLs must use http or https and resolve only to public addresses, so
+a job cannot make the server call into its own network; with
+JOB_CALLBACK_ALLOWED_HOSTS set, only the listed hosts are accepted. The URL is
+checked when the job is submitted and again right before the callback.
+"""
+
+import asyncio
+import ipaddress
+import logging
+import os
+import socket
+import typing
+import urllib.parse
+
+import httpx
+
+from utils.job_service import JOB_LEASE_SECONDS, JobService
+from utils.models import AssessmentJob
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+JOB_CALLBACK_TIMEOUT_SECONDS = float(os.getenv("JOB_CALLBACK_TIMEOUT_SECONDS", "10"))
+JOB_CALLBACK_ALLOWED_HOSTS = frozenset(host.strip().lower() for host in
+                                       os.getenv("JOB_CALLBACK_ALLOWED_HOSTS", "").split(",") if host.strip())
+
+JobRunner = typing.Callable[[AssessmentJob], typing.Awaitable[typing.List[typing.Dict[str, typing.Any]]]]
+JobReleaser = typing.Callable[[AssessmentJob], typing.Awaitable[None]]
+
+
+class CallbackUrlError(ValueError):
+    """Raised when a job callback URL is not allowed."""
+
+
+def check_callback_url(url: str):
+    """Checks that a callback URL may be called by the server.
+
+    Resolves the host, so it blocks; call it from a worker thread.
+
+    Args:
+        url: The callback URL.
+
+    Raises:
+        CallbackUrlError: If the URL is not http(s), its host is not allowed, cannot be
+            resolved, or resolves to a private, loopback, link-local or otherwise non-public address.
+    """
+    parsed = urllib.parse.urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise CallbackUrlError("Callback URL must be an absolute http or https URL.")
+    host = parsed.hostname.lower()
+    if JOB_CALLBACK_ALLOWED_HOSTS and host not in JOB_CALLBACK_ALLOWED_HOSTS:
+        raise CallbackUrlError(f"Callback host {host} is not allowed.")
+    try:
+        addresses = socket.getaddrinfo(host, parsed.port or (443 if parsed.scheme == "https" else 80),
+                                       proto=socket.IPPROTO_TCP)
+    except (OSError, ValueError) as e:
+        raise CallbackUrlError(f"Callback host {host} cannot be resolved: {e}")
+    for *_, sockaddr in addresses:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise CallbackUrlError(f"Callback host {host} resolves to the non-public address {address}.")
+
+
+class JobWorkerPool:
+    """A bounded pool of workers processing queued assessment jobs."""
+
+    def __init__(self, run_job: JobRunner, release_job: JobReleaser, workers: int = JOB_WORKERS,
+                 poll_interval: float = JOB_POLL_INTERVAL_SECONDS):
+        """Initializes the pool.
+
+        Args:
+            run_job: Coroutine function that runs a job and returns the serialised summary parts.
+            release_job: Coroutine function that deletes the stored video of a finished job.
+            workers: The number of jobs processed concurrently.
+            poll_interval: Seconds to wait before polling an empty queue again.
+        """
+        self.run_job = run_job
+        self.release_job = release_job
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: typing.List[asyncio.Task] = []
+
+    def start(self):
+        """Starts the worker tasks on the running event loop."""
+        self._tasks = [asyncio.create_task(self._worker(index)) for index in range(self.workers)]
+        if self._tasks:
+            self._tasks.append(asyncio.create_task(self._reaper()))
+        logging.info(f"Started {self.workers} assessment job workers")
+
+    async def stop(self):
+        """Cancels the worker tasks; interrupted jobs are requeued once their lease expires."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, index: int):
+        """Claims and processes jobs until cancelled."""
+        while True:
+            try:
+                job = await asyncio.to_thread(JobService.claim_next_job)
+            except Exception as e:
+                logging.error(f"Job worker {index} failed to claim a job: {e}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self._process(job)
+
+    async def _process(self, job: AssessmentJob):
+        """Runs a claimed job, records its outcome and notifies the callback URL."""
+        logging.info(f"Processing assessment job {job.id} (attempt {job.attempts})")
+        heartbeat = asyncio.create_task(self._heartbeat(job.id, job.attempts))
+        try:
+            result = await self.run_job(job)
+            recorded = await asyncio.to_thread(JobService.complete_job, job.id, job.attempts, result)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Assessment job {job.id} failed: {e}")
+            recorded = await asyncio.to_thread(JobService.fail_job, job.id, job.attempts, str(e))
+        finally:
+            heartbeat.cancel()
+        if not recorded:
+            # Another worker reclaimed the job and now owns its video and outcome.
+            logging.warning(f"Lease of assessment job {job.id} (attempt {job.attempts}) was lost; "
+                            f"its outcome is discarded")
+            return
+        try:
+            await self.release_job(job)
+        except Exception as e:
+            logging.warning(f"Failed to release the video of assessment job {job.id}: {e}")
+        if job.callback_url:
+            await self._notify(job.id, job.callback_url)
+
+    async def _heartbeat(self, job_id: str, attempt: int):
+        """Keeps the lease of a running job alive while the worker still holds it."""
+        while True:
+            await asyncio.sleep(JOB_LEASE_SECONDS / 3)
+            if not await asyncio.to_thread(JobService.heartbeat, job_id, attempt):
+                logging.warning(f"Lease of assessment job {job_id} (attempt {attempt}) was reclaimed")
+                return
+
+    async def _reaper(self):
+        """Periodically requeues jobs abandoned by crashed workers."""
+        while True:
+            try:
+                requeued = await asyncio.to_thread(JobService.requeue_stale_jobs)
+                if requeued:
+                    logging.warning(f"Requeued {requeued} stale assessment jobs")
+            except Exception as e:
+                logging.error(f"Failed to requeue stale jobs: {e}")
+            await asyncio.sleep(JOB_LEASE_SECONDS)
+
+    @staticmethod
+    async def _notify(job_id: str, callback_url: str):
+        """POSTs the final job state to the job's callback URL."""
+        job = await asyncio.to_thread(JobService.get_job, job_id)
+        try:
+            # Checked again because the host may resolve differently than when the job was submitted.
+            await asyncio.to_thread(check_callback_url, callback_url)
+            async with httpx.AsyncClient(timeout=JOB_CALLBACK_TIMEOUT_SECONDS) as client:
+                response = await client.post(callback_url, json=JobService.to_response(job).model_dump())
+                response.raise_for_status()
+        except Exception as e:
+            logging.warning(f"Callback for assessment job {job_id} to {callback_url} failed: {e}")
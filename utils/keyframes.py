@@ -0,0 +1,216 @@
+"""Keyframe extraction and frame deduplication for uploaded videos.
+
+Frames are sampled at KEYFRAME_SAMPLE_FPS, downscaled to KEYFRAME_MAX_WIDTH,
+reduced to 64-bit difference hashes in NumPy batches, and dropped when they are
+within KEYFRAME_DEDUP_THRESHOLD bits of the last kept frame. The kept frames are
+encoded to JPEG as they are decoded and thinned by stride sampling to at most
+KEYFRAME_MAX_FRAMES per segment, so memory stays bounded however long the video
+is; each finished segment is written next to the spooled video so the agents can
+be sent a compact, timestamped frame set instead of the whole clip.
+
+OpenCV and NumPy are optional: when they are not installed, extraction is
+skipped and the agents receive the full video as before.
+"""
+
+import dataclasses
+import logging
+import os
+import pathlib
+import shutil
+import typing
+
+try:
+    import cv2
+    import numpy as np
+except ImportError:
+    cv2 = None
+    np = None
+
+KEYFRAMES_ENABLED = os.getenv("KEYFRAMES_ENABLED", "true").lower() == "true"
+KEYFRAME_SAMPLE_FPS = float(os.getenv("KEYFRAME_SAMPLE_FPS", "1.0"))
+KEYFRAME_DEDUP_THRESHOLD = int(os.getenv("KEYFRAME_DEDUP_THRESHOLD", "6"))
+KEYFRAME_MAX_FRAMES = int(os.getenv("KEYFRAME_MAX_FRAMES", "64"))
+KEYFRAME_MAX_WIDTH = int(os.getenv("KEYFRAME_MAX_WIDTH", "640"))
+KEYFRAME_BATCH_SIZE = int(os.getenv("KEYFRAME_BATCH_SIZE", "32"))
+KEYFRAME_JPEG_QUALITY = int(os.getenv("KEYFRAME_JPEG_QUALITY", "80"))
+# Videos longer than one segment are analysed segment by segment; 0 disables segmentation.
+VIDEO_SEGMENT_SECONDS = float(os.getenv("VIDEO_SEGMENT_SECONDS", "300"))
+
+# Session state key holding the keyframes extracted for the request's video.
+KEYFRAMES_STATE_KEY = "keyframes"
+# Prefix of the text part labelling each keyframe sent to a model.
+FRAME_LABEL_PREFIX = "Frame at "
+
+
+@dataclasses.dataclass
+class Keyframe:
+    """A deduplicated frame written to disk."""
+    timestamp: float
+    path: pathlib.Path
+
+
+def keyframes_available() -> bool:
+    """Returns whether keyframe extraction is enabled and its dependencies are installed."""
+    return KEYFRAMES_ENABLED and cv2 is not None
+
+
+def frames_dir_for(video_path: pathlib.Path) -> pathlib.Path:
+    """Returns the directory holding the keyframes extracted from a video."""
+    return video_path.with_name(video_path.name + ".frames")
+
+
+def remove_frames(video_path: pathlib.Path):
+    """Removes the keyframes extracted from a video, if any."""
+    shutil.rmtree(frames_dir_for(video_path), ignore_errors=True)
+
+
+def format_timestamp(seconds: float) -> str:
+    """Formats a frame timestamp as M:SS.s, matching the Time/Scene column of the reports."""
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:04.1f}"
+
+
+def segment_windows(keyframes: typing.Optional[typing.Mapping[str, typing.Any]],
+                    segment_seconds: float = VIDEO_SEGMENT_SECONDS) -> typing.List[typing.Tuple[float, float]]:
+    """Returns the time windows of the segments that hold at least one keyframe.
+
+    Args:
+        keyframes: The keyframes session state written by the keyframe extractor.
+        segment_seconds: The length of a segment in seconds.
+
+    Returns:
+        The (start, end) windows in timestamp order, or an empty list when there
+        are no keyframes or segmentation is disabled.
+    """
+    if not keyframes or segment_seconds <= 0:
+        return []
+    indexes = sorted({int(frame["timestamp"] // segment_seconds) for frame in keyframes["frames"]})
+    return [(index * segment_seconds, (index + 1) * segment_seconds) for index in indexes]
+
+
+class _SegmentSampler:
+    """Keeps an evenly spaced sample of at most 2 * max_frames frames of one segment.
+
+    Frames are offered in timestamp order. Only every stride-th frame is kept,
+    and whenever the sample fills up every other kept frame is dropped and the
+    stride doubles, so memory stays bounded however long the segment is.
+    """
+
+    def __init__(self, max_frames: int):
+        self.max_frames = max(1, max_frames)
+        self.stride = 1
+        self.offered = 0
+        self.frames: typing.List[typing.Tuple[float, bytes]] = []
+
+    def offer(self, timestamp: float, frame: "np.ndarray"):
+        """Offers a kept frame, encoding it to JPEG if it is sampled."""
+        self.offered += 1
+        if (self.offered - 1) % self.stride:
+            return
+        ok, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, KEYFRAME_JPEG_QUALITY])
+        if not ok:
+            return
+        self.frames.append((timestamp, jpeg.tobytes()))
+        if len(self.frames) >= 2 * self.max_frames:
+            self.frames = self.frames[::2]
+            self.stride *= 2
+
+    def sample(self) -> typing.List[typing.Tuple[float, bytes]]:
+        """Returns at most max_frames of the sampled frames, evenly thinned."""
+        if len(self.frames) <= self.max_frames:
+            return self.frames
+        return [self.frames[i] for i in np.linspace(0, len(self.frames) - 1, self.max_frames).round().astype(int)]
+
+
+def _dhash(frames: typing.List["np.ndarray"]) -> "np.ndarray":
+    """Computes 64-bit difference hashes for a batch of BGR frames.
+
+    Args:
+        frames: The frames to hash.
+
+    Returns:
+        An (N, 8) uint8 array holding the packed hash of each frame.
+    """
+    small = np.stack([cv2.resize(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+                      for frame in frames]).astype(np.int16)
+    bits = small[:, :, 1:] > small[:, :, :-1]
+    return np.packbits(bits.reshape(len(frames), 64), axis=1)
+
+
+def _hamming(a: "np.ndarray", b: "np.ndarray") -> int:
+    """Returns the number of differing bits between two packed hashes."""
+    return int(np.unpackbits(np.bitwise_xor(a, b)).sum())
+
+
+def extract_keyframes(video_path: pathlib.Path,
+                      sample_fps: float = KEYFRAME_SAMPLE_FPS,
+                      dedup_threshold: int = KEYFRAME_DEDUP_THRESHOLD,
+                      max_frames: int = KEYFRAME_MAX_FRAMES,
+                      segment_seconds: float = VIDEO_SEGMENT_SECONDS) -> typing.List[Keyframe]:
+    """Samples a video and keeps the frames that differ from the previous kept frame.
+
+    Args:
+        video_path: The video to sample.
+        sample_fps: Frames sampled per second of video.
+        dedup_threshold: Frames whose hash is within this many bits of the last
+            kept frame are dropped as near-duplicates.
+        max_frames: Upper bound on the frames returned per segment; extra frames are thinned evenly.
+        segment_seconds: The length of a segment in seconds; 0 applies max_frames to the whole video.
+
+    Returns:
+        The kept keyframes, in timestamp order. Empty if the video cannot be decoded.
+    """
+    capture = cv2.VideoCapture(str(video_path))
+    if not capture.isOpened():
+        logging.warning(f"Keyframe extraction could not open {video_path}")
+        return []
+
+    output_dir = frames_dir_for(video_path)
+    output_dir.mkdir(exist_ok=True)
+    fps = capture.get(cv2.CAP_PROP_FPS) or 25.0
+    step = max(1, round(fps / sample_fps))
+    keyframes: typing.List[Keyframe] = []
+    segment: typing.Optional[int] = None
+    sampler = _SegmentSampler(max_frames)
+    last_hash = None
+    batch: typing.List[typing.Tuple[float, "np.ndarray"]] = []
+
+    def write_segment():
+        for timestamp, jpeg in sampler.sample():
+            path = output_dir / f"{timestamp:010.3f}.jpg"
+            path.write_bytes(jpeg)
+            keyframes.append(Keyframe(timestamp=timestamp, path=path))
+
+    def flush():
+        nonlocal last_hash, segment, sampler
+        hashes = _dhash([frame for _, frame in batch])
+        for (timestamp, frame), frame_hash in zip(batch, hashes):
+            if last_hash is None or _hamming(frame_hash, last_hash) > dedup_threshold:
+                index = int(timestamp // segment_seconds) if segment_seconds > 0 else 0
+                if index != segment:
+                    write_segment()
+                    segment, sampler = index, _SegmentSampler(max_frames)
+                sampler.offer(timestamp, frame)
+                last_hash = frame_hash
+        batch.clear()
+
+    try:
+        index = 0
+        while capture.grab():
+            if index % step == 0:
+                ok, frame = capture.retrieve()
+                if ok:
+                    height, width = frame.shape[:2]
+                    if width > KEYFRAME_MAX_WIDTH:
+                        frame = cv2.resize(frame, (KEYFRAME_MAX_WIDTH, int(height * KEYFRAME_MAX_WIDTH / width)),
+                                           interpolation=cv2.INTER_AREA)
+                    batch.append((index / fps, frame))
+                    if len(batch) == KEYFRAME_BATCH_SIZE:
+                        flush()
+            index += 1
+        if batch:
+            flush()
+        write_segment()
+    finally:
+        capture.release()
+    return keyframes
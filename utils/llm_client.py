@@ -0,0 +1,138 @@
+"""Shared model client for all agents.
+
+Every agent obtains its model from get_llm(), so all agents share one LiteLlm
+instance per model, one keep-alive HTTP connection pool and one process-wide
+limit on in-flight model requests. This keeps the parallel fan-out from
+overloading the single model server under burst traffic.
+
+Set LLM_BACKEND=fake to hand out the deterministic FakeLlm from
+utils.fake_llm instead, e.g. for benchmarks and local runs without a model
+server.
+
+Timeouts default to LLM_TIMEOUT_SECONDS and can be set per model with
+LLM_MODEL_TIMEOUTS, a JSON object mapping model names to seconds, e.g.
+'{"ollama/llama3.1:8b": 300}'.
+
+The clients are handed out wrapped in utils.resilient_llm.ResilientLlm, which
+retries failed calls, optionally hedges slow ones, opens a circuit breaker on a
+failing backend and routes to LLM_FALLBACK_MODEL. Set LLM_RESILIENCE=false to
+hand out the bare clients.
+"""
+
+import asyncio
+import json
+import os
+import typing
+import weakref
+
+import dotenv
+import httpx
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.lite_llm import LiteLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+
+dotenv.load_dotenv()
+
+# Use the model cost map bundled with litellm instead of fetching it from the
+# network when litellm is first imported, which can stall worker startup for
+# several seconds. Set LITELLM_LOCAL_MODEL_COST_MAP=False to fetch it.
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "litellm")
+LLM_RESILIENCE = os.getenv("LLM_RESILIENCE", "true").lower() in ("1", "true", "yes")
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+LLM_MODEL_TIMEOUTS: typing.Dict[str, float] = json.loads(os.getenv("LLM_MODEL_TIMEOUTS", "{}"))
+LLM_POOL_MAX_CONNECTIONS = int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "16"))
+LLM_POOL_MAX_KEEPALIVE = int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "8"))
+LLM_POOL_KEEPALIVE_SECONDS = float(os.getenv("LLM_POOL_KEEPALIVE_SECONDS", "60"))
+
+# Providers that litellm serves through its generic HTTP handler, which accepts
+# our pooled client. OpenAI-compatible providers use litellm.aclient_session.
+_HTTP_HANDLER_PROVIDERS = ("ollama", "ollama_chat", "hosted_vllm")
+
+_transport: typing.Optional[httpx.AsyncHTTPTransport] = None
+_clients: typing.Dict[str, BaseLlm] = {}
+_models: typing.Dict[str, BaseLlm] = {}
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def request_slots() -> asyncio.Semaphore:
+    """Returns the in-flight request semaphore of the running event loop."""
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores[loop] = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+    return _semaphores[loop]
+
+
+def _pooled_transport() -> httpx.AsyncHTTPTransport:
+    """Returns the keep-alive transport shared by every model client."""
+    global _transport
+    if _transport is None:
+        import litellm
+
+        _transport = httpx.AsyncHTTPTransport(limits=httpx.Limits(
+            max_connections=LLM_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=LLM_POOL_KEEPALIVE_SECONDS,
+        ))
+        litellm.aclient_session = httpx.AsyncClient(transport=_transport, timeout=LLM_TIMEOUT_SECONDS)
+    return _transport
+
+
+def model_timeout(model: str) -> float:
+    """Returns the request timeout for a model in seconds."""
+    return float(LLM_MODEL_TIMEOUTS.get(model, LLM_TIMEOUT_SECONDS))
+
+
+class PooledLiteLlm(LiteLlm):
+    """LiteLlm that holds a slot of the process-wide request limit for every call."""
+
+    async def generate_content_async(self, llm_request: LlmRequest,
+                                     stream: bool = False) -> typing.AsyncGenerator[LlmResponse, None]:
+        async with request_slots():
+            async for response in super().generate_content_async(llm_request, stream=stream):
+                yield response
+
+
+def _get_client(model: str) -> BaseLlm:
+    """Returns the shared, unwrapped model client for a model."""
+    if model not in _clients and LLM_BACKEND == "fake":
+        from utils.fake_llm import FakeLlm
+
+        _clients[model] = FakeLlm(model=model or "fake")
+    elif model not in _clients:
+        from litellm.llms.custom_httpx.http_handler import AsyncHTTPHandler
+
+        transport = _pooled_transport()
+        kwargs: typing.Dict[str, typing.Any] = {"timeout": model_timeout(model)}
+        if model.split("/", 1)[0] in _HTTP_HANDLER_PROVIDERS:
+            kwargs["client"] = AsyncHTTPHandler(timeout=model_timeout(model), transport=transport,
+                                                client_alias="vra_llm_pool")
+        _clients[model] = PooledLiteLlm(model=model, **kwargs)
+    return _clients[model]
+
+
+def get_llm(model: typing.Optional[str] = None) -> BaseLlm:
+    """Returns the shared model client for a model.
+
+    Args:
+        model: The LiteLLM model name. Defaults to LLM_MODEL.
+
+    Returns:
+        The PooledLiteLlm shared by every agent using the model, or a FakeLlm
+        when LLM_BACKEND is "fake", wrapped in a ResilientLlm unless
+        LLM_RESILIENCE is off.
+    """
+    model = model or os.getenv("LLM_MODEL")
+    if model not in _models:
+        if LLM_RESILIENCE:
+            from utils.resilient_llm import LLM_FALLBACK_MODEL, ResilientLlm
+
+            primary = _get_client(model)
+            fallback = _get_client(LLM_FALLBACK_MODEL) if LLM_FALLBACK_MODEL and LLM_FALLBACK_MODEL != model else None
+            _models[model] = ResilientLlm(model=primary.model, primary=primary, fallback=fallback)
+        else:
+            _models[model] = _get_client(model)
+    return _models[model]
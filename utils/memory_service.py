@@ -0,0 +1,200 @@
+"""Persistent, bounded memory service for the agent runner.
+
+Memory entries are kept in the memory_entries table of the DATABASE_URL
+database (a sqlite URL keeps them in a local file), so every API worker shares
+one store and memories survive restarts. Only the text of an event is stored,
+never its inline video or image data, and every entry is indexed by its words
+in the memory_keywords table so a search is an indexed lookup by user and
+keyword instead of a scan of every stored event.
+
+The store is bounded: entries expire after MEMORY_TTL_SECONDS, and whenever
+memories are added for a user, that user's least recently used entries beyond
+MEMORY_MAX_ENTRIES_PER_USER are evicted along with a batch of expired entries.
+Both lookups are index range scans, so an add never sorts the whole table.
+
+The API adds the text events of every completed assessment to memory.
+"""
+
+import asyncio
+import os
+import re
+import typing
+import unicodedata
+import uuid
+from datetime import datetime, timedelta
+
+import google.adk.events
+import google.adk.memory
+import google.adk.sessions
+from google.adk.memory.base_memory_service import BaseMemoryService, SearchMemoryResponse
+from google.adk.memory.memory_entry import MemoryEntry
+from google.genai import types
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from utils.models import MemoryKeyword, MemoryRecord, SessionLocal
+
+MEMORY_BACKEND = os.getenv("MEMORY_BACKEND", "sql")
+MEMORY_TTL_SECONDS = int(os.getenv("MEMORY_TTL_SECONDS", str(30 * 24 * 3600)))
+MEMORY_MAX_ENTRIES_PER_USER = int(os.getenv("MEMORY_MAX_ENTRIES_PER_USER", "1000"))
+MEMORY_MAX_KEYWORDS_PER_ENTRY = int(os.getenv("MEMORY_MAX_KEYWORDS_PER_ENTRY", "200"))
+MEMORY_SEARCH_LIMIT = int(os.getenv("MEMORY_SEARCH_LIMIT", "10"))
+
+# Session ID recorded for events added without one.
+_UNKNOWN_SESSION_ID = "__unknown_session_id__"
+# Maximum number of IDs bound into a single DELETE statement.
+_DELETE_BATCH_SIZE = 500
+_KEYWORD_LENGTH = 64
+
+
+def _keywords(text: str, limit: int = MEMORY_MAX_KEYWORDS_PER_ENTRY) -> typing.List[str]:
+    """Extracts the distinct lowercase words of a text, in order of appearance."""
+    words = re.findall(r"\w+", unicodedata.normalize("NFC", text).lower())
+    return list(dict.fromkeys(word[:_KEYWORD_LENGTH] for word in words if len(word) > 1))[:limit]
+
+
+def _event_text(event: google.adk.events.Event) -> str:
+    """Returns the text parts of an event, ignoring model thoughts and media."""
+    if not event.content or not event.content.parts:
+        return ""
+    return "\n".join(part.text for part in event.content.parts if part.text and not part.thought)
+
+
+class SqlMemoryService(BaseMemoryService):
+    """Memory service stored in the memory_entries table, shared between workers."""
+
+    def __init__(self, ttl_seconds: int = MEMORY_TTL_SECONDS,
+                 max_entries_per_user: int = MEMORY_MAX_ENTRIES_PER_USER,
+                 search_limit: int = MEMORY_SEARCH_LIMIT):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries_per_user = max_entries_per_user
+        self.search_limit = search_limit
+
+    async def add_session_to_memory(self, session: google.adk.sessions.Session):
+        await asyncio.to_thread(self._add, session.app_name, session.user_id, session.id, session.events,
+                                self.ttl_seconds)
+
+    async def add_events_to_memory(self, *, app_name: str, user_id: str,
+                                   events: typing.Sequence[google.adk.events.Event],
+                                   session_id: typing.Optional[str] = None,
+                                   custom_metadata: typing.Optional[typing.Mapping[str, object]] = None):
+        """Adds events to memory; custom_metadata may set "ttl_seconds" for these entries."""
+        ttl_seconds = int((custom_metadata or {}).get("ttl_seconds", self.ttl_seconds))
+        await asyncio.to_thread(self._add, app_name, user_id, session_id or _UNKNOWN_SESSION_ID, events,
+                                ttl_seconds)
+
+    async def search_memory(self, *, app_name: str, user_id: str, query: str) -> SearchMemoryResponse:
+        return await asyncio.to_thread(self._search, app_name, user_id, query)
+
+    def _add(self, app_name: str, user_id: str, session_id: str,
+             events: typing.Sequence[google.adk.events.Event], ttl_seconds: int):
+        texts = {event.id: (event, text) for event in events if (text := _event_text(event))}
+        if not texts:
+            return
+        session: Session = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            stored = {event_id for event_id, in session.query(MemoryRecord.event_id).filter(
+                MemoryRecord.app_name == app_name,
+                MemoryRecord.user_id == user_id,
+                MemoryRecord.session_id == session_id,
+                MemoryRecord.event_id.in_(list(texts)),
+            )}
+            for event_id, (event, text) in texts.items():
+                if event_id in stored:
+                    continue
+                entry_id = str(uuid.uuid4())
+                content = types.Content(role=event.content.role, parts=[types.Part(text=text)])
+                session.add(MemoryRecord(id=entry_id, app_name=app_name, user_id=user_id, session_id=session_id,
+                                         event_id=event_id, author=event.author,
+                                         content=content.model_dump_json(exclude_none=True),
+                                         event_timestamp=datetime.utcfromtimestamp(event.timestamp),
+                                         created_at=now,
+                                         expires_at=now + timedelta(seconds=ttl_seconds),
+                                         last_accessed_at=now))
+                session.add_all(MemoryKeyword(entry_id=entry_id, keyword=keyword, app_name=app_name,
+                                              user_id=user_id) for keyword in _keywords(text))
+            session.flush()
+            self._evict(session, app_name, user_id, now)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    def _evict(self, session: Session, app_name: str, user_id: str, now: datetime):
+        """Deletes a batch of expired entries and the user's least recently used entries beyond the cap.
+
+        The expired entries are found on the expires_at index and the user's
+        entries on the (app_name, user_id, last_accessed_at) index.
+        """
+        expired = session.query(MemoryRecord.id).filter(
+            MemoryRecord.expires_at < now
+        ).limit(_DELETE_BATCH_SIZE).all()
+        over_user_cap = session.query(MemoryRecord.id).filter(
+            MemoryRecord.app_name == app_name,
+            MemoryRecord.user_id == user_id,
+        ).order_by(MemoryRecord.last_accessed_at.desc()).offset(self.max_entries_per_user).all()
+        stale_ids = list({entry_id for entry_id, in expired + over_user_cap})
+        for start in range(0, len(stale_ids), _DELETE_BATCH_SIZE):
+            batch = stale_ids[start:start + _DELETE_BATCH_SIZE]
+            session.query(MemoryKeyword).filter(MemoryKeyword.entry_id.in_(batch)).delete(synchronize_session=False)
+            session.query(MemoryRecord).filter(MemoryRecord.id.in_(batch)).delete(synchronize_session=False)
+
+    def _search(self, app_name: str, user_id: str, query: str) -> SearchMemoryResponse:
+        words = _keywords(query)
+        if not words:
+            return SearchMemoryResponse()
+        session: Session = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            hits = func.count(MemoryKeyword.keyword)
+            matches = session.query(MemoryRecord, hits).join(
+                MemoryKeyword, MemoryKeyword.entry_id == MemoryRecord.id
+            ).filter(
+                MemoryKeyword.app_name == app_name,
+                MemoryKeyword.user_id == user_id,
+                MemoryKeyword.keyword.in_(words),
+                MemoryRecord.expires_at >= now,
+            ).group_by(MemoryRecord.id).order_by(hits.desc(), MemoryRecord.created_at).limit(self.search_limit).all()
+            if not matches:
+                return SearchMemoryResponse()
+            session.query(MemoryRecord).filter(
+                MemoryRecord.id.in_([record.id for record, _ in matches])
+            ).update({MemoryRecord.last_accessed_at: now}, synchronize_session=False)
+            session.commit()
+            return SearchMemoryResponse(memories=[
+                MemoryEntry(id=record.id,
+                            content=types.Content.model_validate_json(record.content),
+                            author=record.author,
+                            timestamp=record.event_timestamp.isoformat() if record.event_timestamp else None,
+                            custom_metadata={"session_id": record.session_id})
+                for record, _ in matches
+            ])
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+
+_memory_service: typing.Optional[BaseMemoryService] = None
+
+
+def get_memory_service() -> BaseMemoryService:
+    """Returns the process-wide memory service for the configured backend.
+
+    MEMORY_BACKEND=sql (the default) uses SqlMemoryService; MEMORY_BACKEND=memory
+    uses ADK's unbounded in-process store, for local experiments only.
+
+    Raises:
+        ValueError: If MEMORY_BACKEND names an unknown backend.
+    """
+    global _memory_service
+    if _memory_service is None:
+        backends = {"sql": SqlMemoryService, "memory": google.adk.memory.InMemoryMemoryService}
+        if MEMORY_BACKEND not in backends:
+            raise ValueError(f"Unknown MEMORY_BACKEND '{MEMORY_BACKEND}'.")
+        _memory_service = backends[MEMORY_BACKEND]()
+    return _memory_service
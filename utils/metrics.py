@@ -0,0 +1,170 @@
+"""Prometheus metrics for the agent pipeline.
+
+The agent callbacks in utils.vra_util and the model callbacks below record
+per-agent and per-session wall time, model call counts, input/output tokens and
+the payload bytes sent to the model. The metrics are served on /metrics.
+
+Labels are kept low-cardinality: agent names are normalised (segment copies of
+an analyser report under the analyser's name) and risk types are the canonical
+comma separated lists. Start times are kept per session object, keyed by
+invocation and agent, so recording only costs a few dict operations per
+callback; they are dropped with the session object at the end of its run, so
+runs that are cancelled or fail before their after-callbacks leave nothing behind.
+"""
+
+import re
+import time
+import typing
+import weakref
+
+import google.adk.agents.callback_context
+import google.adk.models.llm_request
+import google.adk.models.llm_response
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Histogram, generate_latest
+
+# Buckets spanning a fast cached step up to a long segmented video run.
+_DURATION_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+AGENT_DURATION = Histogram("vra_agent_duration_seconds", "Wall time of an agent run.",
+                           ["agent", "risk_type"], buckets=_DURATION_BUCKETS)
+SESSION_DURATION = Histogram("vra_session_duration_seconds", "Wall time of a whole assessment run.",
+                             ["risk_type"], buckets=_DURATION_BUCKETS)
+MODEL_CALLS = Counter("vra_model_calls_total", "Model calls made by an agent.", ["agent", "risk_type"])
+MODEL_CALL_DURATION = Histogram("vra_model_call_duration_seconds", "Wall time of a model call.",
+                                ["agent"], buckets=_DURATION_BUCKETS)
+MODEL_INPUT_TOKENS = Counter("vra_model_input_tokens_total", "Prompt tokens sent by an agent.", ["agent"])
+MODEL_OUTPUT_TOKENS = Counter("vra_model_output_tokens_total", "Output tokens received by an agent.", ["agent"])
+MODEL_PAYLOAD_BYTES = Counter("vra_model_payload_bytes_total",
+                              "Inline data and text bytes sent to the model by an agent.", ["agent"])
+STAGE_TIMEOUTS = Counter("vra_stage_timeouts_total", "Agent runs cancelled for missing their deadline.", ["agent"])
+MODEL_RETRIES = Counter("vra_model_retries_total", "Model calls retried after a failed attempt.", ["model"])
+MODEL_HEDGES = Counter("vra_model_hedges_total", "Duplicate requests sent for slow model calls.", ["model"])
+MODEL_FALLBACKS = Counter("vra_model_fallbacks_total", "Model calls routed to the fallback model.", ["model"])
+MODEL_BREAKER_OPENED = Counter("vra_model_breaker_opened_total", "Times a model's circuit breaker opened.", ["model"])
+MODEL_PROMPT_TOKENS = Histogram("vra_model_prompt_tokens", "Estimated prompt tokens of a model call.", ["agent"],
+                                buckets=(250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000))
+PROMPT_TRUNCATIONS = Counter("vra_prompt_truncations_total",
+                             "Model calls whose text was shortened to fit the token budget.", ["agent"])
+
+# Name of the agent whose run spans the whole session.
+ROOT_AGENT_NAME = "root_agent"
+
+_SEGMENT_SUFFIX = re.compile(r"_segment_\d+$")
+_agent_labels: typing.Dict[str, str] = {}
+# Start times of the live runs, per session object id, keyed by (kind, invocation ID, agent name).
+_started: typing.Dict[int, typing.Dict[typing.Tuple[str, str, str], float]] = {}
+
+
+def agent_label(agent_name: str) -> str:
+    """Returns the metric label of an agent, folding segment copies into their analyser."""
+    label = _agent_labels.get(agent_name)
+    if label is None:
+        label = _agent_labels[agent_name] = _SEGMENT_SUFFIX.sub("", agent_name)
+    return label
+
+
+def _start_times(callback_context: google.adk.agents.callback_context.CallbackContext) -> \
+        typing.Dict[typing.Tuple[str, str, str], float]:
+    """Returns the start times recorded for the session of a run.
+
+    The runner loads a fresh session object for every run, so the times are
+    released when the run's session object is garbage collected.
+    """
+    session = callback_context.session
+    times = _started.get(id(session))
+    if times is None:
+        times = _started[id(session)] = {}
+        weakref.finalize(session, _started.pop, id(session), None)
+    return times
+
+
+def _risk_type(callback_context: google.adk.agents.callback_context.CallbackContext) -> str:
+    return callback_context.state.get("risk_type") or "unknown"
+
+
+def record_agent_start(callback_context: google.adk.agents.callback_context.CallbackContext):
+    """Records the start of an agent run.
+
+    Args:
+        callback_context: The context of the callback, containing agent and session info.
+    """
+    _start_times(callback_context)[("agent", callback_context.invocation_id, callback_context.agent_name)] = \
+        time.perf_counter()
+
+
+def record_agent_finish(callback_context: google.adk.agents.callback_context.CallbackContext):
+    """Records the wall time of a finished agent run.
+
+    Args:
+        callback_context: The context of the callback, containing agent and session info.
+    """
+    started = _start_times(callback_context).pop(("agent", callback_context.invocation_id,
+                                                  callback_context.agent_name), None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    risk_type = _risk_type(callback_context)
+    if callback_context.agent_name == ROOT_AGENT_NAME:
+        SESSION_DURATION.labels(risk_type).observe(elapsed)
+    AGENT_DURATION.labels(agent_label(callback_context.agent_name), risk_type).observe(elapsed)
+
+
+def record_model_request_callback(callback_context: google.adk.agents.callback_context.CallbackContext,
+                                  llm_request: google.adk.models.llm_request.LlmRequest) -> \
+        typing.Optional[google.adk.models.llm_response.LlmResponse]:
+    """Callback that counts a model call and the payload bytes it sends.
+
+    Register it after the callbacks that rewrite the request, so the bytes
+    actually sent are counted.
+
+    Args:
+        callback_context: The context of the callback, containing agent and session info.
+        llm_request: The request about to be sent to the model.
+
+    Returns:
+        None, so the model call proceeds.
+    """
+    agent = agent_label(callback_context.agent_name)
+    payload_bytes = 0
+    for content in llm_request.contents:
+        for part in content.parts or ():
+            if part.inline_data is not None:
+                payload_bytes += len(part.inline_data.data or b"")
+            elif part.text:
+                payload_bytes += len(part.text)
+    MODEL_CALLS.labels(agent, _risk_type(callback_context)).inc()
+    MODEL_PAYLOAD_BYTES.labels(agent).inc(payload_bytes)
+    _start_times(callback_context)[("model", callback_context.invocation_id, callback_context.agent_name)] = \
+        time.perf_counter()
+    return None
+
+
+def record_model_response_callback(callback_context: google.adk.agents.callback_context.CallbackContext,
+                                   llm_response: google.adk.models.llm_response.LlmResponse) -> \
+        typing.Optional[google.adk.models.llm_response.LlmResponse]:
+    """Callback that records the wall time and token usage of a model call.
+
+    Args:
+        callback_context: The context of the callback, containing agent and session info.
+        llm_response: The response received from the model.
+
+    Returns:
+        None, so the response is used unchanged.
+    """
+    if llm_response.partial:
+        return None
+    agent = agent_label(callback_context.agent_name)
+    started = _start_times(callback_context).pop(("model", callback_context.invocation_id,
+                                                  callback_context.agent_name), None)
+    if started is not None:
+        MODEL_CALL_DURATION.labels(agent).observe(time.perf_counter() - started)
+    usage = llm_response.usage_metadata
+    if usage is not None:
+        MODEL_INPUT_TOKENS.labels(agent).inc(usage.prompt_token_count or 0)
+        MODEL_OUTPUT_TOKENS.labels(agent).inc(usage.candidates_token_count or 0)
+    return None
+
+
+def render_metrics() -> typing.Tuple[bytes, str]:
+    """Returns the current metrics in the Prometheus text format and its content type."""
+    return generate_latest(), CONTENT_TYPE_LATEST
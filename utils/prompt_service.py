@@ -1,16 +1,213 @@
-"""Service for interacting with prompts in the database."""
+"""Service for interacting with prompts in the database.
+
+Prompt lookups on the hot path are served from an in-process cache. The cache is
+revalidated at most once per PROMPT_CACHE_TTL_SECONDS with a cheap fingerprint
+query over the prompts table, so edits made by any worker reach the running
+agents within that staleness window; edits made through this process invalidate
+it immediately.
+"""
+
+import os
+import threading
+import time
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, defer
+from utils.models import AsyncSessionLocal, Prompt, SessionLocal, async_engine, engine
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+PROMPT_CACHE_TTL_SECONDS = float(os.getenv("PROMPT_CACHE_TTL_SECONDS", "5"))
+BULK_UPSERT_CHUNK_SIZE = int(os.getenv("BULK_UPSERT_CHUNK_SIZE", "500"))
+
+# Prompts that drive the agent pipeline; results depend on their current versions.
+AGENT_PROMPT_NAMES = (
+    "fire_risk_agent_instruction",
+    "construction_risk_agent_instruction",
+    "risk_summary_agent_instruction",
+    "parallel_planner_description",
+)
+
+PromptKey = Tuple[str, str, str]
+
+
+def _prompt_rows_statement(names: Sequence[str], app_name: str, region: str):
+    """Builds the query selecting name, content and version of the named prompts."""
+    return select(Prompt.name, Prompt.content, Prompt.version).where(
+        Prompt.name.in_(names),
+        Prompt.app_name == app_name,
+        Prompt.region == region
+    )
+
+
+def _fingerprint_statement(app_name: Optional[str] = None, region: Optional[str] = None):
+    """Builds the aggregate query behind the prompts table fingerprint."""
+    statement = select(func.count(Prompt.id), func.max(Prompt.id), func.sum(Prompt.version))
+    if app_name:
+        statement = statement.where(Prompt.app_name == app_name)
+    if region:
+        statement = statement.where(Prompt.region == region)
+    return statement
+
+
+def _bulk_upsert_statements(dialect_name: str, prompts: Sequence[Dict[str, str]]):
+    """Builds INSERT ... ON CONFLICT statements upserting prompts on uix_name_app_region.
+
+    Conflicting rows get the new content and a bumped version; rows whose
+    content is unchanged are left alone. Duplicate keys in the input keep the
+    last occurrence, and rows are chunked by BULK_UPSERT_CHUNK_SIZE.
+
+    Args:
+        dialect_name: The database dialect, "postgresql" or "sqlite".
+        prompts: Dicts with name, content, app_name and region.
+
+    Returns:
+        The upsert statements, each returning the inserted or updated rows.
+
+    Raises:
+        ValueError: If the dialect does not support ON CONFLICT upserts.
+    """
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise ValueError(f"Bulk upsert is not supported for the '{dialect_name}' dialect.")
+
+    rows = list({(p["name"], p["app_name"], p["region"]): p for p in prompts}.values())
+    statements = []
+    for start in range(0, len(rows), BULK_UPSERT_CHUNK_SIZE):
+        statement = insert(Prompt).values(rows[start:start + BULK_UPSERT_CHUNK_SIZE])
+        statement = statement.on_conflict_do_update(
+            index_elements=[Prompt.name, Prompt.app_name, Prompt.region],
+            set_={"content": statement.excluded.content, "version": Prompt.version + 1},
+            where=Prompt.content != statement.excluded.content,
+        ).returning(Prompt)
+        statements.append(statement)
+    return statements
+
+
+def _fingerprint(row) -> Tuple[int, int, int]:
+    """Normalises a fingerprint row to (row count, maximum ID, sum of versions)."""
+    count, max_id, version_sum = row
+    return count, max_id or 0, int(version_sum or 0)
+
+
+class PromptCache:
+    """Process-wide cache of prompt content and version keyed by (name, app_name, region).
+
+    get_many serves sync callers such as scripts; aget_many serves the event loop
+    through the async engine.
+    """
+
+    def __init__(self, ttl_seconds: float = PROMPT_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[PromptKey, Tuple[str, int]] = {}
+        self._fingerprint: Optional[Tuple] = None
+        self._checked_at = float("-inf")
+        self._lock = threading.Lock()
+
+    def get_many(self, names: Sequence[str], app_name: str, region: str) -> Dict[str, Tuple[str, int]]:
+        """Returns content and version for the named prompts that exist.
+
+        Prompts missing from the cache are loaded together in one query.
+
+        Args:
+            names: The names of the prompts.
+            app_name: The application name.
+            region: The region.
+
+        Returns:
+            Mapping of prompt name to (content, version).
+        """
+        if self._check_due():
+            with self._lock:
+                if self._check_due():
+                    self._checked_at = time.monotonic()
+                    session: Session = SessionLocal()
+                    try:
+                        self._apply_fingerprint(_fingerprint(session.execute(_fingerprint_statement()).one()))
+                    finally:
+                        session.close()
+        found, missing = self._lookup(names, app_name, region)
+        if missing:
+            session: Session = SessionLocal()
+            try:
+                rows = session.execute(_prompt_rows_statement(missing, app_name, region)).all()
+            finally:
+                session.close()
+            found.update(self._store(rows, app_name, region))
+        return found
+
+    async def aget_many(self, names: Sequence[str], app_name: str, region: str) -> Dict[str, Tuple[str, int]]:
+        """Async variant of get_many using the async engine.
+
+        Args:
+            names: The names of the prompts.
+            app_name: The application name.
+            region: The region.
+
+        Returns:
+            Mapping of prompt name to (content, version).
+        """
+        if self._check_due():
+            # Claim the check before awaiting so concurrent callers keep using the cache.
+            self._checked_at = time.monotonic()
+            async with AsyncSessionLocal() as session:
+                self._apply_fingerprint(_fingerprint((await session.execute(_fingerprint_statement())).one()))
+        found, missing = self._lookup(names, app_name, region)
+        if missing:
+            async with AsyncSessionLocal() as session:
+                rows = (await session.execute(_prompt_rows_statement(missing, app_name, region))).all()
+            found.update(self._store(rows, app_name, region))
+        return found
+
+    def invalidate(self):
+        """Drops all cached prompts."""
+        with self._lock:
+            self._entries = {}
+            self._checked_at = float("-inf")
+
+    def _check_due(self) -> bool:
+        """Returns whether the staleness window has elapsed since the last check."""
+        return time.monotonic() - self._checked_at >= self.ttl_seconds
+
+    def _apply_fingerprint(self, fingerprint: Tuple):
+        """Clears the cache if the prompts table changed since the last check."""
+        if fingerprint != self._fingerprint:
+            self._entries = {}
+            self._fingerprint = fingerprint
+
+    def _lookup(self, names: Sequence[str], app_name: str, region: str):
+        """Splits names into cached entries and names that must be loaded."""
+        found = {name: self._entries[(name, app_name, region)]
+                 for name in names if (name, app_name, region) in self._entries}
+        return found, [name for name in names if name not in found]
+
+    def _store(self, rows, app_name: str, region: str) -> Dict[str, Tuple[str, int]]:
+        """Caches loaded prompt rows and returns them keyed by name."""
+        loaded = {}
+        for name, content, version in rows:
+            self._entries[(name, app_name, region)] = (content, version)
+            loaded[name] = (content, version)
+        return loaded
+
+
+prompt_cache = PromptCache()
 
-from sqlalchemy.orm import Session
-from utils.models import Prompt, SessionLocal
-from typing import List, Optional
 
 class PromptService:
-    """Service class for managing prompts."""
+    """Service class for managing prompts.
+
+    This is the synchronous API, kept for scripts and worker threads. Code
+    running on the event loop should use AsyncPromptService.
+    """
 
     @staticmethod
     def get_latest_prompt(name: str, app_name: str, region: str) -> str:
         """Fetches the latest version of a prompt by name, app_name, and region.
 
+        The prompt is served from the prompt cache.
+
         Args:
             name: The name of the prompt.
             app_name: The application name.
@@ -22,22 +219,13 @@ class PromptService:
         Raises:
             ValueError: If the prompt is not found.
         """
-        session: Session = SessionLocal()
-        try:
-            prompt = session.query(Prompt).filter(
-                Prompt.name == name,
-                Prompt.app_name == app_name,
-                Prompt.region == region
-            ).first()
-            if prompt:
-                return prompt.content
-            else:
-                raise ValueError(f"Prompt with name '{name}', app_name '{app_name}', region '{region}' not found.")
-        finally:
-            session.close()
+        prompt = prompt_cache.get_many([name], app_name, region).get(name)
+        if prompt:
+            return prompt[0]
+        raise ValueError(f"Prompt with name '{name}', app_name '{app_name}', region '{region}' not found.")
 
     @staticmethod
-    def add_prompt(name: str, content: str, app_name: str, region: str):
+    def add_prompt(name: str, content: str, app_name: str, region: str) -> Prompt:
         """Adds a new prompt or updates an existing one.
 
         Args:
@@ -45,6 +233,9 @@ class PromptService:
             content: The content of the prompt.
             app_name: The application name.
             region: The region.
+
+        Returns:
+            The created or updated Prompt object.
         """
         session: Session = SessionLocal()
         try:
@@ -60,6 +251,33 @@ class PromptService:
                 prompt = Prompt(name=name, content=content, app_name=app_name, region=region)
                 session.add(prompt)
             session.commit()
+            prompt_cache.invalidate()
+            session.refresh(prompt)
+            return prompt
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def bulk_upsert_prompts(prompts: Sequence[Dict[str, str]]) -> List[Prompt]:
+        """Inserts or updates many prompts in a single transaction.
+
+        Args:
+            prompts: Dicts with name, content, app_name and region.
+
+        Returns:
+            The prompts that were created or whose content changed.
+        """
+        session: Session = SessionLocal()
+        try:
+            upserted = []
+            for statement in _bulk_upsert_statements(engine.dialect.name, prompts):
+                upserted.extend(session.scalars(statement).all())
+            session.commit()
+            prompt_cache.invalidate()
+            return upserted
         except Exception as e:
             session.rollback()
             raise e
@@ -126,6 +344,40 @@ class PromptService:
         finally:
             session.close()
 
+    @staticmethod
+    def get_prompt_versions(names: Sequence[str], app_name: str, region: str) -> Dict[str, int]:
+        """Fetches the current versions of several prompts from the prompt cache.
+
+        Args:
+            names: The names of the prompts.
+            app_name: The application name.
+            region: The region.
+
+        Returns:
+            Mapping of prompt name to version for the prompts that exist.
+        """
+        return {name: version for name, (_, version) in prompt_cache.get_many(names, app_name, region).items()}
+
+    @staticmethod
+    def get_prompts_fingerprint(app_name: Optional[str] = None, region: Optional[str] = None) -> Tuple[int, int, int]:
+        """Computes a cheap fingerprint of the prompts table that changes on every write.
+
+        Inserts and deletes change the row count or maximum ID, and every update
+        bumps a version, which changes the version sum.
+
+        Args:
+            app_name: Optional application name filter.
+            region: Optional region filter.
+
+        Returns:
+            Tuple of (row count, maximum ID, sum of versions).
+        """
+        session: Session = SessionLocal()
+        try:
+            return _fingerprint(session.execute(_fingerprint_statement(app_name, region)).one())
+        finally:
+            session.close()
+
     @staticmethod
     def update_prompt(prompt_id: int, content: str) -> Optional[Prompt]:
         """Updates an existing prompt's content and increments version.
@@ -147,6 +399,7 @@ class PromptService:
                 prompt.content = content
                 prompt.version += 1
                 session.commit()
+                prompt_cache.invalidate()
                 session.refresh(prompt)
                 return prompt
             return None
@@ -175,6 +428,7 @@ class PromptService:
             if prompt:
                 session.delete(prompt)
                 session.commit()
+                prompt_cache.invalidate()
                 return True
             return False
         except Exception as e:
@@ -183,3 +437,272 @@ class PromptService:
         finally:
             session.close()
 
+
+
+class AsyncPromptService:
+    """Async service class for managing prompts through the async engine."""
+
+    @staticmethod
+    async def get_latest_prompt(name: str, app_name: str, region: str) -> str:
+        """Fetches the latest version of a prompt by name, app_name, and region.
+
+        The prompt is served from the prompt cache.
+
+        Args:
+            name: The name of the prompt.
+            app_name: The application name.
+            region: The region.
+
+        Returns:
+            The content of the prompt.
+
+        Raises:
+            ValueError: If the prompt is not found.
+        """
+        prompt = (await prompt_cache.aget_many([name], app_name, region)).get(name)
+        if prompt:
+            return prompt[0]
+        raise ValueError(f"Prompt with name '{name}', app_name '{app_name}', region '{region}' not found.")
+
+    @staticmethod
+    async def get_prompt_versions(names: Sequence[str], app_name: str, region: str) -> Dict[str, int]:
+        """Fetches the current versions of several prompts from the prompt cache.
+
+        Args:
+            names: The names of the prompts.
+            app_name: The application name.
+            region: The region.
+
+        Returns:
+            Mapping of prompt name to version for the prompts that exist.
+        """
+        prompts = await prompt_cache.aget_many(names, app_name, region)
+        return {name: version for name, (_, version) in prompts.items()}
+
+    @staticmethod
+    async def add_prompt(name: str, content: str, app_name: str, region: str) -> Prompt:
+        """Adds a new prompt or updates an existing one.
+
+        Args:
+            name: The name of the prompt.
+            content: The content of the prompt.
+            app_name: The application name.
+            region: The region.
+
+        Returns:
+            The created or updated Prompt object.
+        """
+        async with AsyncSessionLocal() as session:
+            try:
+                prompt = (await session.execute(select(Prompt).where(
+                    Prompt.name == name,
+                    Prompt.app_name == app_name,
+                    Prompt.region == region
+                ))).scalars().first()
+                if prompt:
+                    prompt.content = content
+                    prompt.version += 1
+                else:
+                    prompt = Prompt(name=name, content=content, app_name=app_name, region=region)
+                    session.add(prompt)
+                await session.commit()
+                prompt_cache.invalidate()
+                await session.refresh(prompt)
+                return prompt
+            except Exception as e:
+                await session.rollback()
+                raise e
+
+    @staticmethod
+    async def bulk_upsert_prompts(prompts: Sequence[Dict[str, str]]) -> List[Prompt]:
+        """Inserts or updates many prompts in a single transaction.
+
+        Args:
+            prompts: Dicts with name, content, app_name and region.
+
+        Returns:
+            The prompts that were created or whose content changed.
+        """
+        async with AsyncSessionLocal() as session:
+            try:
+                upserted = []
+                for statement in _bulk_upsert_statements(async_engine.dialect.name, prompts):
+                    upserted.extend((await session.scalars(statement)).all())
+                await session.commit()
+                prompt_cache.invalidate()
+                return upserted
+            except Exception as e:
+                await session.rollback()
+                raise e
+
+    @staticmethod
+    async def stream_prompts(app_name: Optional[str] = None,
+                             region: Optional[str] = None) -> AsyncGenerator[Prompt, None]:
+        """Streams prompts in ID order without loading them all at once.
+
+        Args:
+            app_name: Optional application name filter.
+            region: Optional region filter.
+
+        Yields:
+            Prompt objects.
+        """
+        async with AsyncSessionLocal() as session:
+            statement = select(Prompt).order_by(Prompt.id).execution_options(yield_per=BULK_UPSERT_CHUNK_SIZE)
+            if app_name:
+                statement = statement.where(Prompt.app_name == app_name)
+            if region:
+                statement = statement.where(Prompt.region == region)
+            async for prompt in await session.stream_scalars(statement):
+                yield prompt
+
+    @staticmethod
+    async def get_all_prompts(app_name: Optional[str] = None, region: Optional[str] = None,
+                              after_id: Optional[int] = None, limit: Optional[int] = None,
+                              include_content: bool = True) -> List[Prompt]:
+        """Fetches prompts in ID order, optionally filtered and paginated by keyset.
+
+        Args:
+            app_name: Optional application name filter.
+            region: Optional region filter.
+            after_id: Optional cursor; only prompts with a greater ID are returned.
+            limit: Optional maximum number of prompts to return.
+            include_content: Whether to load the content column.
+
+        Returns:
+            List of Prompt objects. When include_content is False the content
+            attribute is not loaded and must not be accessed.
+        """
+        async with AsyncSessionLocal() as session:
+            statement = select(Prompt).order_by(Prompt.id)
+            if not include_content:
+                statement = statement.options(defer(Prompt.content, raiseload=True))
+            if app_name:
+                statement = statement.where(Prompt.app_name == app_name)
+            if region:
+                statement = statement.where(Prompt.region == region)
+            if after_id is not None:
+                statement = statement.where(Prompt.id > after_id)
+            if limit is not None:
+                statement = statement.limit(limit)
+            return list((await session.execute(statement)).scalars().all())
+
+    @staticmethod
+    async def get_prompts_fingerprint(app_name: Optional[str] = None,
+                                      region: Optional[str] = None) -> Tuple[int, int, int]:
+        """Computes a cheap fingerprint of the prompts table that changes on every write.
+
+        Args:
+            app_name: Optional application name filter.
+            region: Optional region filter.
+
+        Returns:
+            Tuple of (row count, maximum ID, sum of versions).
+        """
+        async with AsyncSessionLocal() as session:
+            return _fingerprint((await session.execute(_fingerprint_statement(app_name, region))).one())
+
+    @staticmethod
+    async def get_prompt_by_id(prompt_id: int) -> Optional[Prompt]:
+        """Fetches a prompt by its ID.
+
+        Args:
+            prompt_id: The ID of the prompt to fetch.
+
+        Returns:
+            Prompt object if found, None otherwise.
+        """
+        async with AsyncSessionLocal() as session:
+            return await session.get(Prompt, prompt_id)
+
+    @staticmethod
+    async def get_prompt_by_name(name: str, app_name: str, region: str) -> Optional[Prompt]:
+        """Fetches a prompt by name, app_name, and region.
+
+        Args:
+            name: The name of the prompt.
+            app_name: The application name.
+            region: The region.
+
+        Returns:
+            Prompt object if found, None otherwise.
+        """
+        async with AsyncSessionLocal() as session:
+            return (await session.execute(select(Prompt).where(
+                Prompt.name == name,
+                Prompt.app_name == app_name,
+                Prompt.region == region
+            ))).scalars().first()
+
+    @staticmethod
+    async def update_prompt(prompt_id: int, content: str) -> Optional[Prompt]:
+        """Updates an existing prompt's content and increments version.
+
+        Args:
+            prompt_id: The ID of the prompt to update.
+            content: The new content for the prompt.
+
+        Returns:
+            Updated Prompt object if found, None otherwise.
+
+        Raises:
+            Exception: If database operation fails.
+        """
+        async with AsyncSessionLocal() as session:
+            try:
+                prompt = await session.get(Prompt, prompt_id)
+                if prompt:
+                    prompt.content = content
+                    prompt.version += 1
+                    await session.commit()
+                    prompt_cache.invalidate()
+                    await session.refresh(prompt)
+                    return prompt
+                return None
+            except Exception as e:
+                await session.rollback()
+                raise e
+
+    @staticmethod
+    async def delete_prompt(prompt_id: int) -> bool:
+        """Deletes a prompt by its ID.
+
+        Args:
+            prompt_id: The ID of the prompt to delete.
+
+        Returns:
+            True if deleted successfully, False if not found.
+
+        Raises:
+            Exception: If database operation fails.
+        """
+        async with AsyncSessionLocal() as session:
+            try:
+                prompt = await session.get(Prompt, prompt_id)
+                if prompt:
+                    await session.delete(prompt)
+                    await session.commit()
+                    prompt_cache.invalidate()
+                    return True
+                return False
+            except Exception as e:
+                await session.rollback()
+                raise e
+
+def instruction_provider(name: str) -> Callable[[Any], Awaitable[str]]:
+    """Builds an agent instruction provider that resolves a prompt on every run.
+
+    The prompt is read from the prompt cache for the configured APP_NAME and
+    REGION, so prompt edits reach running agents without a restart.
+
+    Args:
+        name: The name of the prompt.
+
+    Returns:
+        An async callable accepting the agent's readonly context and returning the prompt content.
+    """
+    async def provide(_context: Any) -> str:
+        return await AsyncPromptService.get_latest_prompt(name,
+                                                          os.getenv("APP_NAME", "Video_Risk_Assessment"),
+                                                          os.getenv("REGION", "us-central1"))
+    return provide
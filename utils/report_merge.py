@@ -0,0 +1,63 @@
+"""Reduce step for segmented video analysis.
+
+Each analyser answers every video segment with a HazardReport. The per-segment
+reports are merged into a single report: hazards with the same description are
+collapsed into one entry that keeps the timestamps of every segment it was seen
+in and the highest severity and confidence reported, and the notes are kept per
+segment.
+"""
+
+import re
+import typing
+
+from utils.hazard_report import CONFIDENCES, SEVERITIES, Hazard, HazardReport
+from utils.keyframes import format_timestamp
+
+SegmentReport = typing.Tuple[float, float, typing.Any]
+
+
+def _hazard_key(text: str) -> str:
+    """Normalises a hazard description for deduplication."""
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+
+def _as_report(report: typing.Any) -> HazardReport:
+    """Coerces a stored segment report into a HazardReport."""
+    if isinstance(report, HazardReport):
+        return report
+    if isinstance(report, dict):
+        return HazardReport.model_validate(report)
+    return HazardReport(notes=str(report or "").strip())
+
+
+def merge_segment_reports(reports: typing.List[SegmentReport]) -> typing.Dict[str, typing.Any]:
+    """Merges the per-segment reports of one analyser into a single report.
+
+    Args:
+        reports: (start, end, report) tuples in segment order, where report is a
+            HazardReport or its dict form as stored in session state.
+
+    Returns:
+        The merged HazardReport in its dict form.
+    """
+    merged: typing.Dict[str, Hazard] = {}
+    notes = []
+    for start, end, report in reports:
+        report = _as_report(report)
+        for hazard in report.hazards:
+            key = _hazard_key(hazard.description)
+            existing = merged.get(key)
+            if existing is None:
+                merged[key] = hazard.model_copy()
+                continue
+            if hazard.timestamp and hazard.timestamp not in existing.timestamp:
+                existing.timestamp = f"{existing.timestamp}; {hazard.timestamp}" if existing.timestamp \
+                    else hazard.timestamp
+            existing.severity = max(existing.severity, hazard.severity, key=SEVERITIES.index)
+            existing.confidence = max(existing.confidence, hazard.confidence, key=CONFIDENCES.index)
+            existing.action = existing.action or hazard.action
+        if report.notes:
+            notes.append(f"Segment {format_timestamp(start)}-{format_timestamp(end)}: {report.notes}")
+
+    hazards = [hazard.model_copy(update={"id": number}) for number, hazard in enumerate(merged.values(), start=1)]
+    return HazardReport(hazards=hazards, notes="\n".join(notes)).model_dump()
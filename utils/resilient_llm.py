@@ -0,0 +1,275 @@
+"""Retries, hedging, circuit breaking and fallback for the model clients.
+
+get_llm() wraps every model client in a ResilientLlm:
+
+* Failed calls are retried up to LLM_RETRY_ATTEMPTS times, waiting a random
+  "full jitter" delay between 0 and LLM_RETRY_BASE_DELAY_SECONDS * 2**attempt
+  (capped at LLM_RETRY_MAX_DELAY_SECONDS). Errors that another attempt cannot
+  fix, such as a bad request or an authentication failure, are not retried.
+* With LLM_HEDGE_PERCENTILE set (e.g. 0.95), a call still running after that
+  percentile of the model's recent latencies gets a duplicate request; the
+  first answer wins and the other request is cancelled. Hedging needs
+  LLM_HEDGE_MIN_SAMPLES latencies before it starts, and is off by default.
+* Each model backend has a circuit breaker. LLM_BREAKER_FAILURE_THRESHOLD
+  consecutive failed calls open it for LLM_BREAKER_RESET_SECONDS, during which
+  calls go straight to the fallback; afterwards a single trial call decides
+  whether it closes again.
+* Calls the primary model cannot answer, because its breaker is open or its
+  retries are exhausted, go to LLM_FALLBACK_MODEL when one is configured.
+
+Streaming calls are retried only until their first response has been yielded,
+and are never hedged.
+"""
+
+import asyncio
+import collections
+import logging
+import os
+import random
+import time
+import typing
+
+from google.adk.models.base_llm import BaseLlm
+from google.adk.models.llm_request import LlmRequest
+from google.adk.models.llm_response import LlmResponse
+from google.adk.utils.context_utils import Aclosing
+
+from utils.metrics import MODEL_BREAKER_OPENED, MODEL_FALLBACKS, MODEL_HEDGES, MODEL_RETRIES
+
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")
+LLM_RETRY_ATTEMPTS = int(os.getenv("LLM_RETRY_ATTEMPTS", "2"))
+LLM_RETRY_BASE_DELAY_SECONDS = float(os.getenv("LLM_RETRY_BASE_DELAY_SECONDS", "0.5"))
+LLM_RETRY_MAX_DELAY_SECONDS = float(os.getenv("LLM_RETRY_MAX_DELAY_SECONDS", "8"))
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_WINDOW = int(os.getenv("LLM_HEDGE_WINDOW", "200"))
+LLM_BREAKER_FAILURE_THRESHOLD = int(os.getenv("LLM_BREAKER_FAILURE_THRESHOLD", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors.
+_RETRYABLE_STATUS_CODES = frozenset({408, 409, 425, 429})
+
+
+class ModelUnavailableError(RuntimeError):
+    """Raised when no model backend can take a call."""
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Returns whether another attempt could succeed where a call failed with an error.
+
+    Errors carrying an HTTP status, as litellm's do, are retried on timeouts,
+    rate limits and server errors only. Errors without one, such as connection
+    failures and timeouts, are always retried.
+    """
+    status_code = getattr(error, "status_code", None)
+    if not isinstance(status_code, int):
+        return True
+    return status_code in _RETRYABLE_STATUS_CODES or status_code >= 500
+
+
+class CircuitBreaker:
+    """Tracks the health of one model backend.
+
+    Closed, calls flow; after failure_threshold consecutive failures it opens
+    and rejects calls for reset_seconds; then it lets a single trial call
+    through, which closes it on success and opens it again on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = LLM_BREAKER_FAILURE_THRESHOLD,
+                 reset_seconds: float = LLM_BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened_at: typing.Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the breaker currently rejects calls."""
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Returns whether a call may go to the backend, claiming the trial call when half open."""
+        if self.opened_at is None:
+            return True
+        if self._trial_running or time.monotonic() - self.opened_at < self.reset_seconds:
+            return False
+        self._trial_running = True
+        return True
+
+    def record_success(self):
+        """Records a successful call, closing the breaker."""
+        if self.opened_at is not None:
+            logging.info(f"Circuit breaker for model {self.name} closed")
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def record_failure(self):
+        """Records a failed call, opening the breaker once the threshold is reached."""
+        self.failures += 1
+        if self._trial_running or (self.opened_at is None and self.failures >= self.failure_threshold):
+            logging.warning(f"Circuit breaker for model {self.name} opened after {self.failures} failures")
+            MODEL_BREAKER_OPENED.labels(self.name).inc()
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def release(self):
+        """Gives up a claimed trial call that ended without a result, e.g. because it was cancelled.
+
+        A no-op once the trial recorded its success or failure.
+        """
+        self._trial_running = False
+
+
+_breakers: typing.Dict[str, CircuitBreaker] = {}
+# Recent successful call latencies in seconds, per model backend, for the hedging percentile.
+_latencies: typing.DefaultDict[str, typing.Deque[float]] = collections.defaultdict(
+    lambda: collections.deque(maxlen=LLM_HEDGE_WINDOW))
+
+
+def get_breaker(model: str) -> CircuitBreaker:
+    """Returns the process-wide circuit breaker of a model backend."""
+    if model not in _breakers:
+        _breakers[model] = CircuitBreaker(model)
+    return _breakers[model]
+
+
+class ResilientLlm(BaseLlm):
+    """Model that retries, hedges and falls back around a primary model client."""
+
+    primary: BaseLlm
+    fallback: typing.Optional[BaseLlm] = None
+    retry_attempts: int = LLM_RETRY_ATTEMPTS
+    retry_base_delay: float = LLM_RETRY_BASE_DELAY_SECONDS
+    retry_max_delay: float = LLM_RETRY_MAX_DELAY_SECONDS
+    hedge_percentile: float = LLM_HEDGE_PERCENTILE
+    hedge_min_samples: int = LLM_HEDGE_MIN_SAMPLES
+
+    @property
+    def capabilities(self):
+        return self.primary.capabilities
+
+    async def generate_content_async(self, llm_request: LlmRequest,
+                                     stream: bool = False) -> typing.AsyncGenerator[LlmResponse, None]:
+        backends = [self.primary] + ([self.fallback] if self.fallback is not None else [])
+        last_error: typing.Optional[BaseException] = None
+        yielded = False
+        for index, backend in enumerate(backends):
+            breaker = get_breaker(backend.model)
+            if not breaker.allow():
+                last_error = ModelUnavailableError(f"Circuit breaker for model {backend.model} is open.")
+                continue
+            trial = breaker.is_open
+            if index > 0:
+                logging.warning(f"Routing a call for model {self.primary.model} to fallback model {backend.model}")
+                MODEL_FALLBACKS.labels(self.primary.model).inc()
+            # The flow sets llm_request.model to the primary's name, which clients prefer over their own model.
+            backend_request = llm_request.model_copy(deep=True)
+            backend_request.model = backend.model
+            try:
+                if stream:
+                    async with Aclosing(self._stream_with_retries(backend, breaker, backend_request)) as agen:
+                        async for response in agen:
+                            yielded = True
+                            yield response
+                else:
+                    for response in await self._call_with_retries(backend, breaker, backend_request):
+                        yield response
+                return
+            except Exception as e:
+                # Output already streamed to the caller cannot be taken back, so it is not followed by another model's.
+                if yielded or not is_retryable(e):
+                    raise
+                last_error = e
+            finally:
+                # A trial that was cancelled, or whose consumer stopped reading (GeneratorExit),
+                # recorded no outcome; give the trial up so the next call can claim it.
+                if trial:
+                    breaker.release()
+        raise ModelUnavailableError(f"No model backend could answer: {last_error}") from last_error
+
+    async def _call_with_retries(self, backend: BaseLlm, breaker: CircuitBreaker,
+                                 llm_request: LlmRequest) -> typing.List[LlmResponse]:
+        """Calls a backend until an attempt succeeds or the retries run out."""
+        for attempt in range(self.retry_attempts + 1):
+            try:
+                responses = await self._hedged_call(backend, llm_request)
+            except Exception as e:
+                if not is_retryable(e):
+                    # The backend answered, it just rejected this request.
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if attempt == self.retry_attempts or breaker.is_open:
+                    raise
+                await self._backoff(backend, attempt, e)
+                continue
+            breaker.record_success()
+            return responses
+
+    async def _stream_with_retries(self, backend: BaseLlm, breaker: CircuitBreaker,
+                                   llm_request: LlmRequest) -> typing.AsyncGenerator[LlmResponse, None]:
+        """Streams from a backend, retrying attempts that fail before their first response."""
+        for attempt in range(self.retry_attempts + 1):
+            started = False
+            try:
+                async for response in backend.generate_content_async(llm_request, stream=True):
+                    started = True
+                    yield response
+            except Exception as e:
+                if not is_retryable(e):
+                    breaker.record_success()
+                    raise
+                breaker.record_failure()
+                if started or attempt == self.retry_attempts or breaker.is_open:
+                    raise
+                await self._backoff(backend, attempt, e)
+                continue
+            breaker.record_success()
+            return
+
+    async def _backoff(self, backend: BaseLlm, attempt: int, error: Exception):
+        """Waits a full-jitter exponential delay before the next attempt."""
+        delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+        logging.warning(f"Model {backend.model} call failed ({error}); retrying in {delay:.2f}s")
+        MODEL_RETRIES.labels(backend.model).inc()
+        await asyncio.sleep(delay)
+
+    async def _hedged_call(self, backend: BaseLlm, llm_request: LlmRequest) -> typing.List[LlmResponse]:
+        """Calls a backend, sending a duplicate request if the first one is slower than usual."""
+        latencies = _latencies[backend.model]
+        hedge_after = None
+        if self.hedge_percentile > 0 and len(latencies) >= self.hedge_min_samples:
+            ordered = sorted(latencies)
+            hedge_after = ordered[min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))]
+
+        calls = [asyncio.create_task(self._timed_call(backend, llm_request))]
+        try:
+            if hedge_after is not None:
+                done, _ = await asyncio.wait(calls, timeout=hedge_after)
+                if not done:
+                    MODEL_HEDGES.labels(backend.model).inc()
+                    calls.append(asyncio.create_task(self._timed_call(backend, llm_request)))
+            pending = set(calls)
+            error: typing.Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for call in done:
+                    if call.exception() is None:
+                        return call.result()
+                    error = call.exception()
+            raise error
+        finally:
+            for call in calls:
+                call.cancel()
+
+    @staticmethod
+    async def _timed_call(backend: BaseLlm, llm_request: LlmRequest) -> typing.List[LlmResponse]:
+        """Collects the responses of one call and records its latency."""
+        started = time.perf_counter()
+        responses = [response async for response in backend.generate_content_async(llm_request, stream=False)]
+        _latencies[backend.model].append(time.perf_counter() - started)
+        return responses
+
@@ -0,0 +1,168 @@
+"""Result cache for video risk assessments.
+
+Assessments are keyed by the SHA-256 of the uploaded video, the requested risk
+type and the current versions of the agent prompts, so a re-uploaded clip is
+answered from the cache until either the prompts change or the entry expires.
+The cache backend is selected with RESULT_CACHE_BACKEND ("memory", "sql" or
+"none").
+"""
+
+import abc
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+import typing
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from utils.models import AssessmentCacheEntry, AsyncSessionLocal
+
+RESULT_CACHE_BACKEND = os.getenv("RESULT_CACHE_BACKEND", "memory")
+RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "86400"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1024"))
+
+# A cached assessment: the summary parts and the reports they were assembled from.
+CachedResult = typing.Dict[str, typing.Any]
+# Bumped whenever the cached result layout changes, so older entries are never read.
+_CACHE_FORMAT_VERSION = 2
+
+
+def make_cache_key(video_sha256: str, risk_type: str, prompt_versions: typing.Mapping[str, int],
+                   polish: bool = False) -> str:
+    """Builds the cache key for an assessment.
+
+    Args:
+        video_sha256: The SHA-256 hex digest of the uploaded video.
+        risk_type: The requested risk type.
+        prompt_versions: Mapping of prompt name to its current version.
+        polish: Whether the summary was rewritten by the LLM polish pass.
+
+    Returns:
+        A hex digest identifying the assessment.
+    """
+    material = json.dumps([_CACHE_FORMAT_VERSION, video_sha256, risk_type, sorted(prompt_versions.items()), polish])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class ResultCache(abc.ABC):
+    """Interface for assessment result cache backends."""
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> typing.Optional[CachedResult]:
+        """Returns the cached result for a key, or None on a miss."""
+
+    @abc.abstractmethod
+    async def set(self, key: str, result: CachedResult):
+        """Stores the result for a key."""
+
+
+class NullResultCache(ResultCache):
+    """Cache backend that never stores anything."""
+
+    async def get(self, key: str) -> typing.Optional[CachedResult]:
+        return None
+
+    async def set(self, key: str, result: CachedResult):
+        return None
+
+
+class InMemoryResultCache(ResultCache):
+    """In-process LRU cache with a per-entry TTL."""
+
+    def __init__(self, ttl_seconds: int = RESULT_CACHE_TTL_SECONDS, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: collections.OrderedDict[str, typing.Tuple[float, CachedResult]] = collections.OrderedDict()
+
+    async def get(self, key: str) -> typing.Optional[CachedResult]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result
+
+    async def set(self, key: str, result: CachedResult):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class SqlResultCache(ResultCache):
+    """Cache backend stored in the assessment_cache table, shared between workers.
+
+    Database errors are logged and treated as a miss, or as a no-op when
+    storing, so an unavailable cache never fails an assessment.
+    """
+
+    def __init__(self, ttl_seconds: int = RESULT_CACHE_TTL_SECONDS, max_entries: int = RESULT_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+    async def get(self, key: str) -> typing.Optional[CachedResult]:
+        try:
+            async with AsyncSessionLocal() as session:
+                entry = await session.get(AssessmentCacheEntry, key)
+                if entry is None:
+                    return None
+                now = datetime.utcnow()
+                if entry.expires_at < now:
+                    await session.delete(entry)
+                    await session.commit()
+                    return None
+                entry.last_accessed_at = now
+                await session.commit()
+                return json.loads(entry.parts)
+        except Exception as e:
+            logging.warning(f"Result cache lookup failed, treating it as a miss: {e}")
+            return None
+
+    async def set(self, key: str, result: CachedResult):
+        try:
+            async with AsyncSessionLocal() as session:
+                now = datetime.utcnow()
+                await session.merge(AssessmentCacheEntry(key=key,
+                                                         parts=json.dumps(result),
+                                                         created_at=now,
+                                                         expires_at=now + timedelta(seconds=self.ttl_seconds),
+                                                         last_accessed_at=now))
+                await session.flush()
+                await session.execute(delete(AssessmentCacheEntry).where(AssessmentCacheEntry.expires_at < now))
+                stale_keys = (await session.execute(
+                    select(AssessmentCacheEntry.key).order_by(
+                        AssessmentCacheEntry.last_accessed_at.desc()
+                    ).offset(self.max_entries)
+                )).scalars().all()
+                if stale_keys:
+                    await session.execute(delete(AssessmentCacheEntry).where(
+                        AssessmentCacheEntry.key.in_(stale_keys)
+                    ))
+                await session.commit()
+        except Exception as e:
+            logging.warning(f"Result cache store failed, skipping it: {e}")
+
+
+_result_cache: typing.Optional[ResultCache] = None
+
+
+def get_result_cache() -> ResultCache:
+    """Returns the process-wide result cache for the configured backend.
+
+    Raises:
+        ValueError: If RESULT_CACHE_BACKEND names an unknown backend.
+    """
+    global _result_cache
+    if _result_cache is None:
+        backends = {"memory": InMemoryResultCache, "sql": SqlResultCache, "none": NullResultCache}
+        if RESULT_CACHE_BACKEND not in backends:
+            raise ValueError(f"Unknown RESULT_CACHE_BACKEND '{RESULT_CACHE_BACKEND}'.")
+        _result_cache = backends[RESULT_CACHE_BACKEND]()
+    return _result_cache
@@ -0,0 +1,265 @@
+"""Retention and compaction of the agent sessions stored by DatabaseSessionService.
+
+Every assessment creates a new ADK session and its events are stored in full,
+so without housekeeping the session tables grow with every request. A
+background task periodically:
+
+* compacts the sessions idle for SESSION_COMPACT_AFTER_SECONDS: the events
+  only reference the uploaded video through its file:// URI in the upload
+  spool, which is gone once the request finishes, so those references are
+  rewritten to the URI of the video stored in the artifact service, or
+  dropped when the session has no stored video;
+* deletes the sessions idle for longer than SESSION_TTL_SECONDS, together with
+  their events and artifacts, in batches of SESSION_RETENTION_BATCH_SIZE so no
+  single transaction locks the tables for long.
+
+The sessions are read and written through ADK's v1 session schema, the schema
+DatabaseSessionService creates for new databases.
+"""
+
+import asyncio
+import logging
+import os
+import typing
+from datetime import datetime, timedelta
+
+from google.adk.artifacts import BaseArtifactService
+from google.adk.sessions.schemas.v1 import StorageEvent, StorageSession
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from utils.artifact_store import VIDEO_ARTIFACT_STATE_KEY
+from utils.models import SessionCompaction, SessionLocal
+from utils.video_ingest import local_path_from_uri
+
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", str(7 * 24 * 3600)))
+SESSION_COMPACT_AFTER_SECONDS = int(os.getenv("SESSION_COMPACT_AFTER_SECONDS", "300"))
+SESSION_RETENTION_INTERVAL_SECONDS = float(os.getenv("SESSION_RETENTION_INTERVAL_SECONDS", "600"))
+SESSION_RETENTION_BATCH_SIZE = int(os.getenv("SESSION_RETENTION_BATCH_SIZE", "200"))
+
+# (app_name, user_id, session_id) of a stored session.
+SessionKey = typing.Tuple[str, str, str]
+
+
+class SessionRetention:
+    """Compacts idle sessions and deletes expired ones on a schedule."""
+
+    def __init__(self, artifact_service: BaseArtifactService, ttl_seconds: int = SESSION_TTL_SECONDS,
+                 compact_after_seconds: int = SESSION_COMPACT_AFTER_SECONDS,
+                 interval: float = SESSION_RETENTION_INTERVAL_SECONDS,
+                 batch_size: int = SESSION_RETENTION_BATCH_SIZE):
+        """Initializes the retention task.
+
+        Args:
+            artifact_service: The artifact service holding the sessions' videos, deleted with their session.
+            ttl_seconds: Seconds a session is kept after its last update; 0 keeps sessions forever.
+            compact_after_seconds: Seconds a session must be idle before its events are compacted.
+            interval: Seconds between retention passes.
+            batch_size: The number of sessions compacted or deleted per transaction.
+        """
+        self.artifact_service = artifact_service
+        self.ttl_seconds = ttl_seconds
+        self.compact_after_seconds = compact_after_seconds
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def start(self):
+        """Starts the periodic retention task on the running event loop."""
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Cancels the retention task."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        """Runs a retention pass every interval until cancelled."""
+        while True:
+            try:
+                compacted, deleted = await self.run_once()
+                if compacted or deleted:
+                    logging.info(f"Session retention compacted {compacted} and deleted {deleted} sessions")
+            except Exception as e:
+                logging.error(f"Session retention pass failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self) -> typing.Tuple[int, int]:
+        """Runs one retention pass.
+
+        Returns:
+            The number of sessions compacted and the number of sessions deleted.
+        """
+        compacted = deleted = 0
+        now = datetime.utcnow()
+        if self.ttl_seconds > 0:
+            expiry_cutoff = now - timedelta(seconds=self.ttl_seconds)
+            while keys := await asyncio.to_thread(self._expired_sessions, expiry_cutoff):
+                for key in keys:
+                    await self._delete_artifacts(key)
+                await asyncio.to_thread(self._delete_sessions, keys)
+                deleted += len(keys)
+                if len(keys) < self.batch_size:
+                    break
+        compact_cutoff = now - timedelta(seconds=self.compact_after_seconds)
+        while keys := await asyncio.to_thread(self._uncompacted_sessions, compact_cutoff):
+            for key in keys:
+                await self.compact_session(key)
+            compacted += len(keys)
+            if len(keys) < self.batch_size:
+                break
+        return compacted, deleted
+
+    async def compact_session(self, key: SessionKey) -> int:
+        """Rewrites the upload spool references of a session's events to its stored video.
+
+        Args:
+            key: The session to compact.
+
+        Returns:
+            The number of references rewritten or dropped.
+        """
+        app_name, user_id, session_id = key
+        stored_uri = None
+        reference = await asyncio.to_thread(self._load_video_artifact, key)
+        if reference:
+            artifact = await self.artifact_service.get_artifact_version(app_name=app_name, user_id=user_id,
+                                                                        session_id=session_id,
+                                                                        filename=reference["filename"],
+                                                                        version=reference["version"])
+            stored_uri = artifact.canonical_uri if artifact else None
+        updates = {}
+        compacted = 0
+        for event_id, event_data in await asyncio.to_thread(self._load_events, key):
+            content = event_data.get("content") or {}
+            parts = []
+            for part_data in content.get("parts") or []:
+                file_uri = (part_data.get("file_data") or {}).get("file_uri")
+                if local_path_from_uri(file_uri) is None or file_uri == stored_uri:
+                    parts.append(part_data)
+                    continue
+                if stored_uri is not None:
+                    parts.append({**part_data, "file_data": {**part_data["file_data"], "file_uri": stored_uri}})
+                compacted += 1
+            if parts != content.get("parts"):
+                updates[event_id] = {**event_data, "content": {**content, "parts": parts}}
+        await asyncio.to_thread(self._store_compacted, key, updates, compacted)
+        return compacted
+
+    async def _delete_artifacts(self, key: SessionKey):
+        """Deletes the session-scoped artifacts of an expired session."""
+        app_name, user_id, session_id = key
+        try:
+            for filename in await self.artifact_service.list_artifact_keys(app_name=app_name, user_id=user_id,
+                                                                           session_id=session_id):
+                if filename.startswith("user:"):
+                    continue
+                await self.artifact_service.delete_artifact(app_name=app_name, user_id=user_id,
+                                                            session_id=session_id, filename=filename)
+        except Exception as e:
+            logging.warning(f"Failed to delete the artifacts of expired session {session_id}: {e}")
+
+    def _expired_sessions(self, cutoff: datetime) -> typing.List[SessionKey]:
+        """Returns a batch of sessions last updated before the cutoff."""
+        session: Session = SessionLocal()
+        try:
+            return [tuple(row) for row in session.query(
+                StorageSession.app_name, StorageSession.user_id, StorageSession.id
+            ).filter(StorageSession.update_time < cutoff).limit(self.batch_size).all()]
+        finally:
+            session.close()
+
+    def _uncompacted_sessions(self, cutoff: datetime) -> typing.List[SessionKey]:
+        """Returns a batch of sessions idle since the cutoff that have not been compacted yet."""
+        session: Session = SessionLocal()
+        try:
+            return [tuple(row) for row in session.query(
+                StorageSession.app_name, StorageSession.user_id, StorageSession.id
+            ).outerjoin(
+                SessionCompaction,
+                (SessionCompaction.app_name == StorageSession.app_name)
+                & (SessionCompaction.user_id == StorageSession.user_id)
+                & (SessionCompaction.session_id == StorageSession.id),
+            ).filter(
+                StorageSession.update_time < cutoff,
+                SessionCompaction.session_id.is_(None),
+            ).limit(self.batch_size).all()]
+        finally:
+            session.close()
+
+    @staticmethod
+    def _load_video_artifact(key: SessionKey) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        """Returns the reference to the video stored for a session, or None if it has none."""
+        app_name, user_id, session_id = key
+        session: Session = SessionLocal()
+        try:
+            state = session.query(StorageSession.state).filter(
+                StorageSession.app_name == app_name,
+                StorageSession.user_id == user_id,
+                StorageSession.id == session_id,
+            ).scalar()
+            return (state or {}).get(VIDEO_ARTIFACT_STATE_KEY)
+        finally:
+            session.close()
+
+    @staticmethod
+    def _load_events(key: SessionKey) -> typing.List[typing.Tuple[str, typing.Dict[str, typing.Any]]]:
+        """Returns the ID and serialised data of every event of a session."""
+        app_name, user_id, session_id = key
+        session: Session = SessionLocal()
+        try:
+            return [(event_id, event_data) for event_id, event_data in session.query(
+                StorageEvent.id, StorageEvent.event_data
+            ).filter(
+                StorageEvent.app_name == app_name,
+                StorageEvent.user_id == user_id,
+                StorageEvent.session_id == session_id,
+            ) if event_data]
+        finally:
+            session.close()
+
+    @staticmethod
+    def _store_compacted(key: SessionKey, updates: typing.Mapping[str, typing.Dict[str, typing.Any]],
+                         compacted: int):
+        """Writes the compacted events of a session and marks the session as compacted."""
+        app_name, user_id, session_id = key
+        session: Session = SessionLocal()
+        try:
+            for event_id, event_data in updates.items():
+                session.query(StorageEvent).filter(
+                    StorageEvent.id == event_id,
+                    StorageEvent.app_name == app_name,
+                    StorageEvent.user_id == user_id,
+                    StorageEvent.session_id == session_id,
+                ).update({StorageEvent.event_data: event_data}, synchronize_session=False)
+            session.merge(SessionCompaction(app_name=app_name, user_id=user_id, session_id=session_id,
+                                            references_compacted=compacted, compacted_at=datetime.utcnow()))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def _delete_sessions(keys: typing.List[SessionKey]):
+        """Deletes a batch of sessions with their events and compaction records."""
+        session: Session = SessionLocal()
+        try:
+            session.query(StorageEvent).filter(
+                tuple_(StorageEvent.app_name, StorageEvent.user_id, StorageEvent.session_id).in_(keys)
+            ).delete(synchronize_session=False)
+            session.query(SessionCompaction).filter(
+                tuple_(SessionCompaction.app_name, SessionCompaction.user_id, SessionCompaction.session_id).in_(keys)
+            ).delete(synchronize_session=False)
+            session.query(StorageSession).filter(
+                tuple_(StorageSession.app_name, StorageSession.user_id, StorageSession.id).in_(keys)
+            ).delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            raise e
+        finally:
+            session.close()
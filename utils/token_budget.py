@@ -0,0 +1,221 @@
+"""Token budgets for the model calls of the agent pipeline.
+
+Every model call is assembled within a per-stage prompt token budget: the
+agent's own <AGENT_NAME>_PROMPT_TOKEN_BUDGET setting (segment copies of an
+analyser use the analyser's) or, failing that, PROMPT_TOKEN_BUDGET. A budget
+of 0 disables enforcement.
+
+Before a call, enforce_token_budget_callback:
+
+* compresses the system instruction: runs of spaces and blank lines are
+  collapsed, so the long seeded prompts are not resent with their padding on
+  every call; the wording and symbols are kept as written;
+* if the request is still over budget, shortens its longest text parts, the
+  upstream material such as a summary handed to the polish pass, and then
+  drops evenly spaced keyframes, with their timestamp labels, until it fits;
+* records the estimated prompt tokens of the call.
+
+The default budget fits an analyser call sending KEYFRAME_MAX_FRAMES keyframes
+with its instruction, so enforcement only cuts requests that are unusually large.
+
+Tokens are estimated at CHARS_PER_TOKEN characters per token plus a fixed
+count per media part, which needs no tokenizer and is close enough to keep
+calls predictable.
+"""
+
+import functools
+import logging
+import math
+import os
+import re
+import typing
+
+import google.adk.agents.callback_context
+import google.adk.models.llm_request
+import google.adk.models.llm_response
+from google.genai import types
+
+from utils.keyframes import FRAME_LABEL_PREFIX
+from utils.metrics import MODEL_PROMPT_TOKENS, PROMPT_TRUNCATIONS, agent_label
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "32000"))
+CHARS_PER_TOKEN = 4
+# Tokens counted for every inline image or video part of a request.
+TOKENS_PER_MEDIA_PART = 258
+
+_TRUNCATION_MARKER = "\n[... truncated to fit the token budget]"
+# Text parts are never shortened below this many tokens, so short asks and frame labels survive.
+_MIN_TEXT_TOKENS = 256
+
+
+def count_text_tokens(text: str) -> int:
+    """Estimates the tokens of a text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def estimate_tokens(llm_request: google.adk.models.llm_request.LlmRequest) -> int:
+    """Estimates the prompt tokens of a request: its instruction, text parts and media parts."""
+    characters = len(str(llm_request.config.system_instruction or "")) if llm_request.config else 0
+    media_parts = 0
+    for content in llm_request.contents:
+        for part in content.parts or []:
+            if part.text:
+                characters += len(part.text)
+            elif part.inline_data or part.file_data:
+                media_parts += 1
+    return math.ceil(characters / CHARS_PER_TOKEN) + media_parts * TOKENS_PER_MEDIA_PART
+
+
+def prompt_token_budget(agent_name: str) -> int:
+    """Returns the prompt token budget of an agent's model calls; 0 means no budget.
+
+    Args:
+        agent_name: The name of the agent making the calls.
+    """
+    return int(os.getenv(f"{agent_label(agent_name).upper()}_PROMPT_TOKEN_BUDGET", str(PROMPT_TOKEN_BUDGET)))
+
+
+@functools.lru_cache(maxsize=64)
+def compress_instruction(text: str) -> str:
+    """Compresses an instruction without changing its wording.
+
+    Only collapses runs of spaces and blank lines; every other character is kept.
+
+    Args:
+        text: The instruction.
+
+    Returns:
+        The compressed instruction.
+    """
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r" *\n[ \n]*", "\n", text)
+    return text.strip()
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Shortens a text to roughly the given number of tokens, marking the cut.
+
+    The text is cut at the last line break within the budget when there is one,
+    so tables and lists lose whole rows rather than half of one.
+    """
+    limit = max(0, tokens * CHARS_PER_TOKEN - len(_TRUNCATION_MARKER))
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    return text[:cut if cut > 0 else limit] + _TRUNCATION_MARKER
+
+
+def drop_media_to_fit(llm_request: google.adk.models.llm_request.LlmRequest, excess: int) -> int:
+    """Drops evenly spaced media parts of a request until excess tokens are removed.
+
+    A keyframe is dropped together with the timestamp label before it. At least
+    one media part is always kept.
+
+    Args:
+        llm_request: The request to thin in place.
+        excess: The tokens to remove.
+
+    Returns:
+        The number of media parts dropped.
+    """
+    media = [(content_index, part_index) for content_index, content in enumerate(llm_request.contents)
+             for part_index, part in enumerate(content.parts or []) if part.inline_data or part.file_data]
+    drop_count = min(len(media) - 1, math.ceil(excess / TOKENS_PER_MEDIA_PART))
+    if drop_count <= 0:
+        return 0
+    # Keep evenly spaced parts, so the dropped ones are spread over the whole request.
+    keep = {media[round(index * (len(media) - 1) / max(1, len(media) - drop_count - 1))]
+            for index in range(len(media) - drop_count)}
+    dropped = set()
+    for content_index, part_index in media:
+        if (content_index, part_index) in keep:
+            continue
+        dropped.add((content_index, part_index))
+        parts = llm_request.contents[content_index].parts
+        if part_index > 0 and (parts[part_index - 1].text or "").startswith(FRAME_LABEL_PREFIX):
+            dropped.add((content_index, part_index - 1))
+    for content_index, content in enumerate(llm_request.contents):
+        if any(index[0] == content_index for index in dropped):
+            content.parts = [part for part_index, part in enumerate(content.parts)
+                             if (content_index, part_index) not in dropped]
+    return drop_count
+
+
+def fit_to_budget(llm_request: google.adk.models.llm_request.LlmRequest, budget: int) -> bool:
+    """Shrinks a request until its estimated tokens fit a budget.
+
+    The longest text parts are shortened first, none below _MIN_TEXT_TOKENS;
+    if the request is still over budget, evenly spaced media parts are dropped.
+
+    Args:
+        llm_request: The request to shorten in place.
+        budget: The prompt token budget.
+
+    Returns:
+        Whether any part was shortened or dropped.
+    """
+    excess = estimate_tokens(llm_request) - budget
+    if excess <= 0:
+        return False
+    truncated = False
+    texts = sorted(((content_index, part_index, part) for content_index, content in enumerate(llm_request.contents)
+                    for part_index, part in enumerate(content.parts or [])
+                    if part.text and count_text_tokens(part.text) > _MIN_TEXT_TOKENS),
+                   key=lambda item: len(item[2].text), reverse=True)
+    for content_index, part_index, part in texts:
+        if excess <= 0:
+            break
+        tokens = count_text_tokens(part.text)
+        keep = max(_MIN_TEXT_TOKENS, tokens - excess)
+        shortened = truncate_to_tokens(part.text, keep)
+        if shortened == part.text:
+            continue
+        llm_request.contents[content_index].parts[part_index] = types.Part(text=shortened)
+        excess -= tokens - count_text_tokens(shortened)
+        truncated = True
+    if excess > 0 and drop_media_to_fit(llm_request, excess):
+        truncated = True
+    return truncated
+
+
+def assemble_request(agent_name: str, llm_request: google.adk.models.llm_request.LlmRequest) -> int:
+    """Compresses a request, fits it to the agent's token budget and records its size.
+
+    Args:
+        agent_name: The name of the agent making the call.
+        llm_request: The request about to be sent to the model, changed in place.
+
+    Returns:
+        The estimated prompt tokens of the assembled request.
+    """
+    agent = agent_label(agent_name)
+    if llm_request.config and isinstance(llm_request.config.system_instruction, str):
+        llm_request.config.system_instruction = compress_instruction(llm_request.config.system_instruction)
+    budget = prompt_token_budget(agent_name)
+    if budget > 0 and fit_to_budget(llm_request, budget):
+        PROMPT_TRUNCATIONS.labels(agent).inc()
+    tokens = estimate_tokens(llm_request)
+    if budget > 0 and tokens > budget:
+        logging.warning(f"Model call of {agent} needs ~{tokens} prompt tokens, over its budget of {budget}, "
+                        f"even with its text shortened and a single media part")
+    MODEL_PROMPT_TOKENS.labels(agent).observe(tokens)
+    return tokens
+
+
+def enforce_token_budget_callback(callback_context: google.adk.agents.callback_context.CallbackContext,
+                                  llm_request: google.adk.models.llm_request.LlmRequest) -> \
+        typing.Optional[google.adk.models.llm_response.LlmResponse]:
+    """Callback that assembles a model call within the agent's token budget.
+
+    Register it after the callbacks that add to the request and before
+    record_model_request_callback.
+
+    Args:
+        callback_context: The context of the callback, containing agent and session info.
+        llm_request: The request about to be sent to the model.
+
+    Returns:
+        None, so the model call proceeds with the assembled request.
+    """
+    assemble_request(callback_context.agent_name, llm_request)
+    return None
@@ -0,0 +1,293 @@
+"""Streaming ingest for uploaded videos.
+
+This module spools uploaded videos to disk in fixed-size chunks, enforcing the
+upload size limit while reading, so that request handlers never hold a whole
+video in memory. UploadSizeLimitMiddleware rejects oversize request bodies from
+their Content-Length, or as soon as more bytes arrive than allowed, before the
+form parser has read them. Agents are handed a file-backed reference to the
+spooled video; model requests are sent its keyframes, and only a video without
+keyframes and no larger than INLINE_VIDEO_MAX_BYTES is read whole into a request.
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+import logging
+import os
+import pathlib
+import tempfile
+import typing
+import urllib.parse
+import urllib.request
+
+import google.adk.agents.callback_context
+import google.adk.models.llm_request
+import google.adk.models.llm_response
+import starlette.types
+from fastapi import UploadFile
+from google.genai import types
+from starlette.responses import JSONResponse
+
+from utils.keyframes import FRAME_LABEL_PREFIX, KEYFRAMES_STATE_KEY, format_timestamp, keyframes_available, remove_frames
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(1024 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", tempfile.gettempdir())
+# Largest video sent inline to a model when it has no keyframes; matches the inline request limit of the model APIs.
+INLINE_VIDEO_MAX_BYTES = int(os.getenv("INLINE_VIDEO_MAX_BYTES", str(20 * 1024 * 1024)))
+# Allowance for the multipart boundaries and headers around an uploaded file.
+_MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured size limit."""
+
+
+@dataclasses.dataclass
+class SpooledVideo:
+    """A video upload that has been spooled to a file on disk."""
+    path: pathlib.Path
+    mime_type: str
+    size: int
+    sha256: str
+
+    def as_part(self) -> types.Part:
+        """Builds a file-backed message part referencing the spooled video.
+
+        Returns:
+            A Part whose file_data points at the spooled file.
+        """
+        return types.Part(file_data=types.FileData(file_uri=self.path.as_uri(), mime_type=self.mime_type))
+
+    def cleanup(self):
+        """Removes the spooled file, and any keyframes extracted from it, from disk."""
+        self.path.unlink(missing_ok=True)
+        remove_frames(self.path)
+
+
+def upload_limit() -> int:
+    """Returns the largest video accepted for an assessment, in bytes.
+
+    Without keyframe extraction the whole video is sent inline to the model, so
+    the limit is capped at INLINE_VIDEO_MAX_BYTES.
+    """
+    return MAX_UPLOAD_BYTES if keyframes_available() else min(MAX_UPLOAD_BYTES, INLINE_VIDEO_MAX_BYTES)
+
+
+class UploadSizeLimitMiddleware:
+    """ASGI middleware rejecting multipart request bodies larger than the upload limit.
+
+    A request whose Content-Length is over the limit is answered with 413 before
+    its body is read; a request without one is cut off with 413 as soon as more
+    bytes have arrived than the limit allows.
+    """
+
+    def __init__(self, app: starlette.types.ASGIApp, files_per_request: typing.Optional[typing.Mapping[str, int]] = None):
+        """Initialises the middleware.
+
+        Args:
+            app: The ASGI app to wrap.
+            files_per_request: The number of videos accepted per request by path;
+                other paths accept one.
+        """
+        self.app = app
+        self.files_per_request = files_per_request or {}
+
+    def max_body_bytes(self, path: str) -> int:
+        """Returns the largest multipart body accepted on a path."""
+        return self.files_per_request.get(path, 1) * (upload_limit() + _MULTIPART_OVERHEAD_BYTES)
+
+    async def __call__(self, scope: starlette.types.Scope, receive: starlette.types.Receive,
+                       send: starlette.types.Send):
+        headers = dict(scope.get("headers") or []) if scope["type"] == "http" else {}
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        max_bytes = self.max_body_bytes(scope["path"])
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > max_bytes:
+            await self._reject(scope, receive, send, f"Request body of {int(content_length)} bytes exceeds "
+                                                     f"the limit of {max_bytes} bytes.")
+            return
+
+        received = 0
+        response_started = False
+        rejection: typing.Optional[str] = None
+
+        async def limited_receive() -> starlette.types.Message:
+            nonlocal received, rejection
+            if rejection is not None:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes and not response_started:
+                    # Stop the app reading as if the client had gone; the 413 is sent in place of its response.
+                    rejection = f"Request body exceeds the limit of {max_bytes} bytes."
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def tracked_send(message: starlette.types.Message):
+            nonlocal response_started
+            if rejection is not None:
+                return
+            response_started = response_started or message["type"] == "http.response.start"
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracked_send)
+        except Exception:
+            if rejection is None:
+                raise
+        if rejection is not None:
+            await self._reject(scope, receive, send, rejection)
+
+    @staticmethod
+    async def _reject(scope: starlette.types.Scope, receive: starlette.types.Receive,
+                      send: starlette.types.Send, detail: str):
+        """Answers a request with 413, closing the connection instead of reading the rest of its body."""
+        response = JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})
+        await response(scope, receive, send)
+
+
+async def spool_upload(file: UploadFile, max_bytes: typing.Optional[int] = None) -> SpooledVideo:
+    """Streams an uploaded file to a temporary file in bounded chunks.
+
+    The SHA-256 digest of the content is computed while the chunks stream in.
+
+    Args:
+        file: The uploaded file object.
+        max_bytes: The maximum number of bytes accepted for the upload; defaults to upload_limit().
+
+    Returns:
+        The spooled video.
+
+    Raises:
+        UploadTooLargeError: If the upload exceeds max_bytes.
+    """
+    max_bytes = upload_limit() if max_bytes is None else max_bytes
+    if file.size is not None and file.size > max_bytes:
+        raise UploadTooLargeError(f"Upload of {file.size} bytes exceeds the limit of {max_bytes} bytes.")
+
+    fd, name = tempfile.mkstemp(prefix="vra_upload_", dir=UPLOAD_SPOOL_DIR)
+    path = pathlib.Path(name)
+    size = 0
+    digest = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as spool:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(f"Upload exceeds the limit of {max_bytes} bytes.")
+                digest.update(chunk)
+                await asyncio.to_thread(spool.write, chunk)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return SpooledVideo(path=path, mime_type=file.content_type or "application/octet-stream", size=size,
+                        sha256=digest.hexdigest())
+
+
+def local_path_from_uri(file_uri: typing.Optional[str]) -> typing.Optional[pathlib.Path]:
+    """Returns the local path of a file:// URI, or None for any other URI."""
+    if not file_uri or not file_uri.startswith("file://"):
+        return None
+    return pathlib.Path(urllib.request.url2pathname(urllib.parse.urlparse(file_uri).path))
+
+
+async def _read_part(path: pathlib.Path, mime_type: str,
+                     max_bytes: typing.Optional[int] = None) -> typing.Optional[types.Part]:
+    """Reads a file into an inline data part, or returns None if it no longer exists.
+
+    Raises:
+        UploadTooLargeError: If the file is larger than max_bytes.
+    """
+    try:
+        if max_bytes is not None and path.stat().st_size > max_bytes:
+            raise UploadTooLargeError(f"Video {path.name} has no keyframes and exceeds the inline limit "
+                                      f"of {max_bytes} bytes.")
+        data = await asyncio.to_thread(path.read_bytes)
+    except FileNotFoundError:
+        logging.warning(f"Could not read spooled file {path}")
+        return None
+    return types.Part(inline_data=types.Blob(mime_type=mime_type, data=data))
+
+
+async def _resolve_file_data(llm_request: google.adk.models.llm_request.LlmRequest,
+                             keyframes: typing.Mapping[str, typing.Any],
+                             window: typing.Optional[typing.Tuple[float, float]] = None):
+    """Replaces the file-backed parts of a request with inline data.
+
+    Args:
+        llm_request: The request about to be sent to the model.
+        keyframes: The keyframes session state, or an empty mapping.
+        window: Optional (start, end) window restricting the keyframes sent.
+    """
+    for index, content in enumerate(llm_request.contents):
+        if not content.parts or not any(local_path_from_uri(p.file_data and p.file_data.file_uri)
+                                        for p in content.parts):
+            continue
+        parts = []
+        for part in content.parts:
+            path = local_path_from_uri(part.file_data and part.file_data.file_uri)
+            if path is None:
+                parts.append(part)
+            elif part.file_data.file_uri == keyframes.get("video_uri"):
+                for frame in keyframes["frames"]:
+                    if window and not window[0] <= frame["timestamp"] < window[1]:
+                        continue
+                    frame_part = await _read_part(local_path_from_uri(frame["uri"]), "image/jpeg")
+                    if frame_part:
+                        parts.append(types.Part(text=f"{FRAME_LABEL_PREFIX}{format_timestamp(frame['timestamp'])}"))
+                        parts.append(frame_part)
+            else:
+                video_part = await _read_part(path, part.file_data.mime_type, INLINE_VIDEO_MAX_BYTES)
+                if video_part:
+                    parts.append(video_part)
+        llm_request.contents[index] = types.Content(role=content.role, parts=parts)
+
+
+async def resolve_file_data_callback(callback_context: google.adk.agents.callback_context.CallbackContext,
+                                     llm_request: google.adk.models.llm_request.LlmRequest) -> \
+        typing.Optional[google.adk.models.llm_response.LlmResponse]:
+    """Callback that inlines file-backed video parts right before a model call.
+
+    Session events only carry the file reference; the bytes are read for the
+    duration of a single model request and released with it. When keyframes
+    were extracted for the video, the timestamped keyframes are sent instead
+    of the whole clip, which is only inlined up to INLINE_VIDEO_MAX_BYTES.
+
+    Args:
+        callback_context: The context of the callback, containing agent and session info.
+        llm_request: The request about to be sent to the model.
+
+    Returns:
+        None, so the model call proceeds with the resolved request.
+    """
+    await _resolve_file_data(llm_request, callback_context.state.get(KEYFRAMES_STATE_KEY) or {})
+    return None
+
+
+def segment_file_data_callback(start: float, end: float) -> \
+        typing.Callable[..., typing.Awaitable[typing.Optional[google.adk.models.llm_response.LlmResponse]]]:
+    """Creates a callback that inlines only the keyframes of one video segment.
+
+    Args:
+        start: Start of the segment in seconds.
+        end: End of the segment in seconds.
+
+    Returns:
+        A before_model_callback for an analyser bound to the segment.
+    """
+    async def resolve(callback_context: google.adk.agents.callback_context.CallbackContext,
+                      llm_request: google.adk.models.llm_request.LlmRequest) -> \
+            typing.Optional[google.adk.models.llm_response.LlmResponse]:
+        await _resolve_file_data(llm_request, callback_context.state.get(KEYFRAMES_STATE_KEY) or {}, (start, end))
+        llm_request.append_instructions([
+            f"You are analysing the segment {format_timestamp(start)} to {format_timestamp(end)} of a longer video. "
+            f"Only report hazards visible in this segment and keep the frame timestamps in the Time/Scene column."
+        ])
+        return None
+
+    return resolve
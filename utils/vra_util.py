@@ -1,19 +1,81 @@
 """Utility functions for the Video Risk Assessment application.
 
 This module provides utility functions, primarily for logging agent execution
-callbacks (before and after agent execution).
+callbacks (before and after agent execution). The callbacks record the agent
+wall time metrics in utils.metrics, and publish agent start and finish events
+to any progress listener registered for the session and to the process-wide
+progress hooks used for instrumentation.
 """
 
+import asyncio
 import google.adk.agents.callback_context
 import logging
+import time
 import typing
 from google.genai.types import Content
 
+from utils.metrics import record_agent_finish, record_agent_start
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(name)s - %(message)s',
 )
 
+# Progress listeners keyed by session id; only sessions being streamed have one.
+_progress_listeners: typing.Dict[str, asyncio.Queue] = {}
+
+# Process-wide hooks called with (session_id, event) for every progress event.
+_progress_hooks: typing.List[typing.Callable[[str, typing.Dict[str, typing.Any]], None]] = []
+
+
+def subscribe_progress(session_id: str) -> asyncio.Queue:
+    """Registers a progress listener for a session.
+
+    Args:
+        session_id: The session to listen to.
+
+    Returns:
+        The queue that receives the session's progress events.
+    """
+    queue = asyncio.Queue()
+    _progress_listeners[session_id] = queue
+    return queue
+
+
+def unsubscribe_progress(session_id: str):
+    """Removes the progress listener of a session.
+
+    Args:
+        session_id: The session to stop listening to.
+    """
+    _progress_listeners.pop(session_id, None)
+
+
+def add_progress_hook(hook: typing.Callable[[str, typing.Dict[str, typing.Any]], None]):
+    """Registers a hook that receives the progress events of every session.
+
+    Args:
+        hook: Callable invoked with the session id and the progress event.
+    """
+    _progress_hooks.append(hook)
+
+
+def publish_progress(session_id: str, event: typing.Dict[str, typing.Any]):
+    """Publishes a progress event to the session's listener, if there is one, and to the hooks.
+
+    Args:
+        session_id: The session the event belongs to.
+        event: The progress event.
+    """
+    for hook in _progress_hooks:
+        try:
+            hook(session_id, event)
+        except Exception as e:
+            logging.warning(f"Progress hook failed: {e}")
+    queue = _progress_listeners.get(session_id)
+    if queue is not None:
+        queue.put_nowait(event)
+
 
 def logger_before_agent_callback(callback_context: google.adk.agents.callback_context.CallbackContext) -> \
 typing.Optional[Content]:
@@ -26,6 +88,9 @@ typing.Optional[Content]:
         None.
     """
     logging.info(f"{callback_context.agent_name} is being called for session {callback_context.session.id} ")
+    record_agent_start(callback_context)
+    publish_progress(callback_context.session.id,
+                     {"event": "agent_start", "agent": callback_context.agent_name, "time": time.time()})
 
 
 def logger_after_agent_callback(callback_context: google.adk.agents.callback_context.CallbackContext) -> \
@@ -39,3 +104,6 @@ def logger_after_agent_callback(callback_context: google.adk.agents.callback_con
         None.
     """
     logging.info(f"{callback_context.agent_name} is executed for session {callback_context.session.id}")
+    record_agent_finish(callback_context)
+    publish_progress(callback_context.session.id,
+                     {"event": "agent_finish", "agent": callback_context.agent_name, "time": time.time()})
@@ -2,14 +2,42 @@
 
 This module defines the ADK App instance, configuring the root agent and
 other application-level settings.
+
+The App is built on first use by get_app(), so importing this module does not
+build the agents and their model clients. `app` is still available as a
+module attribute for tools that load it by name.
 """
 
+import threading
+import typing
+
 from google.adk.apps import App
 
-import agents.root_agent
+APP_NAME = "Video_Risk_Assessment"
+
+_app: typing.Optional[App] = None
+_app_lock = threading.Lock()
+
+
+def get_app() -> App:
+    """Returns the ADK App, building the agents on the first call.
+
+    Safe to call from worker threads, e.g. to build the agents off the event loop.
+    """
+    global _app
+    with _app_lock:
+        if _app is None:
+            import agents.root_agent
+
+            _app = App(
+                name=APP_NAME,
+                root_agent=agents.root_agent.root_agent,
+                # plugins=[SaveFilesAsArtifactsPlugin()]
+            )
+    return _app
+
 
-app = App(
-    name="Video_Risk_Assessment",
-    root_agent=agents.root_agent.root_agent,
-    # plugins=[SaveFilesAsArtifactsPlugin()]
-)
+def __getattr__(name: str):
+    if name == "app":
+        return get_app()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")